@@ -0,0 +1,103 @@
+"""
+Benchmarks the sutta page parser on cached HTML.
+
+Compares the reference full-document parse against the targeted `div#sutta`
+parse (in-process and with a process pool), and checks that all of them
+produce identical records.
+
+Usage:
+    python benchmarks/bench_sutta_parsing.py                 # pages from the HTML cache
+    python benchmarks/bench_sutta_parsing.py --synthetic 300 # generated pages, no cache needed
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from utils.config_helpers import ConfigManager
+from data_acquisition.html_cache import HtmlCache
+from data_acquisition.scraper import parse_sutta_html
+
+
+def load_cached_pages(cache_dir: str, limit: int) -> list[str]:
+    """Loads up to `limit` pages from the raw HTML cache."""
+    html_cache = HtmlCache(cache_dir)
+    links = html_cache.links()[:limit]
+    return [html_cache.get(link['url']) for link in links]
+
+
+def make_synthetic_pages(count: int, seed: int = 0) -> list[str]:
+    """
+    Builds pages shaped like dhammatalks.org sutta pages: a large navigation
+    shell around a `div#sutta` with an intro, notes and a body.
+    """
+    rng = random.Random(seed)
+    words = ["monks", "mindfulness", "Sāvatthī", "Blessed", "One", "aggregates", "clinging",
+             "jhāna", "release", "craving", "becoming", "dhamma", "discernment", "virtue"]
+
+    def sentence():
+        return " ".join(rng.choice(words) for _ in range(rng.randint(8, 20))) + "."
+
+    nav = "".join(f'<li><a href="/suttas/MN/MN{i}.html">MN {i}</a></li>' for i in range(400))
+    pages = []
+    for i in range(count):
+        intro = "".join(f"<p>{sentence()}</p>" for _ in range(rng.randint(1, 4)))
+        body = "".join(f"<p>{sentence()} {sentence()}</p>" for _ in range(rng.randint(10, 120)))
+        pages.append(
+            f"<html><head><title>Sutta {i}</title></head><body>"
+            f'<div id="header"><ul>{nav}</ul></div>'
+            f'<div id="sutta"><h1>MN {i}:  Synthetic   Sutta</h1>'
+            f'<p class="seealso">See also: DN {i}</p>{intro}<p>* * *</p>{body}'
+            f'<div class="note">A note.</div></div>'
+            f'<div id="footer"><ul>{nav}</ul></div></body></html>'
+        )
+    return pages
+
+
+def time_it(label: str, func, baseline: float | None = None):
+    """Runs `func` once, prints its wall time (and speedup) and returns (seconds, result)."""
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    speedup = f"  ({baseline / elapsed:.2f}x)" if baseline else ""
+    print(f"{label:<32} {elapsed:8.3f}s{speedup}")
+    return elapsed, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sutta page parsing.")
+    parser.add_argument("--limit", type=int, default=300, help="Maximum number of cached pages to parse.")
+    parser.add_argument("--synthetic", type=int, default=0, help="Use N generated pages instead of the cache.")
+    parser.add_argument("--workers", type=int, default=4, help="Processes for the pooled run.")
+    parser.add_argument("--parser", default="html.parser", help="BeautifulSoup tree builder.")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        pages = make_synthetic_pages(args.synthetic)
+    else:
+        cfg_manager = ConfigManager()
+        pages = load_cached_pages(cfg_manager.get_path('output_paths.html_cache'), args.limit)
+    if not pages:
+        print("No pages to benchmark. Run the scraper first or pass --synthetic N.")
+        return
+
+    print(f"Parsing {len(pages)} pages with '{args.parser}'...")
+    full_parse = partial(parse_sutta_html, parser=args.parser, targeted=False)
+    targeted_parse = partial(parse_sutta_html, parser=args.parser)
+
+    baseline, reference = time_it("full document (reference)", lambda: [full_parse(p) for p in pages])
+    _, targeted = time_it("targeted div#sutta", lambda: [targeted_parse(p) for p in pages], baseline)
+
+    def pooled():
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            return list(executor.map(targeted_parse, pages, chunksize=8))
+    _, pooled_result = time_it(f"targeted + {args.workers} processes", pooled, baseline)
+
+    assert targeted == reference, "Targeted parse output differs from the reference parse"
+    assert pooled_result == reference, "Pooled parse output differs from the reference parse"
+    print("Outputs are identical.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+Performance regression suite for the pipeline hot paths, run on the data in the repo.
+
+Cases:
+    processed_ids[<file>]       get_processed_ids on each raw_concepts_*.jsonl (manifest
+                                rebuilt from scratch, and read from an up-to-date manifest)
+    unprocessed_items[<file>]   get_unprocessed_items over the same file with half of it
+                                processed (index rebuilt, and loaded), iterated to the end
+    parse_sutta_page            SuttaScraper._parse_sutta_page on cached (or synthetic) pages
+    prepare_corpus[<mode>]      ConceptNormalizer._prepare_corpus in 'name' and 'hybrid' mode
+    cluster_items[<backend n>]  BaseNormalizer._cluster_items on n synthetic embeddings, with
+                                the dense and the k-NN clustering backend
+
+Each case is timed `--repeats` times and its median is appended to a JSON
+history. A case is a regression when its median is more than `--threshold`
+slower than the median of its last `--baseline-runs` results recorded on the
+same host; the suite then exits with status 1.
+
+Usage:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --only processed_ids unprocessed_items --threshold 0.1
+    python benchmarks/run_benchmarks.py --no-record   # compare without adding to the history
+"""
+import argparse
+import contextlib
+import glob
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from utils.config_helpers import ConfigManager
+from utils.data_helpers import get_processed_ids, get_unprocessed_items
+from utils.run_manifest import manifest_path_for
+from data_acquisition.html_cache import HtmlCache
+from data_acquisition.scraper import SuttaScraper
+from processing.concept_normalizer import ConceptNormalizer
+from bench_sutta_parsing import make_synthetic_pages
+
+DEFAULT_HISTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "history.json")
+
+
+def time_case(func, repeats: int, setup=None) -> dict:
+    """
+    Runs `func` once to warm up, then `repeats` times (each after `setup`), and
+    returns timing stats. Progress messages printed by the pipeline are silenced.
+    """
+    timings = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        if setup:
+            setup()
+        func()
+        for _ in range(repeats):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+    return {'median_seconds': statistics.median(timings), 'min_seconds': min(timings), 'repeats': repeats}
+
+
+class BenchConfigManager:
+    """The project's ConfigManager with `concept_normalization` settings overridden for one case."""
+    def __init__(self, cfg_manager, **norm_overrides):
+        self.project_root = cfg_manager.project_root
+        self.config = {
+            **cfg_manager.config,
+            'concept_normalization': {**cfg_manager.config['concept_normalization'], **norm_overrides},
+        }
+        self.get_path = cfg_manager.get_path
+
+
+class UnusedEmbeddingModel:
+    """Stands in for the SentenceTransformer: the timed cases never embed, so they must not load it."""
+    def encode(self, *args, **kwargs):
+        raise RuntimeError("The benchmark cases are not expected to embed text.")
+
+
+def make_normalizer(cfg_manager, **norm_overrides) -> ConceptNormalizer:
+    """A ConceptNormalizer built through its constructor, with the embedding model stubbed out."""
+    # The embedding cache is left out so the cases only time the code paths they name
+    overrides = {'embedding_cache': {'enabled': False}, **norm_overrides}
+    normalizer = ConceptNormalizer(BenchConfigManager(cfg_manager, **overrides))
+    normalizer._model = UnusedEmbeddingModel()
+    return normalizer
+
+
+def make_embeddings(count: int, dim: int = 384, seed: int = 0) -> np.ndarray:
+    """Unit vectors scattered around count/5 centres, so clustering finds real communities."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(max(1, count // 5), dim)).astype(np.float32)
+    points = centres[rng.integers(0, len(centres), size=count)] + rng.normal(scale=0.35, size=(count, dim)).astype(np.float32)
+    return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+
+def load_pages(cfg_manager, limit: int) -> tuple[str, list]:
+    """Pages from the raw HTML cache, or synthetic pages when there is no cache."""
+    cache_dir = cfg_manager.get_path('output_paths.html_cache')
+    if os.path.isdir(cache_dir):
+        html_cache = HtmlCache(cache_dir)
+        pages = [html_cache.get(link['url']) for link in html_cache.links()[:limit]]
+        if pages:
+            return "cached", pages
+    return "synthetic", make_synthetic_pages(limit)
+
+
+def run_cases(args, cfg_manager, work_dir: str) -> dict:
+    results = {}
+
+    def selected(group: str) -> bool:
+        return not args.only or group in args.only
+
+    def record(name: str, stats: dict):
+        results[name] = stats
+        print(f"{name:<72} {stats['median_seconds']:9.4f}s (min {stats['min_seconds']:.4f}s)")
+
+    # Work on copies so the sidecar indexes next to the repo's data are left alone
+    concept_files = sorted(glob.glob(os.path.join(cfg_manager.project_root, "data", "03_kg_components", "raw_concepts_*.jsonl")))
+    copies = []
+    for path in concept_files:
+        copy_path = os.path.join(work_dir, os.path.basename(path))
+        shutil.copyfile(path, copy_path)
+        copies.append(copy_path)
+
+    for path in copies:
+        name = os.path.basename(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            first = json.loads(f.readline())
+        run_config = {'model_id': first['model_id'], 'mode': first['mode']}
+
+        if selected('processed_ids'):
+            def drop_manifest(path=path):
+                if os.path.exists(manifest_path_for(path)):
+                    os.remove(manifest_path_for(path))
+            processed = lambda path=path: get_processed_ids(path, 'sutta_id', **run_config)
+            record(f"processed_ids[{name}] rebuild", time_case(processed, args.repeats, setup=drop_manifest))
+            record(f"processed_ids[{name}] manifest", time_case(processed, args.repeats))
+
+        if selected('unprocessed_items'):
+            all_ids = sorted(get_processed_ids(path, 'sutta_id', **run_config))
+            half = set(all_ids[::2])
+
+            def drop_index(path=path):
+                if os.path.exists(f"{path}.idx"):
+                    os.remove(f"{path}.idx")
+            unprocessed = lambda path=path: sum(1 for _ in get_unprocessed_items(path, 'sutta_id', half))
+            record(f"unprocessed_items[{name}] rebuild", time_case(unprocessed, args.repeats, setup=drop_index))
+            record(f"unprocessed_items[{name}] index", time_case(unprocessed, args.repeats))
+
+    if selected('parse_sutta_page'):
+        source, pages = load_pages(cfg_manager, args.pages)
+        scraper = SuttaScraper(cfg_manager.config)
+        record(f"parse_sutta_page[{len(pages)} {source} pages]",
+               time_case(lambda: [scraper._parse_sutta_page(page) for page in pages], args.repeats))
+
+    if selected('prepare_corpus'):
+        for mode in ('name', 'hybrid'):
+            normalizer = make_normalizer(cfg_manager, mode=mode)
+            record(f"prepare_corpus[{mode}]", time_case(normalizer._prepare_corpus, args.repeats))
+
+    if selected('cluster_items'):
+        for backend in ('dense', 'knn'):
+            clustering = {**cfg_manager.config['concept_normalization'].get('clustering', {}), 'backend': backend}
+            normalizer = make_normalizer(cfg_manager, clustering=clustering)
+            for size in args.cluster_sizes:
+                embeddings = make_embeddings(size)
+                item_map = {i: i for i in range(size)}
+                record(f"cluster_items[{backend} {size}]",
+                       time_case(lambda: normalizer._cluster_items(embeddings, item_map), args.repeats))
+    return results
+
+
+def load_history(path: str) -> list:
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_history(path: str, history: list):
+    """Atomically replaces the history file."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(history, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def find_regressions(history: list, results: dict, host: str, threshold: float, baseline_runs: int) -> list:
+    """
+    Returns (case, seconds, baseline_seconds) for every case whose median is more
+    than `threshold` slower than the median of its last `baseline_runs` results on `host`.
+    """
+    regressions = []
+    for case, stats in results.items():
+        previous = [run['results'][case]['median_seconds'] for run in history
+                    if run.get('host') == host and case in run.get('results', {})][-baseline_runs:]
+        if not previous:
+            continue
+        baseline = statistics.median(previous)
+        if stats['median_seconds'] > baseline * (1 + threshold):
+            regressions.append((case, stats['median_seconds'], baseline))
+    return regressions
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline hot paths and check for regressions.")
+    parser.add_argument("--only", nargs="+", choices=["processed_ids", "unprocessed_items", "parse_sutta_page",
+                                                      "prepare_corpus", "cluster_items"],
+                        help="Run only these case groups.")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed runs per case (the median is kept).")
+    parser.add_argument("--pages", type=int, default=200, help="Pages parsed by the parse_sutta_page case.")
+    parser.add_argument("--cluster-sizes", type=int, nargs="+", default=[1000, 4000, 8000],
+                        help="Corpus sizes for the cluster_items case.")
+    parser.add_argument("--history", default=DEFAULT_HISTORY_PATH, help="JSON file the results are appended to.")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed slowdown against the baseline before failing (0.2 = 20%%).")
+    parser.add_argument("--baseline-runs", type=int, default=5, help="Recent runs the baseline is the median of.")
+    parser.add_argument("--no-record", action="store_true", help="Do not append this run to the history.")
+    args = parser.parse_args()
+
+    cfg_manager = ConfigManager()
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = run_cases(args, cfg_manager, work_dir)
+
+    host = platform.node()
+    history = load_history(args.history)
+    regressions = find_regressions(history, results, host, args.threshold, args.baseline_runs)
+
+    if not args.no_record:
+        history.append({
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'host': host,
+            'python': platform.python_version(),
+            'results': results,
+        })
+        save_history(args.history, history)
+        print(f"Results appended to {args.history}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        for case, seconds, baseline in regressions:
+            print(f"  {case}: {seconds:.4f}s vs baseline {baseline:.4f}s ({seconds / baseline - 1:+.0%})")
+        sys.exit(1)
+    print("\nNo regressions.")
+
+
+if __name__ == "__main__":
+    main()
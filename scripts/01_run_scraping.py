@@ -1,7 +1,20 @@
+import argparse
+
 from utils.config_helpers import ConfigManager
 from data_acquisition.scraper import SuttaScraper
 def main():
     """Loads configuration and runs the scraper."""
+    parser = argparse.ArgumentParser(description="Scrape suttas from dhammatalks.org.")
+    parser.add_argument(
+        "--reparse", action="store_true",
+        help="Rebuild the output from the raw HTML cache without any network access."
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="Continue an interrupted scrape, skipping pages that were already checkpointed."
+    )
+    args = parser.parse_args()
+
     # --- Setup ---
     # Use the ConfigManager to load config and handle paths
     cfg_manager = ConfigManager()
@@ -10,13 +23,18 @@ def main():
     # --- Path Management ---
     # Get the absolute path for the output file from the manager
     raw_data_path = cfg_manager.get_path('output_paths.raw_data')
+    validator_path = cfg_manager.get_path('output_paths.scrape_validators')
+    cache_dir = cfg_manager.get_path('output_paths.html_cache')
     
     # The scraper function will handle os.makedirs
     
     # --- Run Scraper ---
     # Pass both the config and the absolute output path
     scraper = SuttaScraper(config)
-    scraper.run(raw_data_path)
+    if args.reparse:
+        scraper.reparse(raw_data_path, cache_dir)
+    else:
+        scraper.run(raw_data_path, validator_path=validator_path, cache_dir=cache_dir, resume=args.resume)
     
     print("\nScraping process completed.")
 
@@ -1,10 +1,39 @@
+import argparse
+
 from utils.config_helpers import ConfigManager
 from processing.concept_extractor import ConceptExtractor
+from processing.multi_target_extractor import MultiTargetExtractor
 
 def main():
     """Initializes configuration and runs the concept extraction pipeline."""
+    parser = argparse.ArgumentParser(description="Extract concepts from suttas with an LLM.")
+    parser.add_argument(
+        "--batch", action="store_true",
+        help="Submit all unprocessed suttas as one provider batch job instead of interactive calls."
+    )
+    parser.add_argument(
+        "--replay", action="store_true",
+        help="Retry only the retryable items in the skip log, then compact the log."
+    )
+    parser.add_argument(
+        "--all-targets", action="store_true",
+        help="Run every (model_id, mode) pair in concept_extraction.targets concurrently in one pass."
+    )
+    args = parser.parse_args()
+
     # 1. Initialize configuration
     cfg_manager = ConfigManager()
+
+    if args.all_targets:
+        if args.batch or args.replay:
+            parser.error("--batch and --replay cannot be combined with --all-targets.")
+        targets = cfg_manager.config['concept_extraction'].get('targets', [])
+        target_names = ", ".join(f"{t['model_id']} ({t['mode']})" for t in targets)
+        print(f"--- Running Concept Extraction for {len(targets)} targets: {target_names} ---")
+        MultiTargetExtractor(cfg_manager, targets).run_pipeline()
+        print("\nConcept extraction process completed for all targets.")
+        return
+
     mode = cfg_manager.config['concept_extraction']['mode']
     model_id = cfg_manager.config['concept_extraction']['model_id']
     
@@ -13,7 +42,12 @@ def main():
     # 2. Initialize and run the extraction pipeline
     # The extractor now gets the mode from the config itself.
     extractor = ConceptExtractor(cfg_manager)
-    extractor.run_pipeline()
+    if args.replay:
+        extractor.replay_skipped()
+    elif args.batch:
+        extractor.run_batch()
+    else:
+        extractor.run_pipeline()
     
     print(f"\nConcept extraction process ('{mode}' mode) completed.")
 
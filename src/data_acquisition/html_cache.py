@@ -0,0 +1,92 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+
+class HtmlCache:
+    """
+    A content-addressed, compressed on-disk cache of raw sutta pages.
+
+    Page bodies are stored once per distinct content under
+    `objects/<sha[:2]>/<sha>.html.gz`, and `index.json` maps each URL to the
+    hash of its latest content plus the link metadata it was scraped with.
+    This lets the parsing rules be changed and the output rebuilt without
+    touching the network.
+    """
+
+    INDEX_FILENAME = "index.json"
+
+    def __init__(self, cache_dir: str):
+        """
+        Args:
+            cache_dir (str): Directory holding the index and the page objects.
+        """
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, self.INDEX_FILENAME)
+        self._index = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self._index = json.load(f)
+
+    def __contains__(self, url: str) -> bool:
+        with self._lock:
+            return url in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _object_path(self, content_hash: str) -> str:
+        return os.path.join(self.cache_dir, "objects", content_hash[:2], f"{content_hash}.html.gz")
+
+    def put(self, link_info: dict, html_content: str) -> str:
+        """
+        Stores a fetched page and points its URL at it.
+        Safe to call from worker threads.
+
+        Returns:
+            str: The SHA-256 hash of the page content.
+        """
+        data = html_content.encode('utf-8')
+        content_hash = hashlib.sha256(data).hexdigest()
+        object_path = self._object_path(content_hash)
+
+        # Identical content is only ever written once
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            tmp_path = f"{object_path}.{threading.get_ident()}.tmp"
+            with gzip.open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, object_path)
+
+        with self._lock:
+            self._index[link_info['url']] = {'sha256': content_hash, 'link_info': link_info}
+        return content_hash
+
+    def get(self, url: str) -> str | None:
+        """Returns the cached HTML for `url`, or None if it was never cached."""
+        with self._lock:
+            entry = self._index.get(url)
+        if not entry:
+            return None
+        with gzip.open(self._object_path(entry['sha256']), 'rb') as f:
+            return f.read().decode('utf-8')
+
+    def links(self) -> list[dict]:
+        """Returns the link metadata of every cached page, sorted by URL."""
+        with self._lock:
+            link_dicts = [entry['link_info'] for entry in self._index.values()]
+        link_dicts.sort(key=lambda x: x['url'])
+        return link_dicts
+
+    def save(self):
+        """Atomically writes the URL index to disk."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        with self._lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._index, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
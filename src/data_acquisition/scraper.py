@@ -1,14 +1,87 @@
+import json
 import os
 import re
+import threading
+import time
 import unicodedata
-from time import sleep
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from itertools import islice
 from urllib.parse import urlparse, urlunparse 
 
 import jsonlines
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
 
+from .html_cache import HtmlCache
+from .validator_store import ValidatorStore
+
+# Only the sutta container is ever read, so the parser is told to build nothing else
+SUTTA_STRAINER = SoupStrainer("div", id="sutta")
+# Number of pages handed to the parse process pool at a time
+PARSE_BATCH_SIZE = 256
+
+
+def parse_sutta_html(html_content: str, parser: str = "html.parser", targeted: bool = True) -> dict | None:
+    """
+    Extracts the title, introduction and body from the HTML of a sutta page.
+
+    Defined at module level so it can be shipped to worker processes.
+
+    Args:
+        html_content (str): The raw HTML of the page.
+        parser (str): The BeautifulSoup tree builder to use.
+        targeted (bool): Build only the `div#sutta` subtree instead of the whole
+                         document. Both produce identical output; the full parse
+                         is kept as the reference for benchmarks and parity tests.
+
+    Returns:
+        dict | None: The parsed fields, or None if the page has no sutta.
+    """
+    if targeted:
+        soup = BeautifulSoup(html_content, parser, parse_only=SUTTA_STRAINER)
+    else:
+        soup = BeautifulSoup(html_content, parser)
+    sutta_div = soup.find("div", id="sutta")
+    if not sutta_div:
+        return None
+
+    title_attr = sutta_div.find("h1")
+    title_text = re.sub(r'\s{2,}', ' ', unicodedata.normalize("NFKD", title_attr.get_text()).strip()) if title_attr else None
+    if title_attr:
+        title_attr.decompose()
+
+    # Decompose non-essential sections
+    for tag in sutta_div.find_all(["p", "div"], class_=["seealso", "note"]):
+        if tag:
+            tag.decompose()
+
+    full_text = unicodedata.normalize("NFKD", sutta_div.get_text()).strip()
+
+    sutta_body = ""
+    intro_text = ""
+    if '* * *' in full_text:
+        parts = full_text.split('* * *', 1)
+        intro_text = parts[0].strip()
+        sutta_body = parts[1].strip()
+    else:
+        sutta_body = full_text
+
+    return {
+        "title": title_text,
+        "introduction": intro_text,
+        "body": sutta_body,
+    }
+
+
+def _batched(iterable, size: int):
+    """Yields successive lists of up to `size` items from `iterable`."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
 
 class SuttaScraper:
     """
@@ -28,13 +101,40 @@ class SuttaScraper:
         self.base_url = dhammatalks_config['base_url']
         self.books = dhammatalks_config['books_of_interest']
         self.avoid = dhammatalks_config['avoid_in_url']
+
+        # Politeness settings for the concurrent fetch engine
+        self.concurrency = max(1, int(dhammatalks_config.get('concurrency', 1)))
+        self.rate_limiter = HostRateLimiter(dhammatalks_config.get('requests_per_second_per_host', 10))
+
+        # One pooled session for all requests, sized so every worker can keep a connection alive
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # In-memory until `run` is given a path to persist validators to
+        self.validators = ValidatorStore(None)
+        # Raw pages are only kept when `run` is given a cache directory
+        self.html_cache = None
+
+        # Parsing backend: "html.parser" (reference) or "lxml" (faster, optional dependency)
+        self.html_parser = dhammatalks_config.get('html_parser', 'html.parser')
+        self.parse_workers = max(1, int(dhammatalks_config.get('parse_workers', 1)))
+
+        # How many pages to scrape between durable checkpoints
+        self.checkpoint_every = max(1, int(dhammatalks_config.get('checkpoint_every', 50)))
         print("SuttaScraper initialized.")
 
     def get_sutta_links(self) -> list[dict]:
         """Scrapes the index page to find all relevant sutta URLs."""
         print(f"Fetching master list from {self.master_url}...")
+        cached_index = self.validators.get(self.master_url) or {}
+        headers = self.validators.conditional_headers(self.master_url) if cached_index.get('links') else {}
         try:
-            response = requests.get(self.master_url, timeout=30)
+            response = self.session.get(self.master_url, headers=headers, timeout=30)
+            if response.status_code == 304:
+                print(f"Master list not modified; reusing {len(cached_index['links'])} cached sutta links.")
+                return cached_index['links']
             response.raise_for_status()
             response.encoding = "UTF-8"
             soup = BeautifulSoup(response.text, "html.parser")
@@ -77,6 +177,7 @@ class SuttaScraper:
 
             link_dicts = list(unique_urls.values())
             link_dicts.sort(key=lambda x: x['url'])
+            self.validators.update(self.master_url, response.headers, links=link_dicts)
             print(f"Found and sorted {len(link_dicts)} sutta links to process.")
             return link_dicts
         except requests.RequestException as e:
@@ -88,45 +189,48 @@ class SuttaScraper:
         Parses the HTML of a single sutta page to extract structured data.
         This is an internal helper method.
         """
-        soup = BeautifulSoup(html_content, "html.parser")
-        sutta_div = soup.find("div", id="sutta")
-        if not sutta_div:
-            return None
+        return parse_sutta_html(html_content, parser=self.html_parser)
 
-        title_attr = sutta_div.find("h1")
-        title_text = re.sub(r'\s{2,}', ' ', unicodedata.normalize("NFKD", title_attr.get_text()).strip()) if title_attr else None
-        if title_attr:
-            title_attr.decompose()
+    def _parse_pages(self, html_contents):
+        """
+        Parses an iterable of pages in order, fanning out to a process pool
+        when `parse_workers` is greater than 1.
+        """
+        if self.parse_workers <= 1:
+            for html_content in html_contents:
+                yield self._parse_sutta_page(html_content)
+            return
 
-        # Decompose non-essential sections
-        for tag in sutta_div.find_all(["p", "div"], class_=["seealso", "note"]):
-            if tag:
-                tag.decompose()
+        parse = partial(parse_sutta_html, parser=self.html_parser)
+        with ProcessPoolExecutor(max_workers=self.parse_workers) as executor:
+            # Submit in bounded batches so the whole corpus is never held in memory at once
+            for batch in _batched(html_contents, PARSE_BATCH_SIZE):
+                yield from executor.map(parse, batch, chunksize=8)
 
-        full_text = unicodedata.normalize("NFKD", sutta_div.get_text()).strip()
+    def run(self, output_path: str, validator_path: str | None = None, cache_dir: str | None = None,
+            resume: bool = False):
+        """
+        Main method to run the full scraping and parsing pipeline.
 
-        sutta_body = ""
-        intro_text = ""
-        if '* * *' in full_text:
-            parts = full_text.split('* * *', 1)
-            intro_text = parts[0].strip()
-            sutta_body = parts[1].strip()
-        else:
-            sutta_body = full_text
+        When `validator_path` is given, ETag/Last-Modified validators are kept
+        there between runs. Pages that already have a record in `output_path`
+        are then requested conditionally, and on `304 Not Modified` the existing
+        record is carried over instead of being re-downloaded and re-parsed.
 
-        return {
-            "title": title_text,
-            "introduction": intro_text,
-            "body": sutta_body,
-        }
+        When `cache_dir` is given, every fetched page is also stored in a
+        compressed HtmlCache so the output can later be rebuilt with `reparse`.
 
-    def run(self, output_path: str):
-        """
-        Main method to run the full scraping and parsing pipeline.
+        Records are checkpointed to `<output_path>.partial` as they complete.
+        With `resume=True`, pages already in that checkpoint are not fetched again.
 
         Args:
             output_path (str): The absolute path to the output .jsonl file.
+            validator_path (str | None): The absolute path to the validator store.
+            cache_dir (str | None): The absolute path to the raw HTML cache.
+            resume (bool): Continue an interrupted run from its checkpoint.
         """
+        self.validators = ValidatorStore(validator_path)
+        self.html_cache = HtmlCache(cache_dir) if cache_dir else None
         sutta_links = self.get_sutta_links()
 
         if not sutta_links:
@@ -136,30 +240,227 @@ class SuttaScraper:
         # Ensure the directory exists before writing
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-        print(f"Scraping suttas and saving to {output_path}...")
+        partial_path = f"{output_path}.partial"
+        checkpoint_records = self._load_checkpoint(partial_path)
+
+        # Records from the previous run can be reused for unchanged pages. Checkpointed
+        # records are newer than the output, since their validators may already be saved.
+        previous_records = {}
+        if validator_path:
+            previous_records = {**self._load_existing_records(output_path), **checkpoint_records}
+
+        done_urls = set(checkpoint_records) if resume else set()
+        links_to_fetch = [link for link in sutta_links if link['url'] not in done_urls]
+        if done_urls:
+            print(f"Resuming: {len(sutta_links) - len(links_to_fetch)} suttas already checkpointed.")
+
+        print(f"Scraping suttas and saving to {output_path} "
+              f"({self.concurrency} workers, {self.rate_limiter.requests_per_second} req/s per host)...")
+
+        counts = {'fetched': 0, 'not_modified': 0, 'failed': 0}
+        bytes_fetched = 0
+        start_time = time.monotonic()
+
+        def fetch(link_info):
+            url = link_info['url']
+            # A page may only be skipped as unchanged if we can still rebuild its record
+            conditional = url in previous_records and (self.html_cache is None or url in self.html_cache)
+            return self._fetch_page(link_info, conditional=conditional)
+
+        # `executor.map` yields results in submission order, so records are
+        # checkpointed in the URL-sorted order of `sutta_links`.
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        progress = tqdm(total=len(sutta_links), initial=len(sutta_links) - len(links_to_fetch),
+                        desc="Scraping Suttas", unit="page")
+        try:
+            with open(partial_path, 'a' if resume else 'w', encoding='utf-8') as checkpoint:
+                for i, (link_info, (status, html_content, response_headers)) in enumerate(
+                        zip(links_to_fetch, executor.map(fetch, links_to_fetch)), 1):
+                    progress.update(1)
+                    counts[status] += 1
+
+                    if status == 'fetched':
+                        bytes_fetched += len(html_content)
+                        elapsed = max(time.monotonic() - start_time, 1e-9)
+                        progress.set_postfix(kB_s=f"{bytes_fetched / 1024 / elapsed:.1f}", unchanged=counts['not_modified'])
+                        parsed_data = self._parse_sutta_page(html_content)
+                        final_record = {**link_info, **parsed_data, } if parsed_data else None
+                    else:
+                        # Unchanged (304) or temporarily unreachable: keep what we already have
+                        final_record = previous_records.get(link_info['url'])
+
+                    if final_record:
+                        # One write per record, so a crash can at worst cut off the last line
+                        checkpoint.write(json.dumps(final_record, ensure_ascii=False) + "\n")
+                        checkpoint.flush()
+
+                    if status == 'fetched':
+                        # Only vouch for a page once its record is checkpointed, so a crash never
+                        # leaves a new validator next to the old record (a 304 would keep it forever)
+                        if final_record:
+                            self.validators.update(link_info['url'], response_headers)
+                        if self.html_cache is not None:
+                            self.html_cache.put(link_info, html_content)
+
+                    if i % self.checkpoint_every == 0:
+                        self._save_checkpoint(checkpoint)
+                self._save_checkpoint(checkpoint)
+        except BaseException:
+            # Network drop, Ctrl-C, ...: drop queued pages, let in-flight ones finish, keep what is checkpointed
+            executor.shutdown(cancel_futures=True)
+            progress.close()
+            print(f"\nScrape interrupted. Progress is checkpointed in {partial_path}; "
+                  f"re-run with resume to fetch only the missing pages.")
+            raise
+        executor.shutdown()
+        progress.close()
+
+        # Rewrite the file from scratch in URL order to ensure UID consistency.
+        # The new file is swapped in whole, so a failed run never leaves a truncated output behind.
+        records_by_url = self._load_checkpoint(partial_path)
+        tmp_path = f"{output_path}.tmp"
+        suttas_saved_count = 0
+        with jsonlines.open(tmp_path, mode='w') as writer:
+            for link_info in sutta_links:
+                final_record = records_by_url.get(link_info['url'])
+                if final_record:
+                    writer.write(final_record)
+                    suttas_saved_count += 1
+
+        os.replace(tmp_path, output_path)
+        os.remove(partial_path)
+        print(f"Fetched {counts['fetched']} pages, {counts['not_modified']} unchanged, {counts['failed']} failed.")
+        print(f"A total of {suttas_saved_count} suttas were scraped and saved.")
+
+    def _save_checkpoint(self, checkpoint_file):
+        """
+        Makes the checkpointed records durable, then persists the validators and
+        cache index. Validators are only updated after their record is checkpointed,
+        so every saved validator vouches for a record that is on disk.
+        """
+        checkpoint_file.flush()
+        os.fsync(checkpoint_file.fileno())
+        self.validators.save()
+        if self.html_cache is not None:
+            self.html_cache.save()
+
+    @staticmethod
+    def _load_checkpoint(partial_path: str) -> dict:
+        """
+        Loads the records checkpointed by an interrupted run, keyed by URL.
+        A half-written last line is cut off so appending can continue cleanly.
+        """
+        if not os.path.exists(partial_path):
+            return {}
+
+        records = {}
+        valid_bytes = 0
+        with open(partial_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                records[record['url']] = record
+                valid_bytes += len(line)
+
+        if valid_bytes < os.path.getsize(partial_path):
+            with open(partial_path, 'r+b') as f:
+                f.truncate(valid_bytes)
+        return records
+
+    def _fetch_page(self, link_info: dict, conditional: bool = False) -> tuple[str, str | None, dict | None]:
+        """
+        Fetches the HTML of a single sutta page, respecting the per-host rate cap.
+        Runs on worker threads, so it leaves the validators and the HTML cache to
+        the caller, which updates them once the page's record is checkpointed.
 
-        suttas_saved_count = 1
+        Returns:
+            A (status, html, headers) tuple where status is 'fetched', 'not_modified'
+            or 'failed'. The html and response headers are only set for 'fetched'.
+        """
+        url = link_info['url']
+        headers = self.validators.conditional_headers(url) if conditional else {}
+        self.rate_limiter.wait(urlparse(url).netloc)
+        try:
+            response = self.session.get(url, headers=headers, timeout=30)
+            if response.status_code == 304:
+                return 'not_modified', None, None
+            response.raise_for_status()
+            response.encoding = "UTF-8"
+            return 'fetched', response.text, response.headers
+        except requests.RequestException as e:
+            print(f"Could not fetch {url}: {e}")
+            return 'failed', None, None
 
-        # Overwrite the file from scratch to ensure UID consistency
-        with jsonlines.open(output_path, mode='w') as writer:
-            for link_info in tqdm(sutta_links, desc="Scraping Suttas"):
-                try:
-                    response = requests.get(link_info['url'], timeout=30)
-                    response.raise_for_status()
-                    response.encoding = "UTF-8"
+    def reparse(self, output_path: str, cache_dir: str):
+        """
+        Rebuilds the output file from the raw HTML cache, without any network access.
+        Use this after changing the parsing rules in `_parse_sutta_page`.
 
-                    parsed_data = self._parse_sutta_page(response.text)
+        Args:
+            output_path (str): The absolute path to the output .jsonl file.
+            cache_dir (str): The absolute path to the raw HTML cache.
+        """
+        html_cache = HtmlCache(cache_dir)
+        sutta_links = html_cache.links()
+        if not sutta_links:
+            print(f"No cached pages found in {cache_dir}. Exiting.")
+            return
 
-                    if parsed_data:
-                        final_record = {**link_info, **parsed_data, }
-                        writer.write(final_record)
-                        suttas_saved_count += 1
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        print(f"Re-parsing {len(sutta_links)} cached pages into {output_path}...")
+
+        suttas_saved_count = 0
+        tmp_path = f"{output_path}.tmp"
+        html_contents = (html_cache.get(link_info['url']) for link_info in sutta_links)
+        parsed_pages = self._parse_pages(html_contents)
+        with jsonlines.open(tmp_path, mode='w') as writer:
+            for link_info in tqdm(sutta_links, desc="Re-parsing Suttas", unit="page"):
+                parsed_data = next(parsed_pages)
+                if parsed_data:
+                    writer.write({**link_info, **parsed_data, })
+                    suttas_saved_count += 1
+
+        os.replace(tmp_path, output_path)
+        print(f"A total of {suttas_saved_count} suttas were re-parsed and saved.")
+
+    @staticmethod
+    def _load_existing_records(output_path: str) -> dict:
+        """Loads the records of a previous scrape, keyed by URL."""
+        if not os.path.exists(output_path):
+            return {}
+        with jsonlines.open(output_path) as reader:
+            return {record['url']: record for record in reader}
+
+
+class HostRateLimiter:
+    """
+    A thread-safe limiter that spaces out requests to the same host.
 
-                    sleep(0.1)
+    Each host gets at most `requests_per_second` request starts per second,
+    regardless of how many worker threads are fetching from it.
+    """
 
-                except requests.RequestException as e:
-                    print(f"Could not fetch {link_info['url']}: {e}")
-        print(f"A total of {suttas_saved_count-1} suttas were scraped and saved.")
+    def __init__(self, requests_per_second: float):
+        self.requests_per_second = requests_per_second
+        self.min_interval = 1.0 / requests_per_second if requests_per_second and requests_per_second > 0 else 0.0
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host: str):
+        """Blocks until the caller may send the next request to `host`."""
+        if not self.min_interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
 
 
 # --- This part is kept for potential direct execution or for clarity ---
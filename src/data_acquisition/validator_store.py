@@ -0,0 +1,74 @@
+import json
+import os
+import threading
+
+
+class ValidatorStore:
+    """
+    A small on-disk store of HTTP cache validators (ETag / Last-Modified) per URL.
+
+    The scraper uses it to send conditional requests on re-scrapes, so pages that
+    have not changed since the last run come back as cheap `304 Not Modified`
+    responses instead of full downloads. Entries may also carry extra payload
+    (e.g. the parsed link list of the master index).
+    """
+
+    def __init__(self, path: str | None):
+        """
+        Args:
+            path (str | None): Path to the JSON file backing the store. If None,
+                               the store is kept in memory only and never saved.
+        """
+        self.path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Warning: Could not read validator store {path} ({e}). Starting empty.")
+                self._entries = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, url: str) -> dict | None:
+        """Returns the stored entry for `url`, or None if there is none."""
+        with self._lock:
+            return self._entries.get(url)
+
+    def conditional_headers(self, url: str) -> dict:
+        """Builds `If-None-Match` / `If-Modified-Since` headers for `url`."""
+        entry = self.get(url) or {}
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def update(self, url: str, response_headers, **payload):
+        """
+        Records the validators from a successful response.
+        URLs whose response carries no validators are dropped from the store.
+        """
+        etag = response_headers.get('ETag')
+        last_modified = response_headers.get('Last-Modified')
+        with self._lock:
+            if not etag and not last_modified:
+                self._entries.pop(url, None)
+                return
+            self._entries[url] = {'etag': etag, 'last_modified': last_modified, **payload}
+
+    def save(self):
+        """Atomically writes the store to disk."""
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with self._lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -1,8 +1,13 @@
 import os
 import json
 import jsonlines
+import torch
 from abc import ABC, abstractmethod
-from sentence_transformers import SentenceTransformer, util
+from sentence_transformers import SentenceTransformer
+
+from utils.clustering import get_clustering_backend
+from utils.embedding_cache import EmbeddingCache
+from utils.text_helpers import canonicalize_text
 
 class BaseNormalizer(ABC):
     """
@@ -23,11 +28,31 @@ class BaseNormalizer(ABC):
         self.embedding_model_id = self.norm_config['embedding_model_id']
         self.min_community_size = self.norm_config['min_community_size']
         self.threshold = self.norm_config['threshold']
+        # Embed each distinct (canonicalized) text once and expand clusters back afterwards
+        self.collapse_duplicates = self.norm_config.get('collapse_duplicates', True)
+        # Dense n×n community detection by default; 'knn' bounds memory by n·k
+        self.clustering_backend = get_clustering_backend(self.norm_config.get('clustering'))
         
-        # Initialize the embedding model
-        print(f"Loading embedding model: {self.embedding_model_id}...")
-        self.model = SentenceTransformer(self.embedding_model_id)
-        print("Model loaded.")
+        # The embedding model is loaded on first use, so runs served entirely
+        # from the embedding cache go straight to clustering
+        self._model = None
+
+        # Optionally keep every embedding on disk, keyed by (model, text hash)
+        self.embedding_cache = None
+        cache_config = self.norm_config.get('embedding_cache', {})
+        if cache_config.get('enabled'):
+            self.embedding_cache = EmbeddingCache(
+                self.cfg_manager.get_path(f'{self._get_config_key()}.embedding_cache.path'),
+                self.embedding_model_id
+            )
+
+    @property
+    def model(self) -> SentenceTransformer:
+        if self._model is None:
+            print(f"Loading embedding model: {self.embedding_model_id}...")
+            self._model = SentenceTransformer(self.embedding_model_id)
+            print("Model loaded.")
+        return self._model
 
     @abstractmethod
     def _get_config_key(self) -> str:
@@ -42,7 +67,8 @@ class BaseNormalizer(ABC):
     @abstractmethod
     def _prepare_corpus(self) -> tuple[list, dict]:
         """
-        Load the source data, deduplicate, and prepare the corpus for embedding.
+        Load the source data and prepare the corpus for embedding, one entry per
+        item. Exact duplicates are collapsed afterwards by the base class.
         
         Returns:
             A tuple containing (corpus_texts, item_map), where item_map maps
@@ -56,14 +82,19 @@ class BaseNormalizer(ABC):
         
         # 1. Prepare data using subclass-specific logic
         corpus, item_map = self._prepare_corpus()
+
+        # 2. Collapse exact duplicates into one entry each (shared logic)
+        occurrences = None
+        if self.collapse_duplicates:
+            corpus, occurrences = self._collapse_duplicates(corpus)
         
-        # 2. Generate embeddings (shared logic)
+        # 3. Generate embeddings (shared logic)
         embeddings = self._generate_embeddings(corpus)
         
-        # 3. Cluster items (shared logic)
-        clusters = self._cluster_items(embeddings, item_map)
+        # 4. Cluster items (shared logic)
+        clusters = self._cluster_items(embeddings, item_map, occurrences)
         
-        # 4. Save results (shared logic)
+        # 5. Save results (shared logic)
         output_path = self._get_output_path()
         self._save_clusters(clusters, output_path)
         
@@ -71,29 +102,79 @@ class BaseNormalizer(ABC):
         print(f"Results saved to: {output_path}")
 
     def _generate_embeddings(self, corpus: list):
-        """Generates embeddings for the given text corpus."""
-        print(f"Generating embeddings for {len(corpus)} items...")
-        return self.model.encode(
-            corpus, 
-            show_progress_bar=True, 
-            convert_to_tensor=True
-        )
+        """
+        Generates embeddings for the given text corpus. With the embedding cache
+        on, only texts that were never encoded with this model are encoded.
+        """
+        if self.embedding_cache is None:
+            print(f"Generating embeddings for {len(corpus)} items...")
+            return self.model.encode(
+                corpus, 
+                show_progress_bar=True, 
+                convert_to_tensor=True
+            )
 
-    def _cluster_items(self, embeddings, item_map: dict):
-        """Performs community detection to cluster items."""
-        print("Clustering items using community detection...")
-        clusters_indices = util.community_detection(
+        embeddings, missing = self.embedding_cache.lookup(corpus)
+        print(f"Embedding cache: {len(corpus) - len(missing)} of {len(corpus)} items cached.")
+        if missing:
+            # Each distinct text is encoded once
+            new_texts = list(dict.fromkeys(corpus[i] for i in missing))
+            print(f"Generating embeddings for {len(new_texts)} new items...")
+            new_embeddings = self.model.encode(new_texts, show_progress_bar=True, convert_to_numpy=True)
+            self.embedding_cache.add(new_texts, new_embeddings)
+            embeddings, missing = self.embedding_cache.lookup(corpus)
+        return torch.from_numpy(embeddings)
+
+    def _collapse_duplicates(self, corpus: list) -> tuple[list, list]:
+        """
+        Collapses corpus entries that are identical after `canonicalize_text`.
+
+        Returns:
+            A tuple (unique_corpus, occurrences): one entry per distinct text (its
+            first original spelling, which is what gets embedded), and for each
+            of them the list of original corpus indices it stands for.
+        """
+        rows = {}
+        unique_corpus = []
+        occurrences = []
+        for index, text in enumerate(corpus):
+            key = canonicalize_text(text)
+            row = rows.get(key)
+            if row is None:
+                row = rows[key] = len(unique_corpus)
+                unique_corpus.append(text)
+                occurrences.append([])
+            occurrences[row].append(index)
+        print(f"Collapsed {len(corpus)} corpus entries into {len(unique_corpus)} distinct texts.")
+        return unique_corpus, occurrences
+
+    def _cluster_items(self, embeddings, item_map: dict, occurrences: list | None = None):
+        """
+        Performs community detection to cluster items.
+
+        With `occurrences` (see `_collapse_duplicates`), each embedding stands for
+        several items. Each distinct text is weighted by its number of items in
+        the community size checks, so the communities are the same as without
+        collapsing, and are then expanded back to every item.
+        """
+        print(f"Clustering items using {self.clustering_backend.__class__.__name__}...")
+        clusters_indices = self.clustering_backend.find_communities(
             embeddings, 
             min_community_size=self.min_community_size, 
-            threshold=self.threshold
+            threshold=self.threshold,
+            weights=None if occurrences is None else [len(rows) for rows in occurrences]
         )
         
         # Map indices back to full item objects
         final_clusters = []
         for cluster in clusters_indices:
+            if occurrences is not None:
+                cluster = [idx for row in cluster for idx in occurrences[row]]
             cluster_items = [item_map[idx] for idx in cluster]
             final_clusters.append(cluster_items)
-            
+
+        # Largest clusters first, as community detection orders them
+        final_clusters.sort(key=len, reverse=True)
         return final_clusters
 
     def _save_clusters(self, clusters: list, output_path: str):
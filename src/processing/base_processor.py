@@ -1,13 +1,49 @@
 import os
-import sys  
+import heapq
 import time
 import jsonlines
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from tqdm import tqdm
 from datetime import datetime
 
 from utils.data_helpers import get_processed_ids, get_unprocessed_items
-from utils.llm_helpers import RateLimitException
+from utils.result_writer import JsonlResultWriter
+from utils.sutta_store import SuttaStore
+from utils.skip_log import (
+    FAILURE_EMPTY, FAILURE_OTHER, FAILURE_RATE_LIMIT, FAILURE_VALIDATION,
+    classify_failure, load_skip_log, write_skip_log
+)
+
+# Replay defaults: which failure classes are retried, how long each waits
+# before a retry (doubled per attempt), and the order ready retries go out in
+REPLAY_RETRY_CLASSES = (FAILURE_RATE_LIMIT, FAILURE_VALIDATION, FAILURE_OTHER)
+REPLAY_BACKOFF_SECONDS = {FAILURE_VALIDATION: 0, FAILURE_OTHER: 5, FAILURE_RATE_LIMIT: 30, FAILURE_EMPTY: 0}
+REPLAY_PRIORITY = {FAILURE_VALIDATION: 0, FAILURE_OTHER: 1, FAILURE_RATE_LIMIT: 2, FAILURE_EMPTY: 3}
+
+def iter_completed(executor, process_unit, units, max_in_flight: int):
+    """
+    Runs `process_unit` on each unit with at most `max_in_flight` units pending
+    at a time, and yields the entries of each returned list as units complete.
+    """
+    units_iter = iter(units)
+    pending = set()
+
+    def submit_next():
+        unit = next(units_iter, None)
+        if unit is not None:
+            pending.add(executor.submit(process_unit, unit))
+
+    for _ in range(max_in_flight):
+        submit_next()
+
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.discard(future)
+            yield from future.result()
+            submit_next()
+
 
 class BaseProcessor(ABC):
     """
@@ -18,6 +54,12 @@ class BaseProcessor(ABC):
     def __init__(self, cfg_manager):
         self.cfg_manager = cfg_manager
         self.config = cfg_manager.config
+
+        # Subclasses define which config section holds their settings (e.g., 'concept_extraction')
+        self.processor_config = self.config.get(self._get_config_key(), {})
+
+        # Number of items processed concurrently (1 = sequential)
+        self.max_in_flight = max(1, int(self.processor_config.get('max_in_flight', 1)))
         
         # Paths that are common to most processors
         self.output_path = self._get_output_path()
@@ -28,7 +70,15 @@ class BaseProcessor(ABC):
         os.makedirs(os.path.dirname(self.output_path), exist_ok=True)
         os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
 
+        # A single long-lived writer for results; opened for the duration of a run
+        self.result_writer = JsonlResultWriter.from_config(self.output_path, self.processor_config.get('writer'))
+
     # --- Abstract methods for subclasses to implement ---
+    @abstractmethod
+    def _get_config_key(self) -> str:
+        """Return the key for the relevant section in settings.yaml."""
+        pass
+
     @abstractmethod
     def _get_source_path(self) -> str:
         """Return the absolute path to the input data file."""
@@ -55,6 +105,7 @@ class BaseProcessor(ABC):
         Perform the core processing logic on a single item.
         Should raise an exception on failure.
         Returns the result record to be saved.
+        Must be thread-safe when `max_in_flight` is greater than 1.
         """
         pass
 
@@ -73,43 +124,167 @@ class BaseProcessor(ABC):
             processed_ids_set=processed_ids
         )
 
+    def _iter_work_units(self, items):
+        """
+        Groups items into units of work, each dispatched as one task.
+        By default every item is its own unit; subclasses may batch several items together.
+        """
+        return iter(items)
+
+    def _process_unit(self, unit) -> list:
+        """
+        Processes one unit of work and returns a list of (item, result, error)
+        tuples, one per item in the unit. By default a unit is a single item
+        handed to `_process_item`.
+        """
+        try:
+            return [(unit, self._process_item(unit), None)]
+        except Exception as e:
+            return [(unit, None, e)]
+
+    def _iter_completed(self, executor, items):
+        """
+        Submits units of work to the executor with at most `max_in_flight` of them
+        pending at a time, and yields (item, result, error) for every item as its unit completes.
+        """
+        yield from iter_completed(executor, self._process_unit, self._iter_work_units(items), self.max_in_flight)
+
     def run_pipeline(self):
         """Executes the full, generic processing pipeline."""
-        items_to_process = self._load_unprocessed_items()
+        try:
+            items_to_process = self._load_unprocessed_items()
         
-        if not items_to_process:
-            print("No new items to process. Exiting.")
-            return
+            if not items_to_process:
+                print("No new items to process. Exiting.")
+                return
 
-        skipped_items_log = []
-        
-        for item in tqdm(items_to_process, desc=f"Processing ({self.__class__.__name__})"):
-            item_id = item.get("sutta_id", "Unknown")
-            try:
-                result_record = self._process_item(item)
-                
-                with jsonlines.open(self.output_path, mode='a') as writer:
-                    writer.write(result_record)
-                
-                time.sleep(0.5) # Optional: rate limiting
-
-            except RateLimitException as e:
-                # This is a fatal, script-ending error. Handle exit here.
-                print(f"\n\nFATAL ERROR: The process was halted due to an API rate limit or resource exhaustion.", file=sys.stderr)
-                print(f"Details: {e}", file=sys.stderr)
-                if skipped_items_log:
-                    print(f"Saving log for {len(skipped_items_log)} items that were skipped before this fatal error to {self.log_path}", file=sys.stderr)
-                    with jsonlines.open(self.log_path, mode='a') as writer:
-                        writer.write_all(skipped_items_log)
-                print("Exiting with error code 1.", file=sys.stderr)
-                sys.exit(1)
-
-            except Exception as e:
-                # This is a non-fatal, per-item error. Log it and continue the loop.
-                print(f"\nSKIPPING {item_id}: {e}")
-                skipped_items_log.append({"item_id": item_id, "reason": str(e)})
+            skipped_items_log = []
+
+            # Items are dispatched concurrently, and each result is handed to the
+            # writer as soon as it completes, so resuming via `get_processed_ids` keeps working.
+            # Pacing is left to the LLM client's shared rate limiter.
+            with self.result_writer, ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+                progress = tqdm(total=len(items_to_process), desc=f"Processing ({self.__class__.__name__})")
+                for item, result_record, error in self._iter_completed(executor, items_to_process):
+                    progress.update(1)
+                    item_id = item.get("sutta_id", "Unknown")
 
+                    if error is None:
+                        self.result_writer.write(result_record)
+                    else:
+                        # A per-item error (including a rate limit that outlasted every retry).
+                        # Log it and continue the loop; the item is picked up again on the next run.
+                        print(f"\nSKIPPING {item_id}: {error}")
+                        skipped_items_log.append({"item_id": item_id, "reason": str(error)})
+                progress.close()
+
+            self._log_skipped_items(skipped_items_log)
+            self._report_run_stats()
+        finally:
+            self._close_run()
+
+    def _log_skipped_items(self, skipped_items_log: list):
+        """Appends skipped items and their reasons to the log file."""
         if skipped_items_log:
             print(f"\nINFO: {len(skipped_items_log)} items were skipped. Logging to {self.log_path}")
             with jsonlines.open(self.log_path, mode='a') as writer:
-                writer.write_all(skipped_items_log)
\ No newline at end of file
+                writer.write_all(skipped_items_log)
+
+    def _report_run_stats(self):
+        """Hook for subclasses to print run statistics (e.g., cache hit rates) at the end of a run."""
+        pass
+
+    def _close_run(self):
+        """Hook for subclasses to release per-run resources (e.g., a provider prompt cache) once a run ends."""
+        pass
+
+    # --- Skip-log replay ---
+    def _load_items_by_id(self, item_ids: set) -> dict:
+        """Fetches the requested items from the source by ID, one indexed lookup each."""
+        store = SuttaStore(self.source_path, id_key='sutta_id')
+        return {item_id: store.get(item_id) for item_id in item_ids if item_id in store}
+
+    def replay_skipped(self):
+        """
+        Retries the items recorded in the skip log instead of running the full pipeline.
+
+        Each logged failure is classified (rate limit, validation, empty body or
+        other). Items in a retryable class go into a priority queue, each class
+        with its own backoff that doubles on every further attempt, and are
+        dispatched with the usual concurrency. Afterwards the skip log is
+        rewritten atomically with one entry per item that is still failing, so
+        recovered and already-processed items drop out of it.
+        """
+        try:
+            replay_config = self.processor_config.get('replay', {})
+            retry_classes = set(replay_config.get('retry_classes', REPLAY_RETRY_CLASSES))
+            backoff_seconds = {**REPLAY_BACKOFF_SECONDS, **replay_config.get('backoff_seconds', {})}
+            max_attempts = replay_config.get('max_attempts', 3)
+
+            entries = load_skip_log(self.log_path)
+            if not entries:
+                print(f"No skipped items in {self.log_path}. Exiting.")
+                return
+
+            # Items that a later run already processed are dropped from the log
+            processed_ids = get_processed_ids(processed_path=self.output_path, id_key='sutta_id', **self._get_run_config())
+            remaining = {}
+            to_retry = set()
+            for item_id, entry in entries.items():
+                if item_id in processed_ids:
+                    continue
+                entry['failure_class'] = classify_failure(entry.get('reason'))
+                entry.setdefault('attempts', 0)
+                remaining[item_id] = entry
+                if entry['failure_class'] in retry_classes and entry['attempts'] < max_attempts:
+                    to_retry.add(item_id)
+
+            items = self._load_items_by_id(to_retry)
+            print(f"Skip log holds {len(entries)} items: {len(entries) - len(remaining)} already processed, "
+                  f"{len(items)} to retry, {len(remaining) - len(items)} not retryable or missing from the source.")
+
+            # Queue entries are (ready_at, class priority, sequence, item_id)
+            queue = []
+            for sequence, item_id in enumerate(items):
+                priority = REPLAY_PRIORITY.get(remaining[item_id]['failure_class'], len(REPLAY_PRIORITY))
+                heapq.heappush(queue, (time.monotonic(), priority, sequence, item_id))
+            sequence = len(queue)
+
+            recovered = 0
+            pending = {}
+            with self.result_writer, ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+                while queue or pending:
+                    now = time.monotonic()
+                    while queue and queue[0][0] <= now and len(pending) < self.max_in_flight:
+                        item_id = heapq.heappop(queue)[3]
+                        pending[executor.submit(self._process_unit, items[item_id])] = item_id
+                    if not pending:
+                        # Nothing in flight; wait for the next item's backoff to run out
+                        time.sleep(queue[0][0] - now)
+                        continue
+
+                    timeout = max(0.0, queue[0][0] - now) if queue and len(pending) < self.max_in_flight else None
+                    done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        item_id = pending.pop(future)
+                        for item, result_record, error in future.result():
+                            if error is None:
+                                self.result_writer.write(result_record)
+                                del remaining[item_id]
+                                recovered += 1
+                                continue
+
+                            entry = remaining[item_id]
+                            entry.update(reason=str(error), failure_class=classify_failure(str(error)),
+                                         attempts=entry['attempts'] + 1)
+                            if entry['failure_class'] in retry_classes and entry['attempts'] < max_attempts:
+                                delay = backoff_seconds.get(entry['failure_class'], 0) * 2 ** (entry['attempts'] - 1)
+                                priority = REPLAY_PRIORITY.get(entry['failure_class'], len(REPLAY_PRIORITY))
+                                heapq.heappush(queue, (time.monotonic() + delay, priority, sequence, item_id))
+                                sequence += 1
+
+            write_skip_log(self.log_path, list(remaining.values()))
+            print(f"Replay recovered {recovered} items; {len(remaining)} remain in {self.log_path}.")
+            self._report_run_stats()
+        finally:
+            self._close_run()
@@ -1,17 +1,37 @@
 from .base_processor import BaseProcessor
-from utils.schemas import SuttaConceptsDiscovery, SuttaConceptsFixed
-from utils.llm_helpers import get_llm_client 
+from utils.schemas import (
+    ConceptDiscovery, ConceptFixed, SuttaConceptsDiscovery, SuttaConceptsFixed, PackedConceptsDiscovery, PackedConceptsFixed
+)
+from utils.llm_helpers import UsageStats, get_llm_client, get_provider_name
+from utils.llm_cache import CachedLLMClient, get_response_cache
+from utils.batch_helpers import BATCH_COMPLETED, get_batch_backend
 from utils.config_helpers import sanitize_for_filename
+from utils.text_helpers import split_into_chunks
+from utils.rate_limiter import estimate_tokens
+from utils.json_repair import repair_truncated_json
+from utils.concept_stream import ConceptStreamParser, MalformedStreamError, StreamStats
+from utils.telemetry import CallTelemetry
+from concurrent.futures import ThreadPoolExecutor
+import os
 import json
+import threading
+import time
 from pydantic import ValidationError
 from datetime import datetime
 
 class ConceptExtractor(BaseProcessor):
-    def __init__(self, cfg_manager):
+    def __init__(self, cfg_manager, target: dict | None = None):
+        """
+        Args:
+            cfg_manager: The configuration manager.
+            target (dict | None): Overrides for the `concept_extraction` settings
+                                  (e.g., {'model_id': ..., 'mode': ...}) to run one
+                                  of several extraction targets.
+        """
         # Base class __init__ will handle path setup
 
         # Specific setup for concept extraction
-        self.extraction_config = cfg_manager.config['concept_extraction']
+        self.extraction_config = {**cfg_manager.config['concept_extraction'], **(target or {})}
         self.strategy = self.extraction_config['mode'] 
         self.model_id = self.extraction_config['model_id']
         
@@ -25,9 +45,13 @@ class ConceptExtractor(BaseProcessor):
         if self.strategy == 'discovery':
             instructions = self.extraction_config['discovery_instructions']
             self.response_schema_class = SuttaConceptsDiscovery
+            self.concept_schema_class = ConceptDiscovery
+            self.packed_schema_class = PackedConceptsDiscovery
         elif self.strategy == 'fixed':
             instructions = self.extraction_config['fixed_instructions']
             self.response_schema_class = SuttaConceptsFixed
+            self.concept_schema_class = ConceptFixed
+            self.packed_schema_class = PackedConceptsFixed
         else:
             raise ValueError(f"Invalid extraction strategy: {self.strategy}")
 
@@ -38,15 +62,84 @@ class ConceptExtractor(BaseProcessor):
             f"{self.extraction_config['base_prompt_end']}"
         )
 
+        # Every LLM call is optionally recorded as a telemetry event and summarized per run
+        self.telemetry = None
+        telemetry_config = self.extraction_config.get('telemetry', {})
+        if telemetry_config.get('enabled'):
+            self.telemetry = CallTelemetry(
+                events_path=self._get_telemetry_path('events_path_template'),
+                prometheus_path=self._get_telemetry_path('prometheus_path_template'),
+                prices=telemetry_config.get('prices'),
+                labels={'mode': self.strategy}
+            )
+
         # Initialize the appropriate LLM client with the constructed prompt and schema
         self.llm_client = get_llm_client(
             extraction_config=self.extraction_config,
             system_prompt=self.system_prompt,
-            response_schema_class=self.response_schema_class
+            response_schema_class=self.response_schema_class,
+            telemetry=self.telemetry
         )
         # --- FIX END ---
 
+        # Optionally serve repeated calls from the persistent response cache.
+        # The cache wraps the rate-limited client, so hits skip the network and the limiter.
+        self.response_cache = None
+        cache_config = self.extraction_config.get('response_cache', {})
+        if cache_config.get('enabled'):
+            self.response_cache = get_response_cache(
+                self.cfg_manager.get_path('concept_extraction.response_cache.path'),
+                max_size_mb=cache_config.get('max_size_mb', 512)
+            )
+            self.llm_client = self._with_response_cache(self.llm_client, self.system_prompt, self._is_valid_response)
+
+        # Long suttas are optionally split into overlapping chunks that are extracted
+        # concurrently and merged back into one record
+        self.chunking_config = self.extraction_config.get('chunking', {})
+
+        # Responses that fail validation can be salvaged concept by concept;
+        # only responses with too few valid concepts are requested again
+        self.salvage_config = self.extraction_config.get('salvage', {})
+        self.salvage_stats = {'salvaged': 0, 'dropped_concepts': 0, 'rerequests': 0}
+        self._stats_lock = threading.Lock()
+
+        # Responses are optionally streamed; concepts are validated as they arrive
+        # and the stream is abandoned as soon as the output is clearly malformed
+        self.streaming_config = self.extraction_config.get('streaming', {})
+        self.stream_stats = StreamStats()
+
+        # Short suttas are optionally packed several to a request under a keyed schema,
+        # with its own client since both the prompt and the schema differ
+        self.packing_config = self.extraction_config.get('packing', {})
+        self.packed_llm_client = None
+        if self.packing_config.get('enabled'):
+            self.packed_system_prompt = f"{self.system_prompt}{self.extraction_config['packing_instructions']}"
+            self.packed_llm_client = get_llm_client(
+                extraction_config=self.extraction_config,
+                system_prompt=self.packed_system_prompt,
+                response_schema_class=self.packed_schema_class,
+                telemetry=self.telemetry
+            )
+            if self.response_cache is not None:
+                self.packed_llm_client = self._with_response_cache(
+                    self.packed_llm_client, self.packed_system_prompt, self._is_valid_packed_response
+                )
+
+    def _with_response_cache(self, client, system_prompt: str, is_cacheable):
+        return CachedLLMClient(
+            client,
+            self.response_cache,
+            provider=get_provider_name(self.model_id),
+            model_id=self.model_id,
+            system_prompt=system_prompt,
+            temperature=self.extraction_config.get('temperature'),
+            is_cacheable=is_cacheable
+        )
+
     # --- Implementation of abstract methods ---
+    def _get_config_key(self) -> str:
+        return 'concept_extraction'
+
     def _get_source_path(self) -> str:
         return self.cfg_manager.get_path('output_paths.raw_data')
 
@@ -62,27 +155,450 @@ class ConceptExtractor(BaseProcessor):
         format_args = {'mode': self.strategy, 'model_id': s_model_id}
         return self.cfg_manager.get_path('concept_extraction.log_path_template', format_args)
 
+    def _get_telemetry_path(self, template_key: str) -> str | None:
+        if not self.extraction_config.get('telemetry', {}).get(template_key):
+            return None
+        format_args = {'mode': self.strategy, 'model_id': sanitize_for_filename(self.model_id)}
+        return self.cfg_manager.get_path(f'concept_extraction.telemetry.{template_key}', format_args)
+
     def _get_run_config(self) -> dict:
         return {'model_id': self.model_id, 'mode': self.strategy}
 
+    def _report_run_stats(self, include_cache: bool = True):
+        """
+        Prints this target's usage, streaming, telemetry and salvage stats. The
+        response cache can be shared by several targets, so a multi-target run
+        passes `include_cache=False` and reports it once.
+        """
+        self._report_usage()
+        if include_cache:
+            self._report_cache_stats()
+        self._report_stream_stats()
+        self._report_telemetry()
+        if self.salvage_config.get('enabled'):
+            print(f"Salvaged responses: {self.salvage_stats['salvaged']} partial records "
+                  f"({self.salvage_stats['dropped_concepts']} invalid concepts dropped), "
+                  f"{self.salvage_stats['rerequests']} full re-requests")
+
+    def _close_run(self):
+        for client in (self.llm_client, self.packed_llm_client):
+            if client is not None:
+                client.close()
+
+    def _count(self, stat: str, amount: int = 1):
+        with self._stats_lock:
+            self.salvage_stats[stat] += amount
+
+    def _report_usage(self):
+        # Wrappers forward `usage` to the provider client
+        for label, client in (("single", self.llm_client), ("packed", self.packed_llm_client)):
+            usage = getattr(client, 'usage', None)
+            if isinstance(usage, UsageStats) and usage.calls:
+                stats = usage.snapshot()
+                print(f"LLM usage for {self.model_id} ({label} requests): {stats['calls']} calls, "
+                      f"{stats['prompt_tokens']} prompt tokens of which {stats['cached_tokens']} served from "
+                      f"the provider's prompt cache ({stats['cache_hit_rate']:.1%}), {stats['output_tokens']} "
+                      f"output tokens, {stats['mean_latency_seconds']:.2f}s mean latency")
+
+    def _report_stream_stats(self):
+        if self.streaming_config.get('enabled') and self.stream_stats.streams:
+            stats = self.stream_stats.snapshot()
+            print(f"Streaming for {self.model_id}: {stats['streams']} streams, "
+                  f"{stats['mean_time_to_first_concept_seconds']:.2f}s mean time to first concept, "
+                  f"{stats['aborted']} aborted as malformed (~{stats['estimated_tokens_saved']:.0f} output tokens saved)")
+
+    def _report_telemetry(self):
+        if self.telemetry is None:
+            return
+        for model_id, stats in self.telemetry.finish().items():
+            outcomes = ", ".join(f"{count} {outcome}" for outcome, count in sorted(stats['outcomes'].items()))
+            cost = stats['estimated_cost_usd']
+            print(f"LLM telemetry for {model_id}: {stats['calls']} calls ({outcomes}), {stats['retries']} retries, "
+                  f"latency p50 {stats['latency_p50_seconds']:.2f}s / p95 {stats['latency_p95_seconds']:.2f}s, "
+                  f"queue wait p95 {stats['queue_wait_p95_seconds']:.2f}s, "
+                  f"{stats['output_tokens_per_second']:.1f} output tokens/s"
+                  + (f", estimated cost ${cost:.4f}" if cost is not None else ""))
+
+    def _report_cache_stats(self):
+        if self.response_cache is not None:
+            stats = self.response_cache.stats()
+            print(f"LLM response cache: {stats['hits']} hits, {stats['misses']} misses "
+                  f"({stats['hit_rate']:.1%} hit rate), {stats['evictions']} evictions, "
+                  f"{stats['entries']} entries / {stats['size_mb']:.1f} MB")
+
+    def _is_valid_response(self, response_text: str) -> bool:
+        """Checks a raw response against the schema (or the salvage threshold) without raising."""
+        try:
+            self._validate_response(response_text)
+            return True
+        except ValueError:
+            return False
+
+    def _is_valid_packed_response(self, response_text: str) -> bool:
+        """Checks a raw packed response against the keyed schema without raising."""
+        try:
+            self.packed_schema_class.model_validate_json(response_text)
+            return True
+        except (ValidationError, json.JSONDecodeError):
+            return False
+
     def _process_item(self, sutta: dict) -> dict:
         """Core logic for one sutta, moved from the old loop."""
         sutta_body = sutta.get("body")
         if not sutta_body or not sutta_body.strip():
             raise ValueError("Sutta body is empty.")
-        
-        response_text = self.llm_client.generate_content(sutta_body)
-        
+
+        chunks = self._split_body(sutta_body)
+        if len(chunks) == 1:
+            concepts, dropped = self._extract(sutta_body)
+            return self._make_record(sutta, concepts, dropped)
+
+        def extract_chunk(index):
+            try:
+                return self._extract(chunks[index])
+            except ValueError as e:
+                raise ValueError(f"Chunk {index + 1}/{len(chunks)}: {e}") from e
+
+        # Chunks of one sutta are extracted concurrently; the shared rate limiter still paces them
+        max_workers = min(len(chunks), max(1, int(self.chunking_config.get('max_workers', 4))))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(extract_chunk, range(len(chunks))))
+        return self._make_record(
+            sutta,
+            merge_concepts([concepts for concepts, _ in results]),
+            sum(dropped for _, dropped in results)
+        )
+
+    def _extract(self, text_body: str) -> tuple:
+        """
+        Sends one text to the LLM and returns (concepts, dropped_count). With
+        salvage enabled, a response too broken to salvage is requested again,
+        up to `salvage.max_rerequests` times.
+        """
+        max_rerequests = self.salvage_config.get('max_rerequests', 1) if self.salvage_config.get('enabled') else 0
+        for attempt in range(max_rerequests + 1):
+            try:
+                if self.streaming_config.get('enabled'):
+                    return self._extract_streamed(text_body)
+                return self._parse_concepts(self.llm_client.generate_content(text_body))
+            except ValueError:
+                if attempt == max_rerequests:
+                    raise
+                self._count('rerequests')
+
+    def _extract_streamed(self, text_body: str) -> tuple:
+        """
+        Streams one response and returns (concepts, dropped_count).
+
+        Each concept is validated as soon as its object closes. The stream is
+        closed, and ValueError raised, when the output stops looking like a
+        concepts object, or when a concept is invalid and salvage is off (the
+        response would be rejected anyway). A stream that ends without closing
+        the concepts array, or with invalid concepts, is validated as a whole
+        so that salvage applies as usual.
+        """
+        parser = ConceptStreamParser()
+        received = []
+        concepts = []
+        invalid = 0
+        first_concept_seconds = None
+        start = time.monotonic()
+        stream = self.llm_client.generate_content_stream(text_body)
+        try:
+            for text in stream:
+                received.append(text)
+                for raw_concept in parser.feed(text):
+                    try:
+                        concepts.append(self.concept_schema_class.model_validate(raw_concept).model_dump())
+                    except ValidationError as e:
+                        if not self.salvage_config.get('enabled'):
+                            raise MalformedStreamError(f"Invalid concept: {e}") from e
+                        invalid += 1
+                        continue
+                    if first_concept_seconds is None:
+                        first_concept_seconds = time.monotonic() - start
+        except MalformedStreamError as e:
+            self.stream_stats.record(first_concept_seconds, estimate_tokens("".join(received)), aborted=True)
+            raise ValueError(f"Streamed response aborted: {e}") from e
+        finally:
+            stream.close()
+
+        response_text = "".join(received)
+        self.stream_stats.record(first_concept_seconds, estimate_tokens(response_text), aborted=False)
+        if parser.complete and not invalid:
+            return concepts, 0
+        return self._parse_concepts(response_text)
+
+    def _split_body(self, sutta_body: str) -> list:
+        """Returns the chunks to extract for a sutta body (a single chunk when chunking is off)."""
+        if not self.chunking_config.get('enabled'):
+            return [sutta_body]
+        return split_into_chunks(
+            sutta_body,
+            max_chars=self.chunking_config.get('max_chars', 12000),
+            overlap_chars=self.chunking_config.get('overlap_chars', 500)
+        )
+
+    def _parse_concepts(self, response_text: str) -> tuple:
+        """Validates a raw LLM response and returns (concepts, dropped_count), counting salvaged responses."""
+        concepts, dropped = self._validate_response(response_text)
+        if dropped:
+            self._count('salvaged')
+            self._count('dropped_concepts', dropped)
+        return concepts, dropped
+
+    def _validate_response(self, response_text: str) -> tuple:
+        """
+        Validates a raw LLM response and returns (concepts, dropped_count), with the concepts as dicts.
+
+        With salvage enabled, a response that fails validation is repaired if
+        truncated and its concepts are validated one at a time. The valid ones
+        are kept as long as they make up at least `salvage.min_validity_ratio`
+        of the concepts in the response.
+        """
         try:
             parsed_data = self.response_schema_class.model_validate_json(response_text)
+            return parsed_data.model_dump()['concepts'], 0
         except (ValidationError, json.JSONDecodeError) as e:
-            # Raise a specific exception that the base class can catch
-            raise ValueError(f"Schema validation failed: {e}. Raw response: {response_text}") from e
+            error = e
+
+        if self.salvage_config.get('enabled'):
+            concepts, total = self._salvage_concepts(response_text)
+            min_ratio = self.salvage_config.get('min_validity_ratio', 0.8)
+            if concepts and len(concepts) / total >= min_ratio:
+                return concepts, total - len(concepts)
+            error = f"only {len(concepts)} of {total} concepts valid (minimum ratio {min_ratio}); {error}"
+
+        # Raise a specific exception that the base class can catch
+        raise ValueError(f"Schema validation failed: {error}. Raw response: {response_text}")
 
-        return {
+    def _salvage_concepts(self, response_text: str) -> tuple:
+        """
+        Returns (valid_concepts, total) from a response that failed validation.
+        A concept lost to truncation counts towards the total.
+        """
+        data, truncated = repair_truncated_json(response_text)
+        raw_concepts = data.get('concepts') if isinstance(data, dict) else None
+        if not isinstance(raw_concepts, list):
+            return [], 1
+
+        concepts = []
+        for raw_concept in raw_concepts:
+            try:
+                concepts.append(self.concept_schema_class.model_validate(raw_concept).model_dump())
+            except ValidationError:
+                continue
+        return concepts, max(1, len(raw_concepts) + (1 if truncated else 0))
+
+    def _make_record(self, sutta: dict, concepts: list, dropped_concepts: int = 0) -> dict:
+        record = {
             'sutta_id': sutta.get("sutta_id"),
             'model_id': self.model_id,
             'time_of_run': self.dt_string,
             'mode': self.strategy,
-            'concepts': parsed_data.model_dump()['concepts'],
-        }
\ No newline at end of file
+            'concepts': concepts,
+        }
+        if dropped_concepts:
+            # Salvaged from an invalid response; some concepts were lost
+            record['partial'] = True
+            record['dropped_concepts'] = dropped_concepts
+        return record
+
+    def _build_record(self, sutta: dict, response_text: str) -> dict:
+        """Validates a raw LLM response and wraps it in the output record for `sutta`."""
+        concepts, dropped = self._parse_concepts(response_text)
+        return self._make_record(sutta, concepts, dropped)
+
+    def _build_chunked_record(self, sutta: dict, response_texts: list) -> dict:
+        """Validates the responses for every chunk of `sutta` and merges them into one record."""
+        concept_lists = []
+        dropped = 0
+        for index, response_text in enumerate(response_texts, 1):
+            try:
+                concepts, chunk_dropped = self._parse_concepts(response_text)
+            except ValueError as e:
+                raise ValueError(f"Chunk {index}/{len(response_texts)}: {e}") from e
+            concept_lists.append(concepts)
+            dropped += chunk_dropped
+        return self._make_record(sutta, merge_concepts(concept_lists), dropped)
+
+    # --- Request packing ---
+    def _iter_work_units(self, suttas):
+        """
+        Packs short suttas into lists that fit the packing token budget; every
+        other sutta is yielded on its own. Packs keep the source order.
+        """
+        if self.packed_llm_client is None:
+            yield from suttas
+            return
+
+        max_tokens = self.packing_config.get('max_tokens', 6000)
+        max_suttas = self.packing_config.get('max_suttas', 20)
+        max_sutta_tokens = self.packing_config.get('max_sutta_tokens', 1500)
+        pack = []
+        pack_tokens = 0
+        for sutta in suttas:
+            body = sutta.get("body")
+            tokens = estimate_tokens(body) if body and body.strip() else None
+            if tokens is None or tokens > max_sutta_tokens:
+                yield sutta
+                continue
+            if pack and (pack_tokens + tokens > max_tokens or len(pack) >= max_suttas):
+                yield pack
+                pack, pack_tokens = [], 0
+            pack.append(sutta)
+            pack_tokens += tokens
+        if pack:
+            yield pack
+
+    def _process_unit(self, unit) -> list:
+        if isinstance(unit, list):
+            return self._process_pack(unit)
+        return super()._process_unit(unit)
+
+    def _process_pack(self, suttas: list) -> list:
+        """
+        Extracts several short suttas with one packed request and unpacks the
+        keyed response into one record per sutta. Suttas the response leaves out,
+        or all of them if the response is invalid, fall back to single requests.
+        """
+        records = {}
+        if len(suttas) > 1:
+            packed_text = "\n\n".join(f"=== SUTTA {sutta['sutta_id']} ===\n{sutta['body'].strip()}" for sutta in suttas)
+            try:
+                response_text = self.packed_llm_client.generate_content(packed_text)
+                parsed_data = self.packed_schema_class.model_validate_json(response_text)
+                for entry in parsed_data.model_dump()['suttas']:
+                    records.setdefault(entry['sutta_id'], entry['concepts'])
+            except (ValidationError, json.JSONDecodeError):
+                records = {}
+            except Exception as e:
+                # Rate limits and API errors fail every sutta in the pack, as they would a single one
+                return [(sutta, None, e) for sutta in suttas]
+
+        results = []
+        for sutta in suttas:
+            concepts = records.get(str(sutta['sutta_id']))
+            if concepts is not None:
+                results.append((sutta, self._make_record(sutta, concepts), None))
+            else:
+                results.extend(super()._process_unit(sutta))
+        return results
+
+    # --- Batch execution mode ---
+    def _get_batch_request_path(self) -> str:
+        s_model_id = sanitize_for_filename(self.model_id)
+        format_args = {'mode': self.strategy, 'model_id': s_model_id}
+        return self.cfg_manager.get_path('concept_extraction.batch.request_path_template', format_args)
+
+    def run_batch(self):
+        """
+        Runs extraction for all unprocessed suttas as a single provider batch job.
+
+        The suttas are written to one batch request file, which is submitted and
+        polled until the job finishes. Results are then validated against the
+        response schema and written to the usual output file. The job ID is kept
+        next to the request file, so an interrupted run resumes polling the same
+        job instead of submitting a new one.
+        """
+        batch_config = self.extraction_config.get('batch', {})
+        request_path = self._get_batch_request_path()
+        state_path = f"{request_path}.job.json"
+        backend = get_batch_backend(self.extraction_config, self.system_prompt, self.response_schema_class)
+        skipped_items_log = []
+
+        if os.path.exists(state_path):
+            with open(state_path, 'r', encoding='utf-8') as f:
+                job_state = json.load(f)
+            print(f"Resuming batch job {job_state['job_id']} ({len(job_state['sutta_ids'])} suttas).")
+        else:
+            requests = []
+            sutta_ids = []
+            chunk_counts = {}
+            for sutta in self._load_unprocessed_items():
+                sutta_body = sutta.get("body")
+                if not sutta_body or not sutta_body.strip():
+                    skipped_items_log.append({"item_id": sutta.get("sutta_id", "Unknown"), "reason": "Sutta body is empty."})
+                    continue
+                sutta_ids.append(sutta["sutta_id"])
+                chunks = self._split_body(sutta_body)
+                if len(chunks) == 1:
+                    requests.append((sutta["sutta_id"], sutta_body))
+                else:
+                    chunk_counts[sutta["sutta_id"]] = len(chunks)
+                    requests.extend((_chunk_request_id(sutta["sutta_id"], i), chunk) for i, chunk in enumerate(chunks))
+
+            if not requests:
+                print("No new items to process. Exiting.")
+                self._log_skipped_items(skipped_items_log)
+                return
+
+            backend.write_request_file(request_path, requests)
+            job_id = backend.submit(request_path)
+            job_state = {'job_id': job_id, 'sutta_ids': sutta_ids, 'chunk_counts': chunk_counts}
+            with open(state_path, 'w', encoding='utf-8') as f:
+                json.dump(job_state, f)
+            print(f"Submitted batch job {job_id} with {len(requests)} suttas from {request_path}.")
+
+        status = backend.wait(
+            job_state['job_id'],
+            poll_interval_seconds=batch_config.get('poll_interval_seconds', 60),
+            timeout_seconds=batch_config.get('timeout_seconds')
+        )
+        if status != BATCH_COMPLETED:
+            # The job is dead; forget it so the next run submits a fresh one
+            os.remove(state_path)
+            self._log_skipped_items(skipped_items_log)
+            raise RuntimeError(f"Batch job {job_state['job_id']} ended with status '{status}'.")
+
+        results = backend.fetch_results(job_state['job_id'])
+        chunk_counts = job_state.get('chunk_counts', {})
+        saved_count = 0
+        with self.result_writer:
+            for sutta_id in job_state['sutta_ids']:
+                try:
+                    if sutta_id in chunk_counts:
+                        response_texts = [_batch_result_text(results, _chunk_request_id(sutta_id, i))
+                                          for i in range(chunk_counts[sutta_id])]
+                        record = self._build_chunked_record({'sutta_id': sutta_id}, response_texts)
+                    else:
+                        record = self._build_record({'sutta_id': sutta_id}, _batch_result_text(results, sutta_id))
+                    self.result_writer.write(record)
+                    saved_count += 1
+                except ValueError as e:
+                    skipped_items_log.append({"item_id": sutta_id, "reason": str(e)})
+
+        os.remove(state_path)
+        print(f"Batch job {job_state['job_id']} completed: {saved_count} suttas saved.")
+        self._log_skipped_items(skipped_items_log)
+
+
+def _chunk_request_id(sutta_id: str, index: int) -> str:
+    """Custom ID of one chunk of a sutta in a batch request file."""
+    return f"{sutta_id}#chunk{index}"
+
+
+def _batch_result_text(results: dict, custom_id: str) -> str:
+    """Returns the response text for one batch request, raising ValueError if it failed."""
+    result = results.get(custom_id)
+    if result is None:
+        raise ValueError(f"No result returned by the batch job for {custom_id}.")
+    if result['error']:
+        raise ValueError(f"Batch request failed: {result['error']}")
+    return result['text']
+
+
+def merge_concepts(concept_lists: list) -> list:
+    """
+    Merges the concepts extracted from the chunks of one sutta.
+
+    Concepts are deduplicated by case-insensitive name and type. The first
+    occurrence wins, so the evidence quote comes from the earliest chunk that
+    mentions the concept and the result keeps the sutta's reading order.
+    """
+    merged = {}
+    for concepts in concept_lists:
+        for concept in concepts:
+            key = (" ".join(concept['concept_name'].split()).casefold(), concept['concept_type'])
+            merged.setdefault(key, concept)
+    return list(merged.values())
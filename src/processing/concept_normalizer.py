@@ -33,7 +33,7 @@ class ConceptNormalizer(BaseNormalizer):
         return self.cfg_manager.get_path('concept_normalization.output_path_template', format_args)
 
     def _prepare_corpus(self) -> tuple[list, dict]:
-        """Load concepts, deduplicate, and prepare the corpus for embedding."""
+        """Load concepts and prepare the corpus for embedding, one entry per concept instance."""
         # 1. Get input path
         sanitized_model_id = sanitize_for_filename(self.extract_config['model_id'])
         format_args = {
@@ -42,7 +42,7 @@ class ConceptNormalizer(BaseNormalizer):
         }
         input_path = self.cfg_manager.get_path('concept_extraction.output_path_template', format_args)
         
-        # 2. Load and deduplicate concepts
+        # 2. Load concepts (duplicates are collapsed by the base class)
         print(f"Loading concepts from {input_path}...")
         all_concepts = []
         with jsonlines.open(input_path) as reader:
@@ -0,0 +1,110 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from itertools import zip_longest
+from tqdm import tqdm
+
+from .base_processor import iter_completed
+from .concept_extractor import ConceptExtractor
+from utils.data_helpers import get_processed_ids
+from utils.sutta_store import SuttaStore
+
+
+class MultiTargetExtractor:
+    """
+    Runs concept extraction for several (model_id, mode) targets in one pass.
+
+    The source file is indexed once. Each target keeps its own output file, skip
+    log and resume state (the same files a single-target run would use), and
+    its own rate limiter, since limiters are shared per model. Work for all
+    targets goes through one thread pool, interleaved so that each sutta is
+    in flight for every target at about the same time.
+    """
+    def __init__(self, cfg_manager, targets: list | None = None):
+        """
+        Args:
+            cfg_manager: The configuration manager.
+            targets (list | None): Dicts of `concept_extraction` overrides, at least
+                                   {'model_id': ..., 'mode': ...}. Defaults to
+                                   `concept_extraction.targets` in the config.
+        """
+        targets = targets or cfg_manager.config['concept_extraction'].get('targets')
+        if not targets:
+            raise ValueError("No extraction targets configured in concept_extraction.targets.")
+        self.extractors = [ConceptExtractor(cfg_manager, target) for target in targets]
+
+        # Two targets writing to the same output file would corrupt each other's resume state
+        output_paths = [extractor.output_path for extractor in self.extractors]
+        if len(set(output_paths)) != len(output_paths):
+            raise ValueError(f"Extraction targets must be distinct (model_id, mode) pairs, got: {targets}")
+        self.source_path = self.extractors[0].source_path
+        self.max_in_flight = sum(extractor.max_in_flight for extractor in self.extractors)
+
+    def _load_unprocessed_items(self, store: SuttaStore) -> list:
+        """Returns a lazy view of the unprocessed items for each target, in the order of `self.extractors`."""
+        unprocessed = []
+        for extractor in self.extractors:
+            processed_ids = get_processed_ids(
+                processed_path=extractor.output_path,
+                id_key='sutta_id',
+                **extractor._get_run_config()
+            )
+            items = store.view(exclude_ids=processed_ids)
+            print(f"{extractor.model_id} ({extractor.strategy}): {len(processed_ids)} items already processed, "
+                  f"{len(items)} new items.")
+            unprocessed.append(items)
+        return unprocessed
+
+    def _iter_work_units(self, unprocessed: list):
+        """Yields (extractor, unit) pairs, alternating between targets."""
+        def tagged(extractor, items):
+            for unit in extractor._iter_work_units(items):
+                yield extractor, unit
+
+        per_target = [tagged(extractor, items) for extractor, items in zip(self.extractors, unprocessed)]
+        for round_units in zip_longest(*per_target):
+            yield from (pair for pair in round_units if pair is not None)
+
+    @staticmethod
+    def _process_unit(pair) -> list:
+        extractor, unit = pair
+        return [(extractor, item, result, error) for item, result, error in extractor._process_unit(unit)]
+
+    def run_pipeline(self):
+        """Executes the extraction pipeline for every target concurrently."""
+        try:
+            # The source is indexed once and streamed separately for each target
+            store = SuttaStore(self.source_path, id_key='sutta_id')
+            print(f"Found {len(store)} total items in source.")
+
+            unprocessed = self._load_unprocessed_items(store)
+            item_count = sum(len(items) for items in unprocessed)
+            if not item_count:
+                print("No new items to process for any target. Exiting.")
+                return
+
+            skipped = {extractor: [] for extractor in self.extractors}
+            with ExitStack() as stack:
+                for extractor in self.extractors:
+                    stack.enter_context(extractor.result_writer)
+                executor = stack.enter_context(ThreadPoolExecutor(max_workers=self.max_in_flight))
+
+                progress = tqdm(total=item_count, desc=f"Processing ({len(self.extractors)} targets)")
+                units = self._iter_work_units(unprocessed)
+                for extractor, item, result_record, error in iter_completed(executor, self._process_unit, units, self.max_in_flight):
+                    progress.update(1)
+                    if error is None:
+                        extractor.result_writer.write(result_record)
+                    else:
+                        item_id = item.get("sutta_id", "Unknown")
+                        print(f"\nSKIPPING {item_id} for {extractor.model_id}: {error}")
+                        skipped[extractor].append({"item_id": item_id, "reason": str(error)})
+                progress.close()
+
+            for extractor in self.extractors:
+                extractor._log_skipped_items(skipped[extractor])
+                extractor._report_run_stats(include_cache=False)
+            # The response cache is shared by every target
+            self.extractors[0]._report_cache_stats()
+        finally:
+            for extractor in self.extractors:
+                extractor._close_run()
@@ -0,0 +1,242 @@
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+
+from google import genai
+from google.genai.types import HarmBlockThreshold, JSONSchema, Schema, UploadFileConfig
+from openai import OpenAI
+
+from utils.llm_helpers import GEMINI_SAFETY_CATEGORIES, get_provider_name
+
+# Normalized job states shared by every backend
+BATCH_PENDING = 'pending'
+BATCH_COMPLETED = 'completed'
+BATCH_FAILED = 'failed'
+
+
+class BaseBatchBackend(ABC):
+    """
+    Abstract base class for provider batch APIs.
+
+    A batch job is built from a local .jsonl request file with one request per
+    item, keyed by a custom ID. Results come back as a mapping from that ID to
+    either the raw response text or an error message.
+    """
+    def __init__(self, config: dict, system_prompt: str, response_schema_class=None):
+        self.model_id = config['model_id']
+        self.temperature = config.get('temperature')
+        self.system_prompt = system_prompt
+        self.response_schema_class = response_schema_class
+
+    @abstractmethod
+    def _build_request(self, custom_id: str, text_body: str) -> dict:
+        """Return one line of the provider's batch request file."""
+        pass
+
+    @abstractmethod
+    def submit(self, request_path: str) -> str:
+        """Upload the request file, start the job and return its ID."""
+        pass
+
+    @abstractmethod
+    def poll(self, job_id: str) -> str:
+        """Return the normalized state of the job (pending, completed or failed)."""
+        pass
+
+    @abstractmethod
+    def fetch_results(self, job_id: str) -> dict:
+        """Return {custom_id: {'text': str | None, 'error': str | None}} for a completed job."""
+        pass
+
+    def write_request_file(self, request_path: str, requests: list[tuple[str, str]]) -> int:
+        """
+        Writes the batch request file for a list of (custom_id, text_body) pairs.
+
+        Returns:
+            int: The number of requests written.
+        """
+        os.makedirs(os.path.dirname(request_path), exist_ok=True)
+        with open(request_path, 'w', encoding='utf-8') as f:
+            for custom_id, text_body in requests:
+                f.write(json.dumps(self._build_request(custom_id, text_body), ensure_ascii=False) + "\n")
+        return len(requests)
+
+    def wait(self, job_id: str, poll_interval_seconds: float = 60, timeout_seconds: float | None = None) -> str:
+        """Polls the job until it reaches a terminal state and returns that state."""
+        start = time.monotonic()
+        while True:
+            state = self.poll(job_id)
+            if state != BATCH_PENDING:
+                return state
+            if timeout_seconds is not None and time.monotonic() - start > timeout_seconds:
+                raise TimeoutError(f"Batch job {job_id} did not finish within {timeout_seconds}s.")
+            time.sleep(poll_interval_seconds)
+
+
+class OpenAIBatchBackend(BaseBatchBackend):
+    """
+    Batch backend for OpenAI-compatible `/v1/batches` endpoints.
+    Any server that speaks this protocol (including a local fake) can be targeted via `base_url`.
+    """
+    ENDPOINT = "/v1/chat/completions"
+
+    def __init__(self, config: dict, system_prompt: str, base_url: str, api_key: str, response_schema_class=None):
+        super().__init__(config, system_prompt, response_schema_class)
+        self.client = OpenAI(api_key=api_key, base_url=base_url)
+
+    def _build_request(self, custom_id: str, text_body: str) -> dict:
+        body = {
+            "model": self.model_id,
+            "messages": [
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": text_body},
+            ],
+            "response_format": {"type": "json_object"},
+        }
+        if self.temperature is not None:
+            body["temperature"] = self.temperature
+        return {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": self.ENDPOINT,
+            "body": body,
+        }
+
+    def submit(self, request_path: str) -> str:
+        with open(request_path, 'rb') as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=self.ENDPOINT,
+            completion_window="24h",
+        )
+        return batch.id
+
+    def poll(self, job_id: str) -> str:
+        status = self.client.batches.retrieve(job_id).status
+        if status == 'completed':
+            return BATCH_COMPLETED
+        if status in ('failed', 'expired', 'cancelled', 'cancelling'):
+            return BATCH_FAILED
+        return BATCH_PENDING
+
+    def fetch_results(self, job_id: str) -> dict:
+        batch = self.client.batches.retrieve(job_id)
+        results = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                response = entry.get('response') or {}
+                if entry.get('error') or response.get('status_code', 200) != 200:
+                    error = entry.get('error') or response.get('body')
+                    results[entry['custom_id']] = {'text': None, 'error': json.dumps(error)}
+                else:
+                    text = response['body']['choices'][0]['message']['content']
+                    results[entry['custom_id']] = {'text': text, 'error': None}
+        return results
+
+
+class GeminiBatchBackend(BaseBatchBackend):
+    """
+    Batch backend for the Gemini Batch API, using an uploaded .jsonl request file.
+    Requests carry the same response schema as interactive GeminiClient calls;
+    results are still validated against it at ingest.
+    """
+    def __init__(self, config: dict, system_prompt: str, api_key: str, response_schema_class=None):
+        super().__init__(config, system_prompt, response_schema_class)
+        self.client = genai.Client(api_key=api_key)
+        # The request file is plain JSON, so the Pydantic schema is converted to Gemini's Schema format once
+        self.response_schema = None
+        if response_schema_class is not None:
+            schema = Schema.from_json_schema(json_schema=JSONSchema(**response_schema_class.model_json_schema()))
+            self.response_schema = schema.model_dump(mode='json', exclude_none=True)
+
+    def _build_request(self, custom_id: str, text_body: str) -> dict:
+        generation_config = {"response_mime_type": "application/json"}
+        if self.response_schema is not None:
+            generation_config["response_schema"] = self.response_schema
+        if self.temperature is not None:
+            generation_config["temperature"] = self.temperature
+        return {
+            "key": custom_id,
+            "request": {
+                "system_instruction": {"parts": [{"text": self.system_prompt}]},
+                "contents": [{"role": "user", "parts": [{"text": text_body}]}],
+                "generation_config": generation_config,
+                # Same as GeminiClient, so batch runs do not block texts interactive runs accept
+                "safety_settings": [
+                    {"category": c.value, "threshold": HarmBlockThreshold.BLOCK_NONE.value}
+                    for c in GEMINI_SAFETY_CATEGORIES
+                ],
+            },
+        }
+
+    def submit(self, request_path: str) -> str:
+        uploaded = self.client.files.upload(file=request_path, config=UploadFileConfig(mime_type="jsonl"))
+        job = self.client.batches.create(model=self.model_id, src=uploaded.name)
+        return job.name
+
+    def poll(self, job_id: str) -> str:
+        state = self.client.batches.get(name=job_id).state.name
+        if state == 'JOB_STATE_SUCCEEDED':
+            return BATCH_COMPLETED
+        if state in ('JOB_STATE_FAILED', 'JOB_STATE_CANCELLED', 'JOB_STATE_EXPIRED'):
+            return BATCH_FAILED
+        return BATCH_PENDING
+
+    def fetch_results(self, job_id: str) -> dict:
+        job = self.client.batches.get(name=job_id)
+        content = self.client.files.download(file=job.dest.file_name).decode('utf-8')
+        results = {}
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if entry.get('error'):
+                results[entry['key']] = {'text': None, 'error': json.dumps(entry['error'])}
+                continue
+            response = entry.get('response') or {}
+            candidates = response.get('candidates') or [{}]
+            parts = (candidates[0].get('content') or {}).get('parts')
+            if not parts:
+                # Blocked or empty: no content to ingest, so report why instead
+                reason = (response.get('promptFeedback') or {}).get('blockReason') or candidates[0].get('finishReason')
+                results[entry['key']] = {'text': None, 'error': f"Empty response (reason: {reason or 'unknown'})"}
+                continue
+            results[entry['key']] = {'text': "".join(p.get('text', '') for p in parts), 'error': None}
+        return results
+
+
+def get_batch_backend(extraction_config: dict, system_prompt: str, response_schema_class=None) -> BaseBatchBackend:
+    """
+    Factory function to get the batch backend for the configured model.
+    Non-Gemini models need `batch.base_url`, an OpenAI-compatible server with
+    `/v1/files` and `/v1/batches` (DeepSeek's API has neither).
+    """
+    batch_config = extraction_config.get('batch', {})
+    provider = get_provider_name(extraction_config['model_id'])
+
+    if provider == 'gemini':
+        if not os.getenv("GEMINI_API_KEY"):
+            raise ValueError("GEMINI_API_KEY not found in environment variables for Gemini batch backend.")
+        return GeminiBatchBackend(extraction_config, system_prompt, os.getenv("GEMINI_API_KEY"),
+                                  response_schema_class=response_schema_class)
+
+    if not batch_config.get('base_url'):
+        raise ValueError(f"No batch endpoint for {extraction_config['model_id']}: set concept_extraction.batch.base_url "
+                         f"to an OpenAI-compatible server that supports /v1/batches.")
+    api_key = os.getenv(batch_config.get('api_key_env', 'DEEPSEEK_API_KEY'))
+    if not api_key:
+        raise ValueError("No API key found in environment variables for the OpenAI-compatible batch backend.")
+    return OpenAIBatchBackend(
+        extraction_config,
+        system_prompt,
+        base_url=batch_config['base_url'],
+        api_key=api_key,
+        response_schema_class=response_schema_class,
+    )
@@ -0,0 +1,206 @@
+from abc import ABC, abstractmethod
+
+import numpy as np
+import torch
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from sentence_transformers import util
+
+CLUSTERING_ALGORITHMS = ('community', 'components')
+
+
+class BaseClusteringBackend(ABC):
+    """Finds clusters of embeddings whose cosine similarity reaches a threshold."""
+    @abstractmethod
+    def find_communities(self, embeddings, threshold: float, min_community_size: int,
+                         weights=None) -> list[list[int]]:
+        """
+        Returns the communities as lists of row indices, largest first, each
+        with its central point first and at least `min_community_size` rows.
+
+        With `weights`, row i counts as weights[i] rows wherever a community's
+        size matters (e.g. a distinct text standing for that many collapsed
+        duplicates), giving the same communities as the repeated rows would.
+        """
+        pass
+
+
+class DenseClusteringBackend(BaseClusteringBackend):
+    """
+    `sentence_transformers.util.community_detection`, which computes the full
+    n×n similarity matrix (in blocks of `block_size` rows). Weighted rows use
+    the same greedy detection with weighted community sizes.
+    """
+    def __init__(self, block_size: int = 1024):
+        self.block_size = block_size
+
+    def find_communities(self, embeddings, threshold: float, min_community_size: int,
+                         weights=None) -> list[list[int]]:
+        if weights is None:
+            return util.community_detection(embeddings, min_community_size=min_community_size, threshold=threshold,
+                                            batch_size=self.block_size)
+        if len(embeddings) == 0:
+            return []
+        if not isinstance(embeddings, torch.Tensor):
+            embeddings = torch.as_tensor(np.asarray(embeddings, dtype=np.float32))
+        embeddings = util.normalize_embeddings(embeddings.float())
+
+        def proposals():
+            for start in range(0, len(embeddings), self.block_size):
+                for row_scores in (embeddings[start:start + self.block_size] @ embeddings.T).cpu().numpy():
+                    community = np.flatnonzero(row_scores >= threshold)
+                    yield community[np.argsort(-row_scores[community], kind='stable')]
+
+        return select_communities(proposals(), len(embeddings), min_community_size, weights)
+
+
+class KnnClusteringBackend(BaseClusteringBackend):
+    """
+    Clusters on a sparse k-nearest-neighbour graph, so memory grows with n·k instead of n².
+
+    The graph keeps, for every row, its `k` most similar rows. It is built by
+    blocked top-k matrix multiplication (only `block_size` × n similarities
+    exist at a time), or with a faiss HNSW index when `index` is "faiss"
+    (optional dependency). Edges below the threshold are dropped.
+
+    Algorithms:
+        'community':  the greedy community detection of `util.community_detection`,
+                      run on the neighbour lists. With k >= n it gives the same
+                      result; otherwise a community is capped at k rows.
+        'components': connected components of the thresholded graph, which
+                      also chains rows that are only similar through others.
+    """
+    def __init__(self, k: int = 50, block_size: int = 2048, index: str = 'exact', algorithm: str = 'community',
+                 hnsw_m: int = 32, ef_search: int = 128):
+        if algorithm not in CLUSTERING_ALGORITHMS:
+            raise ValueError(f"Invalid clustering algorithm: {algorithm}. Expected one of {CLUSTERING_ALGORITHMS}.")
+        if index not in ('exact', 'faiss'):
+            raise ValueError(f"Invalid k-NN index: {index}. Expected exact or faiss.")
+        self.k = k
+        self.block_size = block_size
+        self.index = index
+        self.algorithm = algorithm
+        self.hnsw_m = hnsw_m
+        self.ef_search = ef_search
+
+    def find_communities(self, embeddings, threshold: float, min_community_size: int,
+                         weights=None) -> list[list[int]]:
+        if len(embeddings) == 0:
+            return []
+        neighbours, scores = self.knn_graph(embeddings)
+        if self.algorithm == 'components':
+            return graph_components(neighbours, scores, threshold, min_community_size, weights)
+        return graph_communities(neighbours, scores, threshold, min_community_size, weights)
+
+    def knn_graph(self, embeddings) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (neighbours, scores), two n×k arrays holding each row's nearest
+        rows (itself included) and their cosine similarities, most similar first.
+        """
+        if not isinstance(embeddings, torch.Tensor):
+            embeddings = torch.as_tensor(np.asarray(embeddings, dtype=np.float32))
+        embeddings = util.normalize_embeddings(embeddings.float())
+        k = min(self.k, len(embeddings))
+        if self.index == 'faiss':
+            return self._faiss_knn(embeddings.cpu().numpy(), k)
+
+        neighbours = np.empty((len(embeddings), k), dtype=np.int64)
+        scores = np.empty((len(embeddings), k), dtype=np.float32)
+        for start in range(0, len(embeddings), self.block_size):
+            block_scores = embeddings[start:start + self.block_size] @ embeddings.T
+            top_scores, top_indices = block_scores.topk(k=k, dim=1, largest=True)
+            neighbours[start:start + len(top_indices)] = top_indices.cpu().numpy()
+            scores[start:start + len(top_scores)] = top_scores.cpu().numpy()
+        return neighbours, scores
+
+    def _faiss_knn(self, embeddings: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        try:
+            import faiss
+        except ImportError as e:
+            raise ImportError("The faiss k-NN index needs the optional 'faiss-cpu' package.") from e
+        index = faiss.IndexHNSWFlat(embeddings.shape[1], self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efSearch = max(self.ef_search, k)
+        index.add(embeddings)
+        scores, neighbours = index.search(embeddings, k)
+        # Unfilled slots come back as -1; point them at the row itself with no similarity
+        missing = neighbours < 0
+        neighbours[missing] = np.nonzero(missing)[0]
+        scores[missing] = -1.0
+        return neighbours, scores
+
+
+def select_communities(proposals, n: int, min_community_size: int, weights=None) -> list[list[int]]:
+    """
+    The greedy selection of `util.community_detection`: each proposal (the rows
+    at or above the threshold around one row, most similar first) that is large
+    enough is taken largest first, dropping rows already claimed by a larger one.
+    Sizes are sums of `weights` (one per row by default).
+    """
+    weights = np.ones(n, dtype=np.int64) if weights is None else np.asarray(weights, dtype=np.int64)
+    min_community_size = min(min_community_size, int(weights.sum()))
+    extracted_communities = []
+    for community in proposals:
+        size = int(weights[community].sum())
+        if size >= min_community_size:
+            extracted_communities.append((size, community))
+
+    # Stable sorts keep proposals of equal size in row order, as community_detection does
+    extracted_communities.sort(key=lambda entry: entry[0], reverse=True)
+    unique_communities = []
+    used = np.zeros(n, dtype=bool)
+    for _, community in extracted_communities:
+        # Proposals are ordered by similarity, so the central point stays first
+        non_overlapped_community = community[~used[community]]
+        size = int(weights[non_overlapped_community].sum())
+        if size >= min_community_size:
+            unique_communities.append((size, non_overlapped_community))
+            used[non_overlapped_community] = True
+
+    unique_communities.sort(key=lambda entry: entry[0], reverse=True)
+    return [community.tolist() for _, community in unique_communities]
+
+
+def graph_communities(neighbours: np.ndarray, scores: np.ndarray, threshold: float,
+                      min_community_size: int, weights=None) -> list[list[int]]:
+    """
+    The community detection of `util.community_detection` on k-NN lists: every
+    row whose neighbours at or above the threshold reach `min_community_size`
+    proposes them as a community (see `select_communities`).
+    """
+    proposals = (row_neighbours[row_scores >= threshold] for row_neighbours, row_scores in zip(neighbours, scores))
+    return select_communities(proposals, len(neighbours), min_community_size, weights)
+
+
+def graph_components(neighbours: np.ndarray, scores: np.ndarray, threshold: float,
+                     min_community_size: int, weights=None) -> list[list[int]]:
+    """
+    Connected components of the k-NN graph restricted to edges at or above the
+    threshold, largest first. Sizes are sums of `weights` (one per row by default).
+    """
+    n = len(neighbours)
+    weights = np.ones(n, dtype=np.int64) if weights is None else np.asarray(weights, dtype=np.int64)
+    rows = np.repeat(np.arange(n), neighbours.shape[1])
+    mask = scores.ravel() >= threshold
+    graph = coo_matrix((np.ones(mask.sum(), dtype=np.int8), (rows[mask], neighbours.ravel()[mask])), shape=(n, n))
+    _, labels = connected_components(graph, directed=True, connection='weak')
+
+    order = np.argsort(labels, kind='stable')
+    boundaries = np.flatnonzero(np.diff(labels[order])) + 1
+    components = [(int(weights[component].sum()), component) for component in np.split(order, boundaries)]
+    components = [entry for entry in components if entry[0] >= min_community_size]
+    components.sort(key=lambda entry: entry[0], reverse=True)
+    return [component.tolist() for _, component in components]
+
+
+def get_clustering_backend(clustering_config: dict | None) -> BaseClusteringBackend:
+    """
+    Factory function to get the clustering backend from a `clustering` config section:
+    {'backend': 'dense'} (the default) or {'backend': 'knn', ...KnnClusteringBackend arguments}.
+    """
+    options = dict(clustering_config or {})
+    backend = options.pop('backend', 'dense')
+    if backend == 'dense':
+        return DenseClusteringBackend()
+    if backend == 'knn':
+        return KnnClusteringBackend(**options)
+    raise ValueError(f"Invalid clustering backend: {backend}. Expected dense or knn.")
@@ -0,0 +1,157 @@
+import json
+import threading
+
+
+class MalformedStreamError(ValueError):
+    """Raised when streamed output can no longer become a valid `{"concepts": [...]}` object."""
+    pass
+
+
+class ConceptStreamParser:
+    """
+    Incrementally parses a streamed `{"concepts": [ {...}, {...} ]}` response.
+
+    Text is fed in as it arrives; every concept object is returned as soon as
+    its closing brace is seen. Output that cannot be the expected object
+    (prose instead of JSON, no "concepts" array near the start, or garbage
+    between array elements) raises MalformedStreamError right away, so the
+    caller can stop reading the stream.
+    """
+    # How much text may precede the opening `[` of the concepts array
+    MAX_PREAMBLE_CHARS = 200
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._array_closed = False
+        # State of the concept object currently being read
+        self._element_start = None
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text: str) -> list:
+        """Adds streamed text and returns the concepts completed by it (as dicts)."""
+        self.buffer += text
+        if self._array_closed:
+            return []
+        if not self._in_array:
+            self._find_array()
+            if not self._in_array:
+                return []
+        return self._scan_elements()
+
+    def _find_array(self):
+        preamble = self.buffer.lstrip()
+        if preamble.startswith("```"):
+            preamble = preamble.split("\n", 1)[1].lstrip() if "\n" in preamble else ""
+        if preamble and not preamble.startswith("{"):
+            raise MalformedStreamError(f"Response does not start with a JSON object: {self.buffer[:80]!r}")
+
+        key = self.buffer.find('"concepts"')
+        if key != -1:
+            # Only `:` and whitespace may separate the key from the array
+            after_key = self.buffer[key + len('"concepts"'):]
+            value = after_key.lstrip()
+            if value and not value.startswith(":"):
+                raise MalformedStreamError(f"Unexpected text after the concepts key: {value[:40]!r}")
+            value = value[1:].lstrip()
+            if value and not value.startswith("["):
+                raise MalformedStreamError(f"The concepts value is not an array: {value[:40]!r}")
+            if value:
+                self._in_array = True
+                self._pos = len(self.buffer) - len(value) + 1
+                return
+        if len(self.buffer) > self.MAX_PREAMBLE_CHARS:
+            raise MalformedStreamError(f"No concepts array near the start of the response: {self.buffer[:80]!r}")
+
+    def _scan_elements(self) -> list:
+        concepts = []
+        buffer = self.buffer
+        while self._pos < len(buffer):
+            char = buffer[self._pos]
+            if self._element_start is None:
+                # Between elements only whitespace, commas and the closing bracket may appear
+                if char == "{":
+                    self._element_start = self._pos
+                    self._depth = 1
+                elif char == "]":
+                    self._array_closed = True
+                    self._in_array = False
+                    self._pos = len(buffer)
+                    break
+                elif not (char.isspace() or char == ","):
+                    raise MalformedStreamError(f"Unexpected {char!r} between concepts at offset {self._pos}")
+                self._pos += 1
+                continue
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    element = buffer[self._element_start:self._pos + 1]
+                    try:
+                        concept = json.loads(element)
+                    except json.JSONDecodeError as e:
+                        raise MalformedStreamError(f"Malformed concept object: {e}: {element[:80]!r}") from e
+                    concepts.append(concept)
+                    self._element_start = None
+            self._pos += 1
+        return concepts
+
+    @property
+    def complete(self) -> bool:
+        """Whether the closing bracket of the concepts array has been seen."""
+        return self._array_closed
+
+
+class StreamStats:
+    """Thread-safe counters for streamed extraction: time to first concept and tokens saved by aborting."""
+    def __init__(self):
+        self.streams = 0
+        self.aborted = 0
+        self.first_concept_seconds = 0.0
+        self.first_concept_count = 0
+        self.completed_output_tokens = 0
+        self.aborted_output_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, first_concept_seconds: float | None, output_tokens: int, aborted: bool):
+        with self._lock:
+            self.streams += 1
+            if first_concept_seconds is not None:
+                self.first_concept_seconds += first_concept_seconds
+                self.first_concept_count += 1
+            if aborted:
+                self.aborted += 1
+                self.aborted_output_tokens += output_tokens
+            else:
+                self.completed_output_tokens += output_tokens
+
+    def snapshot(self) -> dict:
+        """
+        Returns the counters. Tokens saved are estimated as the mean output of
+        a completed stream minus what each aborted stream had already produced.
+        """
+        with self._lock:
+            completed = self.streams - self.aborted
+            mean_output = self.completed_output_tokens / completed if completed else 0.0
+            return {
+                'streams': self.streams,
+                'aborted': self.aborted,
+                'mean_time_to_first_concept_seconds': (
+                    self.first_concept_seconds / self.first_concept_count if self.first_concept_count else 0.0
+                ),
+                'estimated_tokens_saved': max(0.0, self.aborted * mean_output - self.aborted_output_tokens),
+            }
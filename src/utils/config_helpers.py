@@ -2,6 +2,10 @@ import yaml
 import os
 from dotenv import load_dotenv
 
+def get_project_root() -> str:
+    """The project root, two directories up from this file (src/utils -> src -> project_root)."""
+    return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 class ConfigManager:
     """
     Manages loading configuration and constructing absolute paths for the project.
@@ -10,9 +14,7 @@ class ConfigManager:
         # Load API keys
         load_dotenv()
         
-        # Find the project root by going up two directories
-        # from this file's location (src/utils -> src -> project_root)
-        self.project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.project_root = get_project_root()
         
         config_path = os.path.join(self.project_root, config_filename)
         with open(config_path, 'r') as f:
@@ -1,6 +1,7 @@
 import os
-import jsonlines
-import json 
+
+from utils.run_manifest import RunManifest
+from utils.sutta_store import SuttaStore, SuttaView
 
 def get_processed_ids(processed_path: str, id_key: str, **run_config) -> set:
     """
@@ -13,34 +14,26 @@ def get_processed_ids(processed_path: str, id_key: str, **run_config) -> set:
         id_key (str): The key in the processed file that holds the unique ID.
         **run_config: A dictionary of key-value pairs that define a unique run.
                       A record is considered "processed" if it matches all of these pairs.
+                      Only top-level scalar fields of a record can be matched.
 
     Returns:
         set: A set of unique IDs that have been processed with the given settings.
     """
-    processed_ids = set()
     if not os.path.exists(processed_path):
-        return processed_ids
-        
-    with jsonlines.open(processed_path) as reader:
-        # Wrap in a try-except to handle corrupted lines in the file.
-        for line_num, record in enumerate(reader, 1):
-            try:
-                # A record is a match if all key-value pairs in run_config
-                # exist and are equal in the record.
-                is_match = all(record.get(key) == value for key, value in run_config.items())
-                
-                if is_match and record.get(id_key):
-                    processed_ids.add(record[id_key])
+        return set()
 
-            except (TypeError, json.JSONDecodeError):
-                print(f"Warning: Skipping corrupted or invalid line {line_num} in {processed_path}")
-                continue
-    return processed_ids
+    # The manifest holds just the scalar fields of each record, so the concept
+    # payloads are never parsed; it rebuilds itself if missing or stale
+    return RunManifest(processed_path).processed_ids(id_key, **run_config)
     
 
-def get_unprocessed_items(source_path: str, source_id_key: str, processed_ids_set: set) -> list:
+def get_unprocessed_items(source_path: str, source_id_key: str, processed_ids_set: set) -> SuttaView:
     """
-    Loads items from a source file and filters out those whose IDs are in the provided set.
+    Selects the items of a source file whose IDs are not in the provided set.
+
+    The items are not loaded into memory: the result is a lazy sequence backed
+    by the source's byte-offset index, which streams items from disk as it is
+    iterated.
 
     Args:
         source_path (str): Path to the source .jsonl file.
@@ -48,18 +41,13 @@ def get_unprocessed_items(source_path: str, source_id_key: str, processed_ids_se
         processed_ids_set (set): A set of IDs to filter out.
 
     Returns:
-        list: A list of item dictionaries that have not yet been processed.
+        SuttaView: A sequence of the item dictionaries that have not yet been processed.
     """
-    items_to_process = []
-    total_items = 0
-    with jsonlines.open(source_path) as reader:
-        for item in reader:
-            total_items += 1
-            if item.get(source_id_key) not in processed_ids_set:
-                items_to_process.append(item)
+    store = SuttaStore(source_path, id_key=source_id_key)
+    items_to_process = store.view(exclude_ids=processed_ids_set)
 
-    print(f"Found {total_items} total items in source.")
+    print(f"Found {len(store)} total items in source.")
     print(f"{len(processed_ids_set)} items already processed for this configuration.")
     print(f"Returning {len(items_to_process)} new items for processing.")
     
-    return items_to_process
\ No newline at end of file
+    return items_to_process
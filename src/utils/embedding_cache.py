@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from utils.config_helpers import sanitize_for_filename
+
+CACHE_VERSION = 1
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    A persistent store of text embeddings for one embedding model.
+
+    Vectors live in `<cache_dir>/<model>/vectors.f32`, a flat float32 matrix
+    that is memory-mapped for reading and only ever appended to. Row i belongs
+    to the i-th hash in `keys.txt`, a sha256 per line. Vectors are written
+    before their keys, so after a crash any rows without a key are simply
+    ignored and overwritten by the next append.
+    """
+    def __init__(self, cache_dir: str, model_id: str):
+        self.model_id = model_id
+        self.dir = os.path.join(cache_dir, sanitize_for_filename(model_id))
+        self.vectors_path = os.path.join(self.dir, "vectors.f32")
+        self.keys_path = os.path.join(self.dir, "keys.txt")
+        self.meta_path = os.path.join(self.dir, "meta.json")
+        self.dim = None
+        self._rows = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != CACHE_VERSION or meta.get('model_id') != self.model_id:
+            print(f"Warning: Ignoring embedding cache in {self.dir} written for a different model or version.")
+            return
+        self.dim = meta['dim']
+
+        stored_rows = os.path.getsize(self.vectors_path) // (self.dim * 4) if os.path.exists(self.vectors_path) else 0
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path, 'r', encoding='utf-8') as f:
+                for row, line in enumerate(f):
+                    key = line.strip()
+                    # A key without its full vector is the tail of an interrupted append
+                    if len(key) != 64 or row >= stored_rows:
+                        break
+                    self._rows.setdefault(key, row)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, text: str) -> bool:
+        return text_key(text) in self._rows
+
+    def lookup(self, texts: list) -> tuple:
+        """
+        Returns (vectors, missing): a float32 matrix with a row per text (zeros
+        where the text is not cached) and the indices of the texts not cached.
+        Without any cached vectors yet, `vectors` is None.
+        """
+        keys = [text_key(text) for text in texts]
+        with self._lock:
+            rows = [self._rows.get(key) for key in keys]
+            dim = self.dim
+        missing = [i for i, row in enumerate(rows) if row is None]
+        if dim is None:
+            return None, missing
+
+        vectors = np.zeros((len(texts), dim), dtype=np.float32)
+        hits = [i for i, row in enumerate(rows) if row is not None]
+        if hits:
+            stored = np.memmap(self.vectors_path, dtype=np.float32, mode='r').reshape(-1, dim)
+            vectors[hits] = stored[[rows[i] for i in hits]]
+            del stored
+        return vectors, missing
+
+    def add(self, texts: list, vectors):
+        """Appends the vectors of texts that are not cached yet."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self._init_store(vectors.shape[1])
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the cache's {self.dim}.")
+
+            new_keys = []
+            new_rows = []
+            seen = set()
+            for i, text in enumerate(texts):
+                key = text_key(text)
+                if key not in self._rows and key not in seen:
+                    seen.add(key)
+                    new_keys.append(key)
+                    new_rows.append(i)
+            if not new_keys:
+                return
+
+            # Start right after the last complete, keyed row
+            first_row = max(self._rows.values()) + 1 if self._rows else 0
+            with open(self.vectors_path, 'r+b' if os.path.exists(self.vectors_path) else 'wb') as f:
+                f.seek(first_row * self.dim * 4)
+                f.write(np.ascontiguousarray(vectors[new_rows]).tobytes())
+                f.truncate()
+                f.flush()
+                os.fsync(f.fileno())
+            self._truncate_keys(first_row)
+            with open(self.keys_path, 'a', encoding='utf-8') as f:
+                f.write("".join(f"{key}\n" for key in new_keys))
+            for offset, key in enumerate(new_keys):
+                self._rows[key] = first_row + offset
+
+    def _init_store(self, dim: int):
+        os.makedirs(self.dir, exist_ok=True)
+        for path in (self.vectors_path, self.keys_path):
+            if os.path.exists(path):
+                os.remove(path)
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': CACHE_VERSION, 'model_id': self.model_id, 'dim': dim}, f)
+        os.replace(tmp_path, self.meta_path)
+        self.dim = dim
+        self._rows = {}
+
+    def _truncate_keys(self, row_count: int):
+        """Cuts keys.txt back to `row_count` lines, dropping keys left over from an interrupted append."""
+        if not os.path.exists(self.keys_path):
+            return
+        with open(self.keys_path, 'r+b') as f:
+            for _ in range(row_count):
+                if not f.readline():
+                    return
+            f.truncate()
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from utils.config_helpers import get_project_root, sanitize_for_filename
+from utils.llm_helpers import BaseLLMClient, RateLimitException, UsageStats
+from utils.rate_limiter import estimate_tokens
+from utils.sutta_store import SuttaStore
+
+# Model IDs of the form "replay/<recorded model_id>" select the ReplayLLMClient
+REPLAY_PREFIX = "replay/"
+
+PACKED_HEADER = re.compile(r"^=== SUTTA (\S+) ===$", re.MULTILINE)
+MALFORMED_KINDS = ('truncated', 'prose', 'invalid_concept')
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.strip().encode('utf-8')).hexdigest()
+
+
+def sample_latency(rng: random.Random, latency_config: dict | None) -> float:
+    """
+    Draws one latency in seconds from a `latency` config section:
+        {'distribution': 'constant', 'seconds': s}
+        {'distribution': 'uniform', 'min_seconds': a, 'max_seconds': b}
+        {'distribution': 'lognormal', 'median_seconds': m, 'sigma': s}
+    """
+    latency_config = latency_config or {}
+    distribution = latency_config.get('distribution', 'constant')
+    if distribution == 'constant':
+        return latency_config.get('seconds', 0.0)
+    if distribution == 'uniform':
+        return rng.uniform(latency_config.get('min_seconds', 0.0), latency_config.get('max_seconds', 1.0))
+    if distribution == 'lognormal':
+        return rng.lognormvariate(0.0, latency_config.get('sigma', 0.5)) * latency_config.get('median_seconds', 1.0)
+    raise ValueError(f"Invalid latency distribution: {distribution}. Expected constant, uniform or lognormal.")
+
+
+class ReplayLLMClient(BaseLLMClient):
+    """
+    An offline stand-in for a provider client that replays recorded extractions.
+
+    Responses are rebuilt from an existing `raw_concepts_*.jsonl` file. A text
+    that is the body of a source sutta gets that sutta's recorded concepts; a
+    packed request gets a keyed response for the suttas named in its headers;
+    any other text (e.g. a chunk) gets a recording picked by its hash.
+
+    Latency, 429s and malformed output are injected from a seeded generator,
+    keyed by the text and how often it has been sent, so a run is reproducible
+    while a retried call can still turn out differently.
+    """
+    def __init__(self, config: dict, system_prompt: str):
+        """
+        Args:
+            config (dict): The `concept_extraction` settings, with `model_id` set to
+                           "replay/<recorded model_id>" and an optional `fake_llm` section.
+            system_prompt (str): Only used for token accounting.
+        """
+        self.model_id = config['model_id']
+        self.system_prompt = system_prompt
+        self.usage = UsageStats()
+
+        fake_config = config.get('fake_llm', {})
+        self.latency_config = fake_config.get('latency')
+        self.rate_limit_rate = fake_config.get('rate_limit_rate', 0.0)
+        self.malformed_rate = fake_config.get('malformed_rate', 0.0)
+        self.seed = fake_config.get('seed', 0)
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+        project_root = get_project_root()
+        recorded_model_id = self.model_id[len(REPLAY_PREFIX):]
+        template = fake_config.get('recordings_path_template') or config['output_path_template']
+        recordings_path = os.path.join(
+            project_root, template.format(mode=config['mode'], model_id=sanitize_for_filename(recorded_model_id))
+        )
+        self.recordings = load_recordings(recordings_path)
+        if not self.recordings:
+            raise ValueError(f"No recorded responses found in {recordings_path}.")
+        self._recorded_ids = sorted(self.recordings)
+
+        # Sutta bodies are matched to their recordings by hash
+        self._ids_by_body = {}
+        source_path = fake_config.get('source_path')
+        if source_path and os.path.exists(os.path.join(project_root, source_path)):
+            store = SuttaStore(os.path.join(project_root, source_path), id_key='sutta_id')
+            for sutta in store.view():
+                if sutta.get('body'):
+                    self._ids_by_body[_text_hash(sutta['body'])] = sutta['sutta_id']
+
+    def _rng(self, text_body: str) -> random.Random:
+        key = _text_hash(text_body)
+        with self._lock:
+            attempt = self._attempts.get(key, 0)
+            self._attempts[key] = attempt + 1
+        return random.Random(f"{self.seed}:{key}:{attempt}")
+
+    def _concepts_for(self, sutta_id: str | None, text_body: str) -> list:
+        if sutta_id not in self.recordings:
+            sutta_id = self._recorded_ids[int(_text_hash(text_body), 16) % len(self._recorded_ids)]
+        return self.recordings[sutta_id]
+
+    def _build_response(self, text_body: str) -> str:
+        packed_ids = PACKED_HEADER.findall(text_body)
+        if packed_ids:
+            return json.dumps({'suttas': [
+                {'sutta_id': sutta_id, 'concepts': self._concepts_for(sutta_id, sutta_id)} for sutta_id in packed_ids
+            ]}, ensure_ascii=False)
+        sutta_id = self._ids_by_body.get(_text_hash(text_body))
+        return json.dumps({'concepts': self._concepts_for(sutta_id, text_body)}, ensure_ascii=False)
+
+    def _respond(self, text_body: str) -> tuple:
+        """Returns (response_text, latency) for one call, raising RateLimitException when a 429 is injected."""
+        rng = self._rng(text_body)
+        latency = sample_latency(rng, self.latency_config)
+        if rng.random() < self.rate_limit_rate:
+            # Providers answer a 429 quickly
+            time.sleep(min(latency, 0.05))
+            raise RateLimitException("Replay backend injected a 429 rate limit.")
+
+        response_text = self._build_response(text_body)
+        if rng.random() < self.malformed_rate:
+            response_text = make_malformed(rng, response_text)
+        return response_text, latency
+
+    def _record_usage(self, text_body: str, response_text: str, seconds: float):
+        self.usage.record(estimate_tokens(self.system_prompt) + estimate_tokens(text_body), 0,
+                          estimate_tokens(response_text), seconds)
+
+    def generate_content(self, text_body: str) -> str:
+        response_text, latency = self._respond(text_body)
+        time.sleep(latency)
+        self._record_usage(text_body, response_text, latency)
+        return response_text
+
+    def generate_content_stream(self, text_body: str):
+        """Streams the response in ~20-token pieces, spreading the latency over them."""
+        response_text, latency = self._respond(text_body)
+        pieces = [response_text[i:i + 80] for i in range(0, len(response_text), 80)] or [""]
+        start = time.monotonic()
+        sent = []
+        try:
+            for piece in pieces:
+                time.sleep(latency / len(pieces))
+                sent.append(piece)
+                yield piece
+        finally:
+            self._record_usage(text_body, "".join(sent), time.monotonic() - start)
+
+
+def load_recordings(path: str) -> dict:
+    """Maps sutta_id to the recorded concept list of each record in a raw_concepts .jsonl file."""
+    recordings = {}
+    if not os.path.exists(path):
+        return recordings
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(record, dict) and 'sutta_id' in record and isinstance(record.get('concepts'), list):
+                recordings.setdefault(record['sutta_id'], record['concepts'])
+    return recordings
+
+
+def make_malformed(rng: random.Random, response_text: str) -> str:
+    """Corrupts a response the way real models do: truncation, prose instead of JSON, or a concept missing a key."""
+    kind = rng.choice(MALFORMED_KINDS)
+    if kind == 'truncated':
+        return response_text[:rng.randint(1, max(1, len(response_text) - 1))]
+    if kind == 'prose':
+        return "I'm sorry, but I can't provide the analysis in the requested format."
+    data = json.loads(response_text)
+    concepts = data['concepts'] if 'concepts' in data else [c for s in data['suttas'] for c in s['concepts']]
+    if concepts:
+        rng.choice(concepts).pop('concept_type', None)
+    return json.dumps(data, ensure_ascii=False)
@@ -0,0 +1,73 @@
+import json
+
+_CLOSERS = {'{': '}', '[': ']'}
+
+
+def _strip_code_fences(text: str) -> str:
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return text.strip()
+
+
+def repair_truncated_json(text: str) -> tuple:
+    """
+    Parses JSON that may have been cut off mid-way, as happens when a model
+    runs out of output tokens.
+
+    The text is cut back to the last complete object or array element and any
+    brackets still open at that point are closed, so everything before the
+    break is kept and only the unfinished element is lost. Markdown code fences
+    around the JSON are ignored.
+
+    Returns:
+        tuple: (data, truncated), where `truncated` says whether anything had
+               to be dropped. `data` is None if nothing could be recovered.
+    """
+    text = _strip_code_fences(text)
+    try:
+        return json.loads(text), False
+    except json.JSONDecodeError:
+        pass
+
+    start = text.find("{")
+    if start == -1:
+        return None, True
+
+    # Scan once, remembering every point where an element has just been closed
+    # together with the brackets still open there
+    cut_points = []
+    stack = []
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append(char)
+        elif char in "}]":
+            if not stack:
+                break
+            stack.pop()
+            cut_points.append((i + 1, "".join(_CLOSERS[opener] for opener in reversed(stack))))
+            if not stack:
+                # The top-level value is complete; whatever follows is junk
+                break
+
+    for end, closers in reversed(cut_points):
+        try:
+            return json.loads(text[start:end] + closers), True
+        except json.JSONDecodeError:
+            continue
+    return None, True
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from utils.llm_helpers import BaseLLMClient
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    A persistent, size-bounded cache of LLM responses backed by SQLite.
+
+    Entries are keyed by a hash of everything that determines a response
+    (provider, model, system prompt, temperature and input text). When the
+    total size of cached responses exceeds `max_size_mb`, the least recently
+    used entries are evicted. Safe to share between threads.
+    """
+
+    def __init__(self, path: str, max_size_mb: float = 512):
+        """
+        Args:
+            path (str): Path to the SQLite database file.
+            max_size_mb (float): Upper bound on the total size of cached responses.
+        """
+        self.path = path
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " response TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses (last_access)")
+        self._conn.commit()
+        self._size_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(provider: str, model_id: str, system_prompt: str, temperature, text_body: str) -> str:
+        """Builds the cache key for one request."""
+        parts = [provider, model_id, _sha256(system_prompt), temperature, _sha256(text_body)]
+        return _sha256(json.dumps(parts))
+
+    def get(self, key: str) -> str | None:
+        """Returns the cached response for `key`, or None on a miss."""
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key: str, response: str):
+        """Stores a response, evicting the least recently used entries if the cache is full."""
+        size = len(response.encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now)
+            )
+            self._size_bytes += size - (old[0] if old else 0)
+            if self._size_bytes > self.max_size_bytes:
+                self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self):
+        # Evict down to 90% of the budget so we don't evict on every put
+        target = int(self.max_size_bytes * 0.9)
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall()
+        for key, size in rows:
+            if self._size_bytes <= target:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._size_bytes -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and the current size of the cache."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': entries,
+                'size_mb': self._size_bytes / (1024 * 1024),
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# One cache per database file, so extractors for several models in one process share a connection
+_response_caches = {}
+_registry_lock = threading.Lock()
+
+
+def get_response_cache(path: str, max_size_mb: float = 512) -> LLMResponseCache:
+    """Returns the shared cache for `path`, opening it on first use."""
+    with _registry_lock:
+        key = os.path.abspath(path)
+        if key not in _response_caches:
+            _response_caches[key] = LLMResponseCache(path, max_size_mb=max_size_mb)
+        return _response_caches[key]
+
+
+class CachedLLMClient(BaseLLMClient):
+    """
+    Wraps a client with an LLMResponseCache.
+
+    A hit is returned straight from the cache without touching the network or
+    the rate limiter, so this wrapper must sit outside the RateLimitedClient.
+    Only responses accepted by `is_cacheable` are stored, so malformed output
+    is not replayed forever. Attributes not defined here are forwarded to the
+    wrapped client.
+    """
+    def __init__(self, client: BaseLLMClient, cache: LLMResponseCache, provider: str, model_id: str,
+                 system_prompt: str, temperature, is_cacheable=None):
+        self.client = client
+        self.cache = cache
+        self.provider = provider
+        self.model_id = model_id
+        self.system_prompt = system_prompt
+        self.temperature = temperature
+        self.is_cacheable = is_cacheable or (lambda response_text: True)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def close(self):
+        # The response cache is shared between clients, so only the wrapped client is closed
+        self.client.close()
+
+    def generate_content(self, text_body: str) -> str:
+        key = LLMResponseCache.make_key(self.provider, self.model_id, self.system_prompt, self.temperature, text_body)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        response_text = self.client.generate_content(text_body)
+        if self.is_cacheable(response_text):
+            self.cache.put(key, response_text)
+        return response_text
+
+    def generate_content_stream(self, text_body: str):
+        """Yields a hit in one piece; a miss is streamed and stored only if read to the end."""
+        key = LLMResponseCache.make_key(self.provider, self.model_id, self.system_prompt, self.temperature, text_body)
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+        parts = []
+        for text in self.client.generate_content_stream(text_body):
+            parts.append(text)
+            yield text
+        response_text = "".join(parts)
+        if self.is_cacheable(response_text):
+            self.cache.put(key, response_text)
@@ -2,12 +2,21 @@
 
 import os
 import json
+import threading
+import time
 from abc import ABC, abstractmethod
+from typing import Iterator
 
 from google import genai
-from google.genai.types import GenerateContentConfig, HarmBlockThreshold, HarmCategory, SafetySetting
+from google.genai.types import (
+    CreateCachedContentConfig, GenerateContentConfig, HarmBlockThreshold, HarmCategory, SafetySetting,
+    UpdateCachedContentConfig
+)
 from openai import OpenAI, RateLimitError
 
+from utils.rate_limiter import AdaptiveRateLimiter, estimate_tokens, get_rate_limiter
+from utils.telemetry import OUTCOME_ABORTED, OUTCOME_ERROR, OUTCOME_RATE_LIMITED, OUTCOME_SUCCESS, CallTelemetry
+
 class RateLimitException(Exception):
     """Custom exception for all API rate limit or resource exhaustion errors."""
     pass
@@ -18,79 +27,286 @@ class BaseLLMClient(ABC):
     def generate_content(self, text_body: str) -> str:
         pass
 
+    def close(self):
+        """Releases provider-side resources held for a run (e.g., a prompt cache). Later calls set them up again."""
+        pass
+
+    def generate_content_stream(self, text_body: str) -> Iterator[str]:
+        """
+        Yields the response text in pieces as it arrives. Closing the generator
+        early stops reading the response. Clients without a streaming API
+        yield the whole response at once.
+        """
+        yield self.generate_content(text_body)
+
+class UsageStats:
+    """
+    Thread-safe token counters for one client, including how many prompt
+    tokens the provider served from its prompt cache. The usage of the last
+    call made on each thread is kept for per-call telemetry.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.output_tokens = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def record(self, prompt_tokens: int | None, cached_tokens: int | None, output_tokens: int | None, seconds: float):
+        self._local.last = {'prompt_tokens': prompt_tokens, 'cached_tokens': cached_tokens,
+                            'completion_tokens': output_tokens}
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens or 0
+            self.cached_tokens += cached_tokens or 0
+            self.output_tokens += output_tokens or 0
+            self.seconds += seconds
+
+    def pop_last(self) -> dict:
+        """Returns and clears the usage recorded by the last call on this thread ({} if none)."""
+        last = getattr(self._local, 'last', None) or {}
+        self._local.last = None
+        return last
+
+    def snapshot(self) -> dict:
+        """Returns the counters plus the share of prompt tokens that hit the cache."""
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'prompt_tokens': self.prompt_tokens,
+                'cached_tokens': self.cached_tokens,
+                'output_tokens': self.output_tokens,
+                'cache_hit_rate': self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+                'mean_latency_seconds': self.seconds / self.calls if self.calls else 0.0,
+            }
+
+# Harm categories Gemini is told not to block (BLOCK_NONE), in interactive and batch requests alike
+GEMINI_SAFETY_CATEGORIES = [
+    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
+    HarmCategory.HARM_CATEGORY_HARASSMENT,
+    HarmCategory.HARM_CATEGORY_HATE_SPEECH,
+    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT
+]
+
+
+def _is_prompt_cache_error(error: Exception) -> bool:
+    """
+    True if a Gemini error means the cached content handle is gone (expired or
+    deleted). Other failures (timeouts, 5xx, invalid arguments) must not drop the cache.
+    """
+    message = str(error)
+    if getattr(error, 'code', None) == 404 or "NOT_FOUND" in message:
+        return True
+    return "cachedcontent" in message.lower().replace(" ", "")
+
 class GeminiClient(BaseLLMClient):
     """
     A client to configure and interact with the Google Gemini API.
+
+    With `prompt_cache.enabled`, the system prompt is uploaded as explicit
+    cached content on the first call of a run, and every call references that
+    handle instead of resending it. The cache's TTL is extended as the run goes
+    on, and `close` deletes it when the run ends. If the cache cannot be
+    created (e.g. the prompt is below the model's minimum cacheable size) or
+    disappears mid-run, the client falls back to sending the system instruction inline.
     """
     def __init__(self, config, response_schema, system_prompt):
         # Define Safety Settings
-        safety_settings = [
+        self.safety_settings = [
             SafetySetting(category=c, threshold=HarmBlockThreshold.BLOCK_NONE)
-            for c in [
-                HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
-                HarmCategory.HARM_CATEGORY_HARASSMENT,
-                HarmCategory.HARM_CATEGORY_HATE_SPEECH,
-                HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT
-            ]
+            for c in GEMINI_SAFETY_CATEGORIES
         ]
-        
-        self.model_config = GenerateContentConfig(
-            temperature=config['temperature'],
-            safety_settings=safety_settings,
-            response_schema=response_schema,
-            response_mime_type="application/json",
-            system_instruction=system_prompt
-        )
+        self.temperature = config['temperature']
+        self.response_schema = response_schema
+        self.system_prompt = system_prompt
 
         # Initialize Client
         self.client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
         self.model_id = config['model_id']
+        self.usage = UsageStats()
+
+        cache_config = config.get('prompt_cache', {})
+        self.cache_ttl_seconds = cache_config.get('ttl_seconds', 3600)
+        self.cached_content = None
+        self._cache_lock = threading.Lock()
+        self._cache_refreshed_at = 0.0
+        self._cache_pending = bool(cache_config.get('enabled'))
+        self.model_config = self._build_model_config()
+
+    def _build_model_config(self) -> GenerateContentConfig:
+        # The system instruction lives in the cached content when there is one
+        return GenerateContentConfig(
+            temperature=self.temperature,
+            safety_settings=self.safety_settings,
+            response_schema=self.response_schema,
+            response_mime_type="application/json",
+            system_instruction=None if self.cached_content else self.system_prompt,
+            cached_content=self.cached_content
+        )
+
+    def _create_prompt_cache(self):
+        try:
+            cache = self.client.caches.create(
+                model=self.model_id,
+                config=CreateCachedContentConfig(
+                    system_instruction=self.system_prompt,
+                    ttl=f"{self.cache_ttl_seconds}s",
+                    display_name="sutta-concept-extraction"
+                )
+            )
+            self.cached_content = cache.name
+            self._cache_refreshed_at = time.monotonic()
+        except Exception as e:
+            print(f"Warning: Could not create a Gemini prompt cache, sending the system prompt inline: {e}")
+            self.cached_content = None
+
+    def _keep_prompt_cache_alive(self):
+        """Creates the cache on the first call of a run, and extends its TTL once half of it has passed."""
+        with self._cache_lock:
+            if self._cache_pending:
+                self._cache_pending = False
+                self._create_prompt_cache()
+                self.model_config = self._build_model_config()
+                return
+            if not self.cached_content or time.monotonic() - self._cache_refreshed_at < self.cache_ttl_seconds / 2:
+                return
+            self._cache_refreshed_at = time.monotonic()
+            try:
+                self.client.caches.update(
+                    name=self.cached_content,
+                    config=UpdateCachedContentConfig(ttl=f"{self.cache_ttl_seconds}s")
+                )
+            except Exception as e:
+                print(f"Warning: Could not extend the Gemini prompt cache: {e}")
+
+    def close(self):
+        """Deletes the prompt cache, so its storage is not billed until the TTL runs out."""
+        with self._cache_lock:
+            if not self.cached_content:
+                return
+            name = self.cached_content
+            self.cached_content = None
+            self.model_config = self._build_model_config()
+            # A later run uploads the prompt again
+            self._cache_pending = True
+        try:
+            self.client.caches.delete(name=name)
+        except Exception as e:
+            print(f"Warning: Could not delete the Gemini prompt cache {name}: {e}")
+
+    def _drop_prompt_cache(self, model_config):
+        """Stops using a cache handle that the API rejected, unless another thread already did."""
+        with self._cache_lock:
+            if self.model_config is model_config:
+                print("Warning: Gemini prompt cache is no longer available, sending the system prompt inline.")
+                self.cached_content = None
+                self.model_config = self._build_model_config()
 
     def generate_content(self, sutta_body):
         """
         Generates content using the configured Gemini model.
         """
+        self._keep_prompt_cache_alive()
+        model_config = self.model_config
         try:
-            response_text = self.client.models.generate_content(
+            start = time.monotonic()
+            response = self.client.models.generate_content(
                 model=self.model_id,
-                config=self.model_config,
+                config=model_config,
                 contents=sutta_body
-            ).text
-            return  response_text
+            )
         except Exception as e:
             if "RESOURCE_EXHAUSTED" in str(e) or "429" in str(e):
                 # Re-raise as a generic RateLimitException to be caught upstream.
                 raise RateLimitException(f"Gemini API resource exhausted or rate limit hit: {e}") from e
+            elif model_config.cached_content and _is_prompt_cache_error(e):
+                # An expired or deleted cache handle; retry once with the prompt inline
+                self._drop_prompt_cache(model_config)
+                return self.generate_content(sutta_body)
             else:
                 # If it's a different error, re-raise it to not hide other issues.
-                raise    
+                raise
+
+        usage = getattr(response, 'usage_metadata', None)
+        if usage is not None:
+            self.usage.record(usage.prompt_token_count, usage.cached_content_token_count,
+                              usage.candidates_token_count, time.monotonic() - start)
+        return response.text
+
+    def generate_content_stream(self, sutta_body):
+        """
+        Streams content from the configured Gemini model. Usage is taken from
+        the last chunk seen, so an aborted stream records what was produced so far.
+        """
+        self._keep_prompt_cache_alive()
+        model_config = self.model_config
+        start = time.monotonic()
+        usage = None
+        started = False
+        try:
+            for chunk in self.client.models.generate_content_stream(
+                model=self.model_id,
+                config=model_config,
+                contents=sutta_body
+            ):
+                started = True
+                usage = getattr(chunk, 'usage_metadata', None) or usage
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            if "RESOURCE_EXHAUSTED" in str(e) or "429" in str(e):
+                raise RateLimitException(f"Gemini API resource exhausted or rate limit hit: {e}") from e
+            elif model_config.cached_content and not started and _is_prompt_cache_error(e):
+                # An expired or deleted cache handle; retry once with the prompt inline
+                self._drop_prompt_cache(model_config)
+                yield from self.generate_content_stream(sutta_body)
+                return
+            else:
+                raise
+        finally:
+            if usage is not None:
+                self.usage.record(usage.prompt_token_count, usage.cached_content_token_count,
+                                  usage.candidates_token_count, time.monotonic() - start)
 
 class OpenAIClient(BaseLLMClient):
     """
     A client to configure and interact with the DeepSeek API (OpenAI-compatible).
+
+    DeepSeek caches prompt prefixes automatically. To hit that cache, every
+    request starts with the same system message and carries nothing
+    request-specific before the user message, so all calls share the system
+    prompt as a byte-identical prefix.
     """
     def __init__(self, config, system_prompt):        
         self.client = OpenAI(api_key=os.getenv("DEEPSEEK_API_KEY"), base_url="https://api.deepseek.com")
         self.model_id = config['model_id']
         self.system_prompt = system_prompt
+        self.usage = UsageStats()
 
 
     def generate_content(self, sutta_body: str) -> str:
         """
         Generates content using the configured DeepSeek model.
         """
-        # First define messages
+        # First define messages; the system message is the shared, cacheable prefix
         messages = [
             {"role": "system", "content": self.system_prompt},
             {"role": "user", "content": sutta_body}
         ]
 
         try:
+            start = time.monotonic()
             response = self.client.chat.completions.create(
                 model=self.model_id,
                 messages=messages,
                 response_format={"type": "json_object"}
             )
+
+            usage = getattr(response, 'usage', None)
+            if usage is not None:
+                self._record_usage(usage, time.monotonic() - start)
         
             # Return the raw JSON string, do not parse it here.
             # The calling function (ConceptExtractor) is responsible for parsing.
@@ -100,22 +316,207 @@ class OpenAIClient(BaseLLMClient):
         except RateLimitError as e:
             raise RateLimitException("OpenAI/DeepSeek API rate limit was hit.") from e
 
+    def generate_content_stream(self, sutta_body: str):
+        """
+        Streams content from the configured DeepSeek model. Closing the generator
+        closes the HTTP response, so no further output is read. Usage arrives
+        in the final chunk, so an aborted stream records its output as estimated
+        from the text received.
+        """
+        messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": sutta_body}
+        ]
+
+        start = time.monotonic()
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model_id,
+                messages=messages,
+                response_format={"type": "json_object"},
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+        except RateLimitError as e:
+            raise RateLimitException("OpenAI/DeepSeek API rate limit was hit.") from e
+
+        usage = None
+        received = []
+        try:
+            for chunk in stream:
+                usage = getattr(chunk, 'usage', None) or usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    received.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        except RateLimitError as e:
+            raise RateLimitException("OpenAI/DeepSeek API rate limit was hit.") from e
+        finally:
+            stream.close()
+            if usage is not None:
+                self._record_usage(usage, time.monotonic() - start)
+            else:
+                self.usage.record(None, None, estimate_tokens("".join(received)), time.monotonic() - start)
+
+    def _record_usage(self, usage, seconds: float):
+        # DeepSeek reports prefix-cache hits as `prompt_cache_hit_tokens`; OpenAI in `prompt_tokens_details`
+        cached_tokens = getattr(usage, 'prompt_cache_hit_tokens', None)
+        if cached_tokens is None and getattr(usage, 'prompt_tokens_details', None) is not None:
+            cached_tokens = usage.prompt_tokens_details.cached_tokens
+        self.usage.record(usage.prompt_tokens, cached_tokens, usage.completion_tokens, seconds)
+
+class RateLimitedClient(BaseLLMClient):
+    """
+    Wraps another client so every call goes through a shared AdaptiveRateLimiter.
+
+    A RateLimitException from the wrapped client slows the limiter down and the
+    call is retried; it is only re-raised once `max_retries` is exhausted.
+    With a CallTelemetry, every call (including its retries) is recorded as one
+    event. Attributes not defined here are forwarded to the wrapped client.
+    """
+    def __init__(self, client: BaseLLMClient, rate_limiter: AdaptiveRateLimiter, system_prompt: str, max_retries: int = 5,
+                 telemetry: CallTelemetry | None = None, provider: str | None = None):
+        self.client = client
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.telemetry = telemetry
+        self.provider = provider
+        # The system prompt is sent with every call, so it counts against the token quota
+        self.prompt_tokens = estimate_tokens(system_prompt)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def close(self):
+        self.client.close()
+
+    def _take_usage(self) -> dict:
+        usage = getattr(self.client, 'usage', None)
+        return usage.pop_last() if isinstance(usage, UsageStats) else {}
+
+    def _record_call(self, queue_wait: float, latency: float, retries: int, outcome: str, streamed: bool):
+        if self.telemetry is None:
+            return
+        usage = self._take_usage()
+        self.telemetry.record({
+            'model_id': getattr(self.client, 'model_id', None),
+            'provider': self.provider,
+            'streamed': streamed,
+            'queue_wait_seconds': queue_wait,
+            'latency_seconds': latency,
+            'prompt_tokens': usage.get('prompt_tokens'),
+            'cached_tokens': usage.get('cached_tokens'),
+            'completion_tokens': usage.get('completion_tokens'),
+            'retries': retries,
+            'outcome': outcome,
+        })
+
+    def generate_content(self, text_body: str) -> str:
+        tokens = self.prompt_tokens + estimate_tokens(text_body)
+        queue_wait = latency = 0.0
+        if self.telemetry is not None:
+            self._take_usage()
+        for attempt in range(self.max_retries + 1):
+            queue_wait += self.rate_limiter.acquire(tokens)
+            start = time.monotonic()
+            try:
+                response_text = self.client.generate_content(text_body)
+            except RateLimitException:
+                latency += time.monotonic() - start
+                self.rate_limiter.on_rate_limited()
+                if attempt == self.max_retries:
+                    self._record_call(queue_wait, latency, attempt, OUTCOME_RATE_LIMITED, streamed=False)
+                    raise
+                continue
+            except Exception:
+                self._record_call(queue_wait, latency + time.monotonic() - start, attempt, OUTCOME_ERROR, streamed=False)
+                raise
+            self.rate_limiter.on_success()
+            self._record_call(queue_wait, latency + time.monotonic() - start, attempt, OUTCOME_SUCCESS, streamed=False)
+            return response_text
+
+    def generate_content_stream(self, text_body: str):
+        """
+        Streams through the wrapped client. A rate limit is only retried while
+        nothing has been yielded yet; once text has been passed on it is re-raised.
+        A stream closed before its end is recorded as aborted.
+        """
+        tokens = self.prompt_tokens + estimate_tokens(text_body)
+        queue_wait = latency = 0.0
+        if self.telemetry is not None:
+            self._take_usage()
+        for attempt in range(self.max_retries + 1):
+            queue_wait += self.rate_limiter.acquire(tokens)
+            start = time.monotonic()
+            started = False
+            stream = self.client.generate_content_stream(text_body)
+            try:
+                for text in stream:
+                    started = True
+                    yield text
+            except RateLimitException:
+                stream.close()
+                latency += time.monotonic() - start
+                self.rate_limiter.on_rate_limited()
+                if started or attempt == self.max_retries:
+                    self._record_call(queue_wait, latency, attempt, OUTCOME_RATE_LIMITED, streamed=True)
+                    raise
+                continue
+            except GeneratorExit:
+                stream.close()
+                self._record_call(queue_wait, latency + time.monotonic() - start, attempt, OUTCOME_ABORTED, streamed=True)
+                raise
+            except Exception:
+                stream.close()
+                self._record_call(queue_wait, latency + time.monotonic() - start, attempt, OUTCOME_ERROR, streamed=True)
+                raise
+            self.rate_limiter.on_success()
+            self._record_call(queue_wait, latency + time.monotonic() - start, attempt, OUTCOME_SUCCESS, streamed=True)
+            return
+
+def get_provider_name(model_id: str) -> str:
+    """Maps a model_id to the provider that serves it."""
+    if model_id.startswith('replay/'):
+        return 'replay'
+    elif 'gemini' in model_id:
+        return 'gemini'
+    elif 'deepseek' in model_id:
+        return 'deepseek'
+    else:
+        raise ValueError(f"Unsupported model provider for model_id: {model_id}")
+
 # Define factory to move between clients
-def get_llm_client(extraction_config, system_prompt, response_schema_class) -> BaseLLMClient:
+def get_llm_client(extraction_config, system_prompt, response_schema_class,
+                   telemetry: CallTelemetry | None = None) -> BaseLLMClient:
     """
     Factory function to get the appropriate LLM client based on config.
+    The client is wrapped in the shared rate limiter for its provider and model,
+    which also reports every call to `telemetry` if one is given. A model_id of
+    "replay/<model_id>" selects the offline ReplayLLMClient.
     """
     model_id = extraction_config['model_id']
+    provider = get_provider_name(model_id)
+
+    if provider == 'replay':
+        # Imported here since the replay backend builds on this module
+        from utils.fake_llm import ReplayLLMClient
+        client = ReplayLLMClient(extraction_config, system_prompt)
 
-    if 'gemini' in model_id:
+    elif provider == 'gemini':
         if not os.getenv("GEMINI_API_KEY"):
             raise ValueError("GEMINI_API_KEY not found in environment variables for Gemini client.")
-        return GeminiClient(extraction_config, response_schema_class, system_prompt)
+        client = GeminiClient(extraction_config, response_schema_class, system_prompt)
     
-    elif 'deepseek' in model_id:
+    else:
         if not os.getenv("DEEPSEEK_API_KEY"):
             raise ValueError("DEEPSEEK_API_KEY not found in environment variables for DeepSeek client.")
-        return OpenAIClient(extraction_config, system_prompt)
-    
-    else:
-        raise ValueError(f"Unsupported model provider for model_id: {model_id}")
\ No newline at end of file
+        client = OpenAIClient(extraction_config, system_prompt)
+
+    limits = extraction_config.get('rate_limits', {}).get(provider)
+    return RateLimitedClient(
+        client,
+        get_rate_limiter(provider, model_id, limits),
+        system_prompt,
+        max_retries=extraction_config.get('max_rate_limit_retries', 5),
+        telemetry=telemetry,
+        provider=provider
+    )
\ No newline at end of file
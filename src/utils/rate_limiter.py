@@ -0,0 +1,143 @@
+import threading
+import time
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budgeting (~4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+class AdaptiveRateLimiter:
+    """
+    A thread-safe token-bucket limiter with AIMD (additive-increase,
+    multiplicative-decrease) adaptation.
+
+    Two buckets are enforced: one for requests per minute and an optional one
+    for tokens per minute. Both refill at the configured rate times the current
+    `scale`. Every 429 multiplies `scale` down and pauses all callers for an
+    exponentially growing cooldown; every success nudges `scale` back up
+    towards 1.0, so throughput settles just under the provider's real quota.
+    """
+
+    def __init__(self, requests_per_minute: float | None = None, tokens_per_minute: float | None = None,
+                 burst_seconds: float = 2.0, decrease_factor: float = 0.5, increase_step: float = 0.02,
+                 min_scale: float = 0.05, base_backoff_seconds: float = 2.0, max_backoff_seconds: float = 120.0):
+        """
+        Args:
+            requests_per_minute (float | None): Request quota. None means unlimited.
+            tokens_per_minute (float | None): Token quota. None means unlimited.
+            burst_seconds (float): How many seconds of quota may be spent at once.
+            decrease_factor (float): Multiplier applied to the rate on a 429.
+            increase_step (float): Fraction of the full rate regained per success.
+            min_scale (float): The rate never drops below this fraction of the quota.
+            base_backoff_seconds (float): Pause after the first 429 in a row.
+            max_backoff_seconds (float): Upper bound for the exponential pause.
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.burst_seconds = burst_seconds
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step
+        self.min_scale = min_scale
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+
+        self.scale = 1.0
+        self.consecutive_rate_limits = 0
+        self._blocked_until = 0.0
+        self._last_decrease = float('-inf')
+        self._request_level = self._capacity(requests_per_minute)
+        self._token_level = self._capacity(tokens_per_minute)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, limits: dict | None) -> "AdaptiveRateLimiter":
+        """Builds a limiter from a `rate_limits.<provider>` config section."""
+        return cls(**(limits or {}))
+
+    def _capacity(self, per_minute: float | None) -> float:
+        if not per_minute:
+            return float('inf')
+        return max(1.0, per_minute / 60.0 * self.burst_seconds * self.scale)
+
+    def _refill(self, now: float):
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        if self.requests_per_minute:
+            rate = self.requests_per_minute / 60.0 * self.scale
+            self._request_level = min(self._capacity(self.requests_per_minute), self._request_level + elapsed * rate)
+        if self.tokens_per_minute:
+            rate = self.tokens_per_minute / 60.0 * self.scale
+            self._token_level = min(self._capacity(self.tokens_per_minute), self._token_level + elapsed * rate)
+
+    def _wait_time(self, now: float, tokens: int) -> float:
+        """Seconds until a request of `tokens` may go out (0 if it may go now)."""
+        waits = [self._blocked_until - now]
+        if self.requests_per_minute and self._request_level < 1:
+            waits.append((1 - self._request_level) / (self.requests_per_minute / 60.0 * self.scale))
+        if self.tokens_per_minute:
+            # A request larger than the bucket only waits for a full bucket and then runs into debt
+            needed = min(tokens, self._capacity(self.tokens_per_minute))
+            if self._token_level < needed:
+                waits.append((needed - self._token_level) / (self.tokens_per_minute / 60.0 * self.scale))
+        return max(waits)
+
+    def acquire(self, tokens: int = 1) -> float:
+        """
+        Blocks until a request of roughly `tokens` tokens fits within the quota.
+
+        Returns:
+            float: The number of seconds the caller waited.
+        """
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                delay = self._wait_time(now, tokens)
+                if delay <= 0:
+                    if self.requests_per_minute:
+                        self._request_level -= 1
+                    if self.tokens_per_minute:
+                        self._token_level -= tokens
+                    return now - start
+            time.sleep(delay)
+
+    def on_success(self):
+        """Additive increase: slowly ramp the rate back up after a successful call."""
+        with self._lock:
+            self.consecutive_rate_limits = 0
+            self.scale = min(1.0, self.scale + self.increase_step)
+
+    def on_rate_limited(self, retry_after: float | None = None):
+        """
+        Multiplicative decrease: cut the rate and pause every caller.
+        A burst of concurrent 429s only counts as one decrease per cooldown.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._last_decrease + self.base_backoff_seconds:
+                return
+            self._last_decrease = now
+            self.consecutive_rate_limits += 1
+            self.scale = max(self.min_scale, self.scale * self.decrease_factor)
+            backoff = min(self.max_backoff_seconds,
+                          self.base_backoff_seconds * 2 ** (self.consecutive_rate_limits - 1))
+            self._blocked_until = max(self._blocked_until, now + max(backoff, retry_after or 0))
+            # Drop any saved-up burst so the slower rate takes effect immediately
+            self._request_level = min(self._request_level, 0.0)
+
+
+# One limiter per (provider, model) so every client and thread hitting the same quota shares it
+_rate_limiters = {}
+_registry_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str, model_id: str, limits: dict | None = None) -> AdaptiveRateLimiter:
+    """Returns the shared limiter for `model_id`, creating it from `limits` on first use."""
+    with _registry_lock:
+        key = (provider, model_id)
+        if key not in _rate_limiters:
+            _rate_limiters[key] = AdaptiveRateLimiter.from_config(limits)
+        return _rate_limiters[key]
@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+import time
+
+from utils.run_manifest import RunManifest, record_keys
+
+FSYNC_MODES = ('none', 'batch', 'always')
+
+
+class JsonlResultWriter:
+    """
+    A long-lived, thread-safe, buffered writer for .jsonl result files.
+
+    Records are serialized as they arrive and buffered in memory. The buffer is
+    written out when it holds `batch_size` records, when `flush_interval_seconds`
+    have passed since the last flush, and on close. Each flush is a single
+    `write` of complete lines, so a crash can at worst lose the unflushed
+    buffer, never leave half a record behind. A partial trailing line left by
+    an older writer is cut off when the file is opened. A flush interval of 0
+    disables the time policy.
+
+    With `manifest` on, every flushed record is also indexed in the output's
+    RunManifest sidecar, so resuming never has to re-parse the output file.
+
+    fsync modes:
+        'none':   leave durability to the OS.
+        'batch':  fsync after every flush.
+        'always': flush and fsync after every record.
+    """
+
+    def __init__(self, path: str, batch_size: int = 20, flush_interval_seconds: float = 5.0, fsync: str = 'batch',
+                 manifest: bool = True):
+        if fsync not in FSYNC_MODES:
+            raise ValueError(f"Invalid fsync mode: {fsync}. Expected one of {FSYNC_MODES}.")
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval_seconds = flush_interval_seconds
+        self.fsync = fsync
+        self.manifest = RunManifest(path) if manifest else None
+
+        self._file = None
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flusher = None
+
+    @classmethod
+    def from_config(cls, path: str, writer_config: dict | None) -> "JsonlResultWriter":
+        """Builds a writer from a `writer` config section."""
+        return cls(path, **(writer_config or {}))
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        """Opens the file for appending, repairing a half-written last line if needed."""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        repair_trailing_partial_line(self.path)
+        self._file = open(self.path, 'ab')
+        if self.manifest is not None:
+            # Bring the index up to date before appending to it
+            self.manifest.load()
+        self._closed.clear()
+        self._last_flush = time.monotonic()
+
+        # Flush on the time policy even while no new records are arriving
+        if self.flush_interval_seconds and self.fsync != 'always':
+            self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+            self._flusher.start()
+
+    def write(self, record: dict):
+        """Buffers one record, flushing if the size or time policy says so."""
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+        with self._lock:
+            if self._file is None:
+                raise RuntimeError("writer is not open")
+            self._buffer.append((line, record_keys(record)))
+            overdue = (self.flush_interval_seconds
+                       and time.monotonic() - self._last_flush >= self.flush_interval_seconds)
+            if self.fsync == 'always' or len(self._buffer) >= self.batch_size or overdue:
+                self._flush_locked()
+
+    def flush(self):
+        """Writes out all buffered records."""
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        """Flushes the buffer and closes the file."""
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        with self._lock:
+            if self._file is None:
+                return
+            self._flush_locked()
+            self._file.close()
+            self._file = None
+
+    def _flush_locked(self):
+        self._last_flush = time.monotonic()
+        if not self._buffer or self._file is None:
+            return
+        # One write call per batch of whole lines
+        self._file.write(b"".join(line for line, _ in self._buffer))
+        self._file.flush()
+        if self.fsync != 'none':
+            os.fsync(self._file.fileno())
+
+        # The manifest is only updated once the records are in the output file
+        if self.manifest is not None:
+            end_offset = self._file.tell()
+            indexed = []
+            for line, keys in reversed(self._buffer):
+                indexed.append((keys, end_offset))
+                end_offset -= len(line)
+            self.manifest.append(indexed[::-1])
+        self._buffer.clear()
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval_seconds):
+            with self._lock:
+                if time.monotonic() - self._last_flush >= self.flush_interval_seconds:
+                    self._flush_locked()
+
+
+def repair_trailing_partial_line(path: str) -> int:
+    """
+    Truncates a .jsonl file after its last complete line.
+
+    Returns:
+        int: The number of bytes removed.
+    """
+    if not os.path.exists(path):
+        return 0
+    size = os.path.getsize(path)
+    if size == 0:
+        return 0
+
+    with open(path, 'r+b') as f:
+        # Scan backwards in blocks for the last newline
+        end = size
+        block_size = 64 * 1024
+        while end > 0:
+            start = max(0, end - block_size)
+            f.seek(start)
+            block = f.read(end - start)
+            if end == size and block.endswith(b"\n"):
+                return 0
+            newline = block.rfind(b"\n")
+            if newline != -1:
+                keep = start + newline + 1
+                break
+            end = start
+        else:
+            keep = 0
+        f.truncate(keep)
+
+    print(f"Warning: Removed a half-written record ({size - keep} bytes) from the end of {path}")
+    return size - keep
@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+
+MANIFEST_VERSION = 1
+
+
+def manifest_path_for(output_path: str) -> str:
+    return f"{output_path}.manifest"
+
+
+def record_keys(record: dict) -> dict:
+    """The fields of a record kept in the manifest: its top-level scalars (IDs and run settings, no payload)."""
+    return {key: value for key, value in record.items()
+            if value is None or isinstance(value, (str, int, float, bool))}
+
+
+class RunManifest:
+    """
+    A small sidecar index of a .jsonl output file, stored next to it as `<output>.manifest`.
+
+    The first line is a header; every following line is `[keys, end_offset]`
+    for one output record, where `keys` holds the record's scalar fields and
+    `end_offset` is the byte offset just past the record in the output file.
+    Answering "which IDs were processed with this run config" then only reads
+    these short lines, never the concept payloads.
+
+    The manifest is checked against the output file on load. If the output has
+    grown (records appended by something other than the result writer), only
+    the new tail is indexed. If the output was replaced (a different inode, or
+    the last indexed record is no longer where the manifest says it is), is
+    shorter than the manifest claims, or if the manifest is missing or
+    unreadable, it is rebuilt from scratch.
+    """
+    def __init__(self, output_path: str):
+        self.output_path = output_path
+        self.path = manifest_path_for(output_path)
+        self._lock = threading.Lock()
+
+    # --- Reading ---
+    def load(self) -> list:
+        """Returns the keys of every record in the output file, bringing the manifest up to date first."""
+        with self._lock:
+            if not os.path.exists(self.output_path):
+                return []
+            entries, start, covered = self._read()
+            output_size = os.path.getsize(self.output_path)
+            if entries is None or covered > output_size or not self._last_record_matches(entries, start, covered):
+                entries, covered = self._rebuild()
+            elif covered < output_size:
+                entries.extend(self._index_tail(covered))
+            return entries
+
+    def processed_ids(self, id_key: str, **run_config) -> set:
+        """Returns the IDs of records that match every key/value pair in `run_config`."""
+        return {
+            keys[id_key] for keys in self.load()
+            if keys.get(id_key) and all(keys.get(key) == value for key, value in run_config.items())
+        }
+
+    def _read(self):
+        """
+        Returns (entries, start, covered), where the last indexed record spans
+        bytes [start, covered) of the output, or (None, 0, 0) if there is no usable manifest.
+        """
+        if not os.path.exists(self.path):
+            return None, 0, 0
+        entries = []
+        start = covered = 0
+        valid_bytes = 0
+        with open(self.path, 'rb') as f:
+            header = f.readline()
+            try:
+                if json.loads(header) != self._header():
+                    return None, 0, 0
+            except json.JSONDecodeError:
+                return None, 0, 0
+            valid_bytes = len(header)
+            for line in f:
+                try:
+                    keys, end_offset = json.loads(line)
+                except (json.JSONDecodeError, ValueError, TypeError):
+                    # A half-written last line; cut it off and index the rest again
+                    break
+                entries.append(keys)
+                start, covered = covered, end_offset
+                valid_bytes += len(line)
+        if valid_bytes < os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_bytes)
+        return entries, start, covered
+
+    def _header(self) -> dict:
+        return {'version': MANIFEST_VERSION, 'inode': os.stat(self.output_path).st_ino}
+
+    def _last_record_matches(self, entries: list, start: int, covered: int) -> bool:
+        """Checks that the output still holds the last indexed record at the recorded offsets."""
+        if not entries:
+            return covered == 0
+        with open(self.output_path, 'rb') as f:
+            f.seek(start)
+            lines = f.read(covered - start).splitlines()
+        lines = [line for line in lines if line.strip()]
+        try:
+            return bool(lines) and record_keys(json.loads(lines[-1])) == entries[-1]
+        except (json.JSONDecodeError, AttributeError):
+            return False
+
+    def _scan_output(self, start: int) -> list:
+        """Parses the output file from byte offset `start`, returning (keys, end_offset) per complete record."""
+        indexed = []
+        with open(self.output_path, 'rb') as f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Partial trailing record; index it once it is complete
+                    break
+                offset += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"Warning: Skipping corrupted line at byte {offset - len(line)} in {self.output_path}")
+                    continue
+                if isinstance(record, dict):
+                    indexed.append((record_keys(record), offset))
+        return indexed
+
+    def _rebuild(self):
+        indexed = self._scan_output(0)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(self._header()) + "\n")
+            f.writelines(json.dumps([keys, end_offset], ensure_ascii=False) + "\n" for keys, end_offset in indexed)
+        os.replace(tmp_path, self.path)
+        return [keys for keys, _ in indexed], (indexed[-1][1] if indexed else 0)
+
+    def _index_tail(self, start: int) -> list:
+        indexed = self._scan_output(start)
+        self._append_locked(indexed)
+        return [keys for keys, _ in indexed]
+
+    # --- Writing ---
+    def append(self, indexed: list):
+        """Records (keys, end_offset) pairs for records just written to the output file."""
+        with self._lock:
+            if not os.path.exists(self.path):
+                # Written in full on the next load
+                return
+            self._append_locked(indexed)
+
+    def _append_locked(self, indexed: list):
+        if not indexed:
+            return
+        if not os.path.exists(self.path):
+            self._rebuild()
+            return
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write("".join(json.dumps([keys, end_offset], ensure_ascii=False) + "\n" for keys, end_offset in indexed))
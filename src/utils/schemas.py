@@ -30,3 +30,23 @@ class ConceptFixed(BaseModel):
 class SuttaConceptsFixed(BaseModel):
     """A list of fixed-type concepts for a single Sutta."""
     concepts: List[ConceptFixed]
+
+# --- Keyed schemas for packed requests (several suttas in one call) ---
+
+class PackedSuttaConceptsDiscovery(BaseModel):
+    """Discovered concepts for one Sutta of a packed request, keyed by its ID."""
+    sutta_id: str = Field(..., description="The ID of the Sutta, exactly as given in its header.")
+    concepts: List[ConceptDiscovery]
+
+class PackedConceptsDiscovery(BaseModel):
+    """Discovered concepts for every Sutta in a packed request."""
+    suttas: List[PackedSuttaConceptsDiscovery]
+
+class PackedSuttaConceptsFixed(BaseModel):
+    """Fixed-type concepts for one Sutta of a packed request, keyed by its ID."""
+    sutta_id: str = Field(..., description="The ID of the Sutta, exactly as given in its header.")
+    concepts: List[ConceptFixed]
+
+class PackedConceptsFixed(BaseModel):
+    """Fixed-type concepts for every Sutta in a packed request."""
+    suttas: List[PackedSuttaConceptsFixed]
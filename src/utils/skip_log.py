@@ -0,0 +1,60 @@
+import json
+import os
+
+# Failure classes, matched against the recorded reason in this order
+FAILURE_RATE_LIMIT = 'rate_limit'
+FAILURE_VALIDATION = 'validation'
+FAILURE_EMPTY = 'empty'
+FAILURE_OTHER = 'other'
+
+# Validation reasons embed the raw model output, which may contain any text,
+# so they are matched first and status codes only in their error-message form
+_FAILURE_PATTERNS = [
+    (FAILURE_VALIDATION, ("schema validation failed", "validation error", "no result returned")),
+    (FAILURE_EMPTY, ("body is empty",)),
+    (FAILURE_RATE_LIMIT, ("rate limit", "resource exhausted", "resource_exhausted", "error code: 429",
+                          "429 too many requests")),
+]
+
+
+def classify_failure(reason: str) -> str:
+    """Maps a skip reason to its failure class (rate_limit, validation, empty or other)."""
+    reason = (reason or "").lower()
+    for failure_class, patterns in _FAILURE_PATTERNS:
+        if any(pattern in reason for pattern in patterns):
+            return failure_class
+    return FAILURE_OTHER
+
+
+def load_skip_log(log_path: str) -> dict:
+    """
+    Reads a skip log, keeping only the latest entry per item.
+
+    Returns:
+        dict: {item_id: entry}, in order of each item's first appearance.
+    """
+    entries = {}
+    if not os.path.exists(log_path):
+        return entries
+    with open(log_path, 'r', encoding='utf-8') as f:
+        for line_num, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Warning: Skipping corrupted line {line_num} in {log_path}")
+                continue
+            entries[entry.get('item_id')] = {**entries.get(entry.get('item_id'), {}), **entry}
+    return entries
+
+
+def write_skip_log(log_path: str, entries: list):
+    """Atomically replaces the skip log with `entries`."""
+    tmp_path = f"{log_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, log_path)
@@ -0,0 +1,132 @@
+import json
+import os
+from collections.abc import Sequence
+
+INDEX_VERSION = 1
+
+
+class SuttaStore:
+    """
+    Random access to a .jsonl corpus (e.g. `dhammatalks_suttas.jsonl`) by item ID.
+
+    A byte-offset index `{id: (offset, length)}` is kept next to the corpus as
+    `<path>.idx` and rebuilt whenever the corpus's size or modification time
+    changes. Only the index is held in memory; items are read from disk when
+    they are fetched or iterated, so memory does not grow with the corpus.
+    """
+    def __init__(self, path: str, id_key: str = 'sutta_id'):
+        """
+        Args:
+            path (str): Path to the source .jsonl file.
+            id_key (str): The key in each item that holds its unique ID.
+        """
+        self.path = path
+        self.id_key = id_key
+        self.index_path = f"{path}.idx"
+        self._offsets = self._load_index()
+
+    def _fingerprint(self) -> dict:
+        stat = os.stat(self.path)
+        return {'version': INDEX_VERSION, 'id_key': self.id_key, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def _load_index(self) -> dict:
+        fingerprint = self._fingerprint()
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                if index.get('fingerprint') == fingerprint:
+                    self._warn_duplicates(index.get('duplicates', 0))
+                    return {item_id: (offset, length) for item_id, offset, length in index['offsets']}
+            except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                pass
+        return self._build_index(fingerprint)
+
+    def _build_index(self, fingerprint: dict) -> dict:
+        offsets = {}
+        duplicates = 0
+        with open(self.path, 'rb') as f:
+            offset = 0
+            for line in f:
+                if line.strip():
+                    try:
+                        item_id = json.loads(line).get(self.id_key)
+                    except (json.JSONDecodeError, AttributeError):
+                        print(f"Warning: Skipping corrupted line at byte {offset} in {self.path}")
+                        item_id = None
+                    if item_id in offsets:
+                        duplicates += 1
+                    elif item_id is not None:
+                        # The first occurrence of an ID wins, as in a sequential scan
+                        offsets[item_id] = (offset, len(line))
+                offset += len(line)
+        self._warn_duplicates(duplicates)
+
+        index = {'fingerprint': fingerprint, 'duplicates': duplicates,
+                 'offsets': [[item_id, o, n] for item_id, (o, n) in offsets.items()]}
+        tmp_path = f"{self.index_path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(index, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"Warning: Could not save the index for {self.path}, keeping it in memory only: {e}")
+        return offsets
+
+    def _warn_duplicates(self, duplicates: int):
+        if duplicates:
+            print(f"Warning: {duplicates} lines in {self.path} repeat an earlier {self.id_key} "
+                  f"and are ignored; only the first occurrence of each ID is used.")
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __contains__(self, item_id) -> bool:
+        return item_id in self._offsets
+
+    def ids(self) -> list:
+        """Returns every item ID, in file order."""
+        return list(self._offsets)
+
+    def get(self, item_id) -> dict | None:
+        """Returns the item with `item_id`, or None if the corpus has no such item."""
+        location = self._offsets.get(item_id)
+        if location is None:
+            return None
+        with open(self.path, 'rb') as f:
+            return self._read_at(f, *location)
+
+    @staticmethod
+    def _read_at(f, offset: int, length: int) -> dict:
+        f.seek(offset)
+        return json.loads(f.read(length))
+
+    def view(self, exclude_ids: set | None = None) -> "SuttaView":
+        """Returns a lazy sequence of the items whose IDs are not in `exclude_ids`, in file order."""
+        exclude_ids = exclude_ids or set()
+        return SuttaView(self, [item_id for item_id in self._offsets if item_id not in exclude_ids])
+
+
+class SuttaView(Sequence):
+    """
+    A lazy, read-only sequence over some of the items in a SuttaStore.
+
+    Only the selected IDs are held in memory. Iterating streams the items from
+    disk through one open file, and indexing fetches a single item by offset.
+    """
+    def __init__(self, store: SuttaStore, item_ids: list):
+        self.store = store
+        self.item_ids = item_ids
+
+    def __len__(self) -> int:
+        return len(self.item_ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return SuttaView(self.store, self.item_ids[index])
+        return self.store.get(self.item_ids[index])
+
+    def __iter__(self):
+        with open(self.store.path, 'rb') as f:
+            for item_id in self.item_ids:
+                yield self.store._read_at(f, *self.store._offsets[item_id])
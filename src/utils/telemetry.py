@@ -0,0 +1,183 @@
+import math
+import os
+import threading
+import time
+
+from utils.result_writer import JsonlResultWriter
+
+OUTCOME_SUCCESS = 'success'
+OUTCOME_RATE_LIMITED = 'rate_limited'
+OUTCOME_ABORTED = 'aborted'
+OUTCOME_ERROR = 'error'
+
+
+def percentile(values: list, q: float) -> float:
+    """Nearest-rank percentile of `values` (0 for an empty list), with `q` in [0, 1]."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def estimate_cost(prices: dict | None, prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> float | None:
+    """
+    Estimated USD cost of the given tokens, with `prices` in USD per million
+    tokens ({'input': ..., 'cached_input': ..., 'output': ...}). Cached prompt
+    tokens are billed at `cached_input` (or `input` if unset). None without prices.
+    """
+    if not prices:
+        return None
+    cached_price = prices.get('cached_input', prices.get('input', 0.0))
+    return ((prompt_tokens - cached_tokens) * prices.get('input', 0.0)
+            + cached_tokens * cached_price
+            + completion_tokens * prices.get('output', 0.0)) / 1_000_000
+
+
+class CallTelemetry:
+    """
+    Collects one structured event per LLM call and aggregates them per run.
+
+    Events are appended to a .jsonl file through a buffered writer (opened on
+    the first event) and kept in memory for the run summary. `finish` closes the
+    file, writes the summary as a Prometheus textfile for the node exporter to
+    pick up (if a path is configured) and starts a new run, so a processor that
+    runs twice (e.g. a pipeline run, then a skip-log replay) reports each on its own.
+
+    An event holds the model, wall latency and rate-limiter queue wait (both
+    summed over retries), prompt/cached/completion tokens, the retry count and
+    the outcome (success, rate_limited, aborted or error).
+    """
+    def __init__(self, events_path: str | None = None, prometheus_path: str | None = None,
+                 prices: dict | None = None, labels: dict | None = None):
+        """
+        Args:
+            events_path (str | None): Where events are appended. None keeps them in memory only.
+            prometheus_path (str | None): Where `finish` writes the metrics textfile.
+            prices (dict | None): USD per million tokens, keyed by model_id.
+            labels (dict | None): Extra fields added to every event and metric (e.g., the mode).
+        """
+        self.events_path = events_path
+        self.prometheus_path = prometheus_path
+        self.prices = prices or {}
+        self.labels = labels or {}
+        self.events = []
+        self._writer = None
+        self._lock = threading.Lock()
+
+    def record(self, event: dict):
+        """Adds one call event (see the class docstring for its fields)."""
+        event = {'time': time.time(), **self.labels, **event}
+        with self._lock:
+            self.events.append(event)
+            if self.events_path is None:
+                return
+            if self._writer is None:
+                self._writer = JsonlResultWriter(self.events_path, fsync='none', manifest=False)
+                self._writer.open()
+        self._writer.write(event)
+
+    def summary(self, events: list | None = None) -> dict:
+        """
+        Aggregates the events of this run per model: calls by outcome, retries,
+        p50/p95 latency and queue wait, token totals, output tokens per second of
+        run time, and the estimated cost when prices are configured.
+        """
+        if events is None:
+            with self._lock:
+                events = list(self.events)
+
+        by_model = {}
+        for event in events:
+            by_model.setdefault(event['model_id'], []).append(event)
+
+        summary = {}
+        for model_id, model_events in by_model.items():
+            latencies = [e['latency_seconds'] for e in model_events]
+            queue_waits = [e['queue_wait_seconds'] for e in model_events]
+            prompt_tokens = sum(e.get('prompt_tokens') or 0 for e in model_events)
+            cached_tokens = sum(e.get('cached_tokens') or 0 for e in model_events)
+            completion_tokens = sum(e.get('completion_tokens') or 0 for e in model_events)
+            # Run time spans from the first call starting to the last one ending
+            run_start = min(e['time'] - e['latency_seconds'] - e['queue_wait_seconds'] for e in model_events)
+            run_seconds = max(e['time'] for e in model_events) - run_start
+            outcomes = {}
+            for event in model_events:
+                outcomes[event['outcome']] = outcomes.get(event['outcome'], 0) + 1
+
+            summary[model_id] = {
+                'calls': len(model_events),
+                'outcomes': outcomes,
+                'retries': sum(e['retries'] for e in model_events),
+                'latency_p50_seconds': percentile(latencies, 0.5),
+                'latency_p95_seconds': percentile(latencies, 0.95),
+                'queue_wait_p50_seconds': percentile(queue_waits, 0.5),
+                'queue_wait_p95_seconds': percentile(queue_waits, 0.95),
+                'prompt_tokens': prompt_tokens,
+                'cached_tokens': cached_tokens,
+                'completion_tokens': completion_tokens,
+                'output_tokens_per_second': completion_tokens / run_seconds if run_seconds > 0 else 0.0,
+                'estimated_cost_usd': estimate_cost(self.prices.get(model_id), prompt_tokens, cached_tokens,
+                                                    completion_tokens),
+            }
+        return summary
+
+    def finish(self) -> dict:
+        """Closes the event file, writes the Prometheus textfile and returns the summary of the run it ends."""
+        with self._lock:
+            writer, self._writer = self._writer, None
+            events, self.events = self.events, []
+        if writer is not None:
+            writer.close()
+        summary = self.summary(events)
+        if self.prometheus_path and summary:
+            write_prometheus_textfile(self.prometheus_path, summary, self.labels)
+        return summary
+
+
+def _format_labels(labels: dict) -> str:
+    def escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def write_prometheus_textfile(path: str, summary: dict, labels: dict | None = None):
+    """Atomically writes a run summary in the Prometheus text exposition format."""
+    metrics = {
+        'llm_calls_total': ('counter', "LLM calls by outcome."),
+        'llm_retries_total': ('counter', "Retries after rate limits."),
+        'llm_latency_seconds': ('summary', "Wall latency of LLM calls."),
+        'llm_queue_wait_seconds': ('summary', "Time spent waiting for the rate limiter."),
+        'llm_tokens_total': ('counter', "Tokens by kind (prompt, cached, completion)."),
+        'llm_output_tokens_per_second': ('gauge', "Output tokens per second of run time."),
+        'llm_estimated_cost_usd': ('gauge', "Estimated cost of the run."),
+    }
+    samples = {name: [] for name in metrics}
+    for model_id, stats in summary.items():
+        base = {**(labels or {}), 'model': model_id}
+        for outcome, count in stats['outcomes'].items():
+            samples['llm_calls_total'].append(({**base, 'outcome': outcome}, count))
+        samples['llm_retries_total'].append((base, stats['retries']))
+        for quantile in ('0.5', '0.95'):
+            suffix = 'p50' if quantile == '0.5' else 'p95'
+            samples['llm_latency_seconds'].append(({**base, 'quantile': quantile}, stats[f'latency_{suffix}_seconds']))
+            samples['llm_queue_wait_seconds'].append(
+                ({**base, 'quantile': quantile}, stats[f'queue_wait_{suffix}_seconds']))
+        for kind in ('prompt', 'cached', 'completion'):
+            samples['llm_tokens_total'].append(({**base, 'kind': kind}, stats[f'{kind}_tokens']))
+        samples['llm_output_tokens_per_second'].append((base, stats['output_tokens_per_second']))
+        if stats['estimated_cost_usd'] is not None:
+            samples['llm_estimated_cost_usd'].append((base, stats['estimated_cost_usd']))
+
+    lines = []
+    for name, (metric_type, help_text) in metrics.items():
+        if not samples[name]:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.extend(f"{name}{_format_labels(sample_labels)} {value}" for sample_labels, value in samples[name])
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
@@ -0,0 +1,104 @@
+import re
+import unicodedata
+
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n|\n')
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?;:])\s+')
+
+# Typographic punctuation that NFKC leaves alone but extractions use interchangeably
+_PUNCTUATION_FOLDS = str.maketrans({'‘': "'", '’': "'", '“': '"', '”': '"', '–': '-', '—': '-'})
+
+
+def canonicalize_text(text: str) -> str:
+    """
+    Folds a string for exact-duplicate matching: compatibility forms (NFKC),
+    diacritics (so "Sāvatthī" matches "Savatthi"), typographic quotes and
+    dashes, case, and runs of whitespace.
+    """
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    folded = unicodedata.normalize('NFKC', stripped).translate(_PUNCTUATION_FOLDS).casefold()
+    return " ".join(folded.split())
+
+
+def _split_oversized(paragraph: str, max_chars: int) -> list:
+    """Splits a paragraph longer than `max_chars` on sentence ends, cutting hard only as a last resort."""
+    pieces = []
+    current = ""
+    for sentence in _SENTENCE_BREAK.split(paragraph):
+        while len(sentence) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_into_chunks(text: str, max_chars: int, overlap_chars: int = 0) -> list:
+    """
+    Splits a long text into chunks of at most roughly `max_chars` characters,
+    breaking only on paragraph boundaries where possible.
+
+    Each chunk after the first starts with the trailing paragraphs of the
+    previous chunk, up to `overlap_chars` characters, so a concept mentioned
+    across a boundary is seen whole by at least one chunk.
+
+    Args:
+        text (str): The text to split.
+        max_chars (int): Target upper bound on the length of a chunk.
+        overlap_chars (int): How much trailing context to repeat in the next chunk.
+
+    Returns:
+        list: The chunks, in order. A text shorter than `max_chars` is returned as a single chunk.
+    """
+    if len(text) <= max_chars:
+        return [text]
+
+    paragraphs = []
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) > max_chars:
+            paragraphs.extend(_split_oversized(paragraph, max_chars))
+        else:
+            paragraphs.append(paragraph)
+
+    chunks = []
+    current = []
+    current_len = 0
+    new_in_current = False
+    for paragraph in paragraphs:
+        # +2 for the blank line that joins paragraphs
+        if new_in_current and current_len + 2 + len(paragraph) > max_chars:
+            chunks.append("\n\n".join(current))
+
+            # Carry over trailing paragraphs as overlap
+            overlap = []
+            overlap_len = 0
+            for previous in reversed(current):
+                if overlap_len + len(previous) + 2 > overlap_chars:
+                    break
+                overlap.insert(0, previous)
+                overlap_len += len(previous) + 2
+            # Never let the overlap leave no room for new text
+            while overlap and overlap_len + len(paragraph) > max_chars:
+                overlap_len -= len(overlap.pop(0)) + 2
+            current = overlap
+            current_len = max(0, overlap_len - 2)
+            new_in_current = False
+
+        current_len += len(paragraph) + (2 if current else 0)
+        current.append(paragraph)
+        new_in_current = True
+
+    if new_in_current:
+        chunks.append("\n\n".join(current))
+    return chunks
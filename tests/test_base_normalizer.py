@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+import torch
+
+from processing.concept_normalizer import ConceptNormalizer
+from utils.clustering import DenseClusteringBackend, KnnClusteringBackend
+
+
+def make_normalizer(min_community_size=2, threshold=0.9, clustering_backend=None):
+    # Skips __init__, which would load the embedding model
+    normalizer = ConceptNormalizer.__new__(ConceptNormalizer)
+    normalizer.min_community_size = min_community_size
+    normalizer.threshold = threshold
+    normalizer.clustering_backend = clustering_backend or DenseClusteringBackend()
+    return normalizer
+
+
+def test_duplicates_are_collapsed_with_their_occurrences():
+    normalizer = make_normalizer()
+    corpus, occurrences = normalizer._collapse_duplicates(["Sāvatthī", "Nibbāna", "savatthi ", "SĀVATTHĪ"])
+    assert corpus == ["Sāvatthī", "Nibbāna"]
+    assert occurrences == [[0, 2, 3], [1]]
+
+
+def test_clusters_expand_to_every_instance():
+    """Test that a collapsed text with enough occurrences forms a cluster listing each original item."""
+    normalizer = make_normalizer(min_community_size=2)
+    item_map = {i: {'concept_name': name} for i, name in enumerate(["Sāvatthī", "Nibbāna", "savatthi", "Jeta's Grove"])}
+    # Rows: Sāvatthī (x2), Nibbāna, Jeta's Grove; all orthogonal
+    embeddings = torch.eye(3)
+    clusters = normalizer._cluster_items(embeddings, item_map, occurrences=[[0, 2], [1], [3]])
+    assert clusters == [[item_map[0], item_map[2]]]
+
+    # Without collapsing, the same items need a community of their own embeddings
+    clusters = normalizer._cluster_items(torch.eye(4)[[0, 1, 0, 2]], item_map)
+    assert sorted(item['concept_name'] for item in clusters[0]) == ["Sāvatthī", "savatthi"]
+
+
+@pytest.mark.parametrize("clustering_backend", [DenseClusteringBackend(block_size=16), KnnClusteringBackend(k=200)])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_collapsed_clusters_match_uncollapsed_clusters(clustering_backend, seed):
+    """Test that clustering the distinct texts weighted by their occurrences finds the uncollapsed clusters."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(8, 16))
+    points = centres[rng.integers(0, len(centres), size=60)] + rng.normal(scale=0.35, size=(60, 16))
+    distinct = (points / np.linalg.norm(points, axis=1, keepdims=True)).astype(np.float32)
+    # 150 items over 60 distinct texts, some repeated many times
+    rows = np.concatenate([np.arange(60), rng.choice(60, size=90, p=rng.dirichlet(np.ones(60) * 0.3))])
+    rng.shuffle(rows)
+    item_map = {i: {'concept_name': f"text-{row}", 'item': i} for i, row in enumerate(rows)}
+    occurrences = [[] for _ in range(60)]
+    for i, row in enumerate(rows):
+        occurrences[row].append(i)
+
+    normalizer = make_normalizer(min_community_size=4, threshold=0.6, clustering_backend=clustering_backend)
+    uncollapsed = normalizer._cluster_items(torch.from_numpy(distinct[rows]), item_map)
+    collapsed = normalizer._cluster_items(torch.from_numpy(distinct), item_map, occurrences=occurrences)
+
+    def as_sets(clusters):
+        return sorted(sorted(item['item'] for item in cluster) for cluster in clusters)
+
+    assert len(uncollapsed) > 1
+    assert as_sets(collapsed) == as_sets(uncollapsed)
+    assert [len(cluster) for cluster in collapsed] == [len(cluster) for cluster in uncollapsed]
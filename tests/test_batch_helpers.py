@@ -0,0 +1,216 @@
+import json
+import threading
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, patch
+
+import jsonlines
+import pytest
+
+from processing.concept_extractor import ConceptExtractor
+from utils.batch_helpers import BATCH_COMPLETED, GeminiBatchBackend, OpenAIBatchBackend, get_batch_backend
+from utils.schemas import SuttaConceptsFixed
+
+GOOD_RESPONSE = {"concepts": [{"concept_name": "Nibbāna", "concept_type": "DoctrinalConcept", "evidence_quote": "..."}]}
+
+
+class FakeBatchServer:
+    """
+    A local stand-in for an OpenAI-compatible batch API (/v1/files, /v1/batches).
+
+    `responder(custom_id, request_body)` decides each result: return a dict to
+    send as the message content, a string for raw content, or an Exception for
+    a per-request error. Jobs report `in_progress` on the first poll.
+    """
+    def __init__(self, responder):
+        self.responder = responder
+        self.files = {}
+        self.batches = {}
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _run_batch(self, batch):
+        lines = []
+        for line in self.files[batch['input_file_id']]['content'].decode('utf-8').splitlines():
+            request = json.loads(line)
+            result = self.responder(request['custom_id'], request['body'])
+            if isinstance(result, Exception):
+                lines.append({"custom_id": request['custom_id'], "response": None, "error": {"message": str(result)}})
+                continue
+            content = json.dumps(result) if isinstance(result, dict) else result
+            body = {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]}
+            lines.append({"custom_id": request['custom_id'], "response": {"status_code": 200, "body": body}, "error": None})
+        output_id = f"file-out-{batch['id']}"
+        self.files[output_id] = {'content': "\n".join(json.dumps(l) for l in lines).encode('utf-8')}
+        batch.update(status="completed", output_file_id=output_id)
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, payload, raw=False):
+                data = payload if raw else json.dumps(payload).encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream" if raw else "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                if self.path == "/v1/files":
+                    message = BytesParser().parsebytes(
+                        f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body)
+                    content = next(p.get_payload(decode=True) for p in message.get_payload()
+                                   if p.get_param('name', header='content-disposition') == 'file')
+                    file_id = f"file-{len(fake.files) + 1}"
+                    fake.files[file_id] = {'content': content}
+                    self._send({"id": file_id, "object": "file", "bytes": len(content), "created_at": 0,
+                                "filename": "batch.jsonl", "purpose": "batch", "status": "processed"})
+                elif self.path == "/v1/batches":
+                    params = json.loads(body)
+                    batch_id = f"batch-{len(fake.batches) + 1}"
+                    fake.batches[batch_id] = {
+                        "id": batch_id, "object": "batch", "endpoint": params['endpoint'],
+                        "input_file_id": params['input_file_id'], "completion_window": params['completion_window'],
+                        "status": "validating", "created_at": 0, "polls": 0,
+                    }
+                    self._send(fake.batches[batch_id])
+
+            def do_GET(self):
+                parts = self.path.strip("/").split("/")
+                if parts[1] == "batches":
+                    batch = fake.batches[parts[2]]
+                    batch['polls'] += 1
+                    if batch['polls'] == 1:
+                        batch['status'] = "in_progress"
+                    elif batch['status'] != "completed":
+                        fake._run_batch(batch)
+                    self._send(batch)
+                elif parts[1] == "files" and parts[3] == "content":
+                    self._send(fake.files[parts[2]]['content'], raw=True)
+
+        return Handler
+
+
+def test_openai_batch_backend_round_trip(tmp_path):
+    """Test submitting, polling and fetching a batch against the fake server."""
+    def responder(custom_id, body):
+        assert body['messages'][0] == {"role": "system", "content": "PROMPT"}
+        assert body['temperature'] == 0.7
+        return {"echo": body['messages'][1]['content']}
+
+    with FakeBatchServer(responder) as server:
+        backend = OpenAIBatchBackend({'model_id': 'deepseek-chat', 'temperature': 0.7}, "PROMPT", base_url=server.base_url, api_key="test")
+        request_path = str(tmp_path / "batches" / "requests.jsonl")
+        assert backend.write_request_file(request_path, [("MN1", "first"), ("MN2", "second")]) == 2
+
+        job_id = backend.submit(request_path)
+        assert backend.wait(job_id, poll_interval_seconds=0) == BATCH_COMPLETED
+        results = backend.fetch_results(job_id)
+
+    assert json.loads(results["MN1"]['text']) == {"echo": "first"}
+    assert json.loads(results["MN2"]['text']) == {"echo": "second"}
+
+
+@patch('processing.base_processor.get_unprocessed_items')
+@patch('processing.base_processor.get_processed_ids')
+@patch('processing.concept_extractor.get_llm_client')
+def test_run_batch_ingests_results_with_schema_validation(mock_get_llm, mock_get_ids, mock_get_items, tmp_path, monkeypatch):
+    """Test the full batch mode: request file, submission, polling and validated ingest."""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test")
+    mock_get_ids.return_value = set()
+    mock_get_items.return_value = [
+        {'sutta_id': 'MN1', 'body': 'A good sutta.'},
+        {'sutta_id': 'MN2', 'body': 'A sutta the model garbles.'},
+        {'sutta_id': 'MN3', 'body': 'A sutta that errors.'},
+        {'sutta_id': 'MN4', 'body': ' '},
+    ]
+
+    def responder(custom_id, body):
+        return {"MN1": GOOD_RESPONSE, "MN2": '{"concepts": [{"concept_name": "X"}]}'}.get(
+            custom_id, RuntimeError("context length exceeded"))
+
+    with FakeBatchServer(responder) as server:
+        manager = MagicMock()
+        manager.config = {
+            'concept_extraction': {
+                'mode': 'discovery', 'model_id': 'deepseek-chat', 'temperature': 1,
+                'base_prompt_beginning': 'BEGIN\n', 'discovery_instructions': 'DISCOVERY\n', 'base_prompt_end': 'END',
+                'batch': {'base_url': server.base_url, 'poll_interval_seconds': 0},
+            },
+        }
+        manager.get_path.side_effect = lambda key, format_args=None: str(tmp_path / key)
+        extractor = ConceptExtractor(manager)
+        extractor.run_batch()
+
+    with jsonlines.open(extractor.output_path) as reader:
+        records = list(reader)
+    assert [r['sutta_id'] for r in records] == ['MN1']
+    assert records[0]['concepts'] == GOOD_RESPONSE['concepts']
+    assert records[0]['model_id'] == 'deepseek-chat' and records[0]['mode'] == 'discovery'
+
+    with jsonlines.open(extractor.log_path) as reader:
+        skipped = {r['item_id']: r['reason'] for r in reader}
+    assert set(skipped) == {'MN2', 'MN3', 'MN4'}
+    assert "Schema validation failed" in skipped['MN2']
+    assert "context length exceeded" in skipped['MN3']
+
+    # The job is finished, so no state is left behind to resume
+    assert not (tmp_path / "concept_extraction.batch.request_path_template.job.json").exists()
+
+
+@patch('utils.batch_helpers.genai.Client')
+def test_gemini_batch_backend_reports_blocked_and_empty_responses(mock_client_cls):
+    """Test that blocked or empty Gemini results become per-item errors instead of aborting the ingest."""
+    lines = [
+        {"key": "MN1", "response": {"candidates": [{"content": {"parts": [{"text": '{"concepts": []}'}]}}]}},
+        {"key": "MN2", "response": {"promptFeedback": {"blockReason": "SAFETY"}}},
+        {"key": "MN3", "response": {"candidates": [{"finishReason": "SAFETY"}]}},
+        {"key": "MN4", "error": {"code": 400}},
+    ]
+    mock_client_cls.return_value.files.download.return_value = "\n".join(json.dumps(l) for l in lines).encode('utf-8')
+    backend = GeminiBatchBackend({'model_id': 'gemini-2.5-flash'}, "PROMPT", api_key="test",
+                                 response_schema_class=SuttaConceptsFixed)
+
+    results = backend.fetch_results("batches/1")
+
+    assert results["MN1"] == {'text': '{"concepts": []}', 'error': None}
+    assert results["MN2"]['text'] is None and "SAFETY" in results["MN2"]['error']
+    assert results["MN3"]['text'] is None and "SAFETY" in results["MN3"]['error']
+    assert results["MN4"]['text'] is None
+
+    # Batch requests carry the same safety settings as interactive calls
+    request = backend._build_request("MN1", "text")['request']
+    assert {s['threshold'] for s in request['safety_settings']} == {"BLOCK_NONE"}
+    assert len(request['safety_settings']) == 4
+    # ...and the same response schema
+    schema = request['generation_config']['response_schema']
+    assert schema['required'] == ["concepts"]
+    assert "Person" in schema['properties']['concepts']['items']['properties']['concept_type']['enum']
+
+
+def test_get_batch_backend_requires_api_key(monkeypatch):
+    """Test that the factory fails fast without credentials."""
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    with pytest.raises(ValueError, match="GEMINI_API_KEY"):
+        get_batch_backend({'model_id': 'gemini-2.5-flash'}, "PROMPT")
+
+
+def test_get_batch_backend_requires_base_url_for_openai_compatible_models(monkeypatch):
+    """Test that non-Gemini models need an explicit batch endpoint instead of falling back to DeepSeek."""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test")
+    with pytest.raises(ValueError, match="concept_extraction.batch.base_url"):
+        get_batch_backend({'model_id': 'deepseek-chat', 'batch': {'base_url': None}}, "PROMPT")
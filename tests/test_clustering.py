@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from sentence_transformers import util
+
+from utils.clustering import (
+    DenseClusteringBackend, KnnClusteringBackend, get_clustering_backend, graph_components
+)
+
+
+def make_embeddings(count, dim=32, seed=0):
+    """Unit vectors around count/5 random centres."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(max(1, count // 5), dim))
+    points = centres[rng.integers(0, len(centres), size=count)] + rng.normal(scale=0.3, size=(count, dim))
+    return (points / np.linalg.norm(points, axis=1, keepdims=True)).astype(np.float32)
+
+
+def as_sets(communities):
+    return sorted(sorted(community) for community in communities)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize("min_community_size", [1, 2, 3])
+def test_knn_backend_matches_dense_backend(seed, min_community_size):
+    """Test that the k-NN backend with k >= n finds the same communities as community_detection."""
+    embeddings = make_embeddings(120, seed=seed)
+    dense = DenseClusteringBackend().find_communities(embeddings, 0.75, min_community_size)
+    knn = KnnClusteringBackend(k=120, block_size=16).find_communities(embeddings, 0.75, min_community_size)
+    assert as_sets(knn) == as_sets(dense)
+    assert [len(c) for c in knn] == [len(c) for c in dense]
+
+
+def test_knn_graph_is_bounded_by_k():
+    embeddings = make_embeddings(50)
+    neighbours, scores = KnnClusteringBackend(k=5, block_size=7).knn_graph(embeddings)
+    assert neighbours.shape == scores.shape == (50, 5)
+    # Every row is its own nearest neighbour, and neighbours are ordered by similarity
+    assert (neighbours[:, 0] == np.arange(50)).all()
+    assert (np.diff(scores, axis=1) <= 1e-6).all()
+    expected = util.cos_sim(embeddings, embeddings).numpy()
+    assert np.allclose(scores, np.take_along_axis(expected, neighbours, axis=1), atol=1e-5)
+
+
+def test_components_chain_transitively_similar_rows():
+    # 0-1 and 1-2 are similar, 0-2 are not; 3 is alone
+    neighbours = np.array([[0, 1], [1, 2], [2, 1], [3, 0]])
+    scores = np.array([[1.0, 0.8], [1.0, 0.8], [1.0, 0.8], [1.0, 0.1]])
+    assert graph_components(neighbours, scores, threshold=0.75, min_community_size=2) == [[0, 1, 2]]
+
+
+def test_get_clustering_backend():
+    assert isinstance(get_clustering_backend(None), DenseClusteringBackend)
+    backend = get_clustering_backend({'backend': 'knn', 'k': 10, 'algorithm': 'components'})
+    assert isinstance(backend, KnnClusteringBackend) and backend.k == 10
+    with pytest.raises(ValueError):
+        get_clustering_backend({'backend': 'spectral'})
@@ -46,7 +46,8 @@ def test_initialization_discovery_mode(mock_get_llm_client, mock_cfg_manager):
     mock_get_llm_client.assert_called_once_with(
         extraction_config=extractor.extraction_config,
         system_prompt=expected_prompt,
-        response_schema_class=SuttaConceptsDiscovery
+        response_schema_class=SuttaConceptsDiscovery,
+        telemetry=None
     )
 
 @patch('processing.concept_extractor.get_llm_client')
@@ -64,7 +65,8 @@ def test_initialization_fixed_mode(mock_get_llm_client, mock_cfg_manager):
     mock_get_llm_client.assert_called_once_with(
         extraction_config=extractor.extraction_config,
         system_prompt=expected_prompt,
-        response_schema_class=SuttaConceptsFixed
+        response_schema_class=SuttaConceptsFixed,
+        telemetry=None
     )
 
 def test_initialization_invalid_mode(mock_cfg_manager):
@@ -150,11 +152,11 @@ def test_process_item_raises_on_validation_error(mock_get_llm, mock_cfg_manager)
 
 # --- Test for Pipeline Orchestration (run_pipeline) ---
 
-@patch('processing.base_processor.jsonlines.open', new_callable=mock_open)
+@patch('processing.base_processor.JsonlResultWriter')
 @patch('processing.base_processor.get_unprocessed_items')
 @patch('processing.base_processor.get_processed_ids')
 @patch('processing.concept_extractor.get_llm_client')
-def test_run_pipeline_orchestration(mock_get_llm, mock_get_ids, mock_get_items, mock_json_open, mock_cfg_manager):
+def test_run_pipeline_orchestration(mock_get_llm, mock_get_ids, mock_get_items, mock_writer_class, mock_cfg_manager):
     """
     Test that run_pipeline correctly orchestrates loading, processing, and saving.
     We mock the sub-functions to ensure they are called correctly.
@@ -172,8 +174,7 @@ def test_run_pipeline_orchestration(mock_get_llm, mock_get_ids, mock_get_items,
     extractor = ConceptExtractor(mock_cfg_manager)
     
     # Run the pipeline
-    with patch('processing.base_processor.time.sleep'): # Patch sleep to speed up test
-      extractor.run_pipeline()
+    extractor.run_pipeline()
 
     # --- Assertions ---
     # 1. Assert data loading was called correctly
@@ -192,12 +193,295 @@ def test_run_pipeline_orchestration(mock_get_llm, mock_get_ids, mock_get_items,
     # 2. Assert the LLM was called with the item's body
     mock_llm_client.generate_content.assert_called_once_with('Process this one.')
 
-    # 3. Assert the output file was opened in append mode
-    mock_json_open.assert_called_with(extractor.output_path, mode='a')
+    # 3. Assert the processor's writer targets the output file and was opened for the run
+    mock_writer_class.from_config.assert_called_once_with(extractor.output_path, None)
+    mock_writer = mock_writer_class.from_config.return_value
+    mock_writer.__enter__.assert_called_once()
+    mock_writer.__exit__.assert_called_once()
     
     # 4. Assert that the result was written to the file
-    mock_writer = mock_json_open()
     mock_writer.write.assert_called_once()
     written_data = mock_writer.write.call_args[0][0]
     assert written_data['sutta_id'] == 2
-    assert written_data['concepts'][0]['concept_name'] == 'Item 2'
\ No newline at end of file
+    assert written_data['concepts'][0]['concept_name'] == 'Item 2'
+
+    # 5. Assert that the client released its per-run resources (e.g. a prompt cache)
+    mock_llm_client.close.assert_called_once()
+
+@patch('processing.base_processor.get_unprocessed_items')
+@patch('processing.base_processor.get_processed_ids')
+@patch('processing.concept_extractor.get_llm_client')
+def test_run_pipeline_dispatches_concurrently(mock_get_llm, mock_get_ids, mock_get_items, mock_cfg_manager, tmp_path):
+    """Test that items are processed in parallel up to `max_in_flight`, with results and skips recorded."""
+    import threading
+    import jsonlines
+
+    mock_cfg_manager.config['concept_extraction']['max_in_flight'] = 4
+    mock_get_ids.return_value = set()
+    mock_get_items.return_value = [{'sutta_id': f"S{i}", 'body': f"Body {i}"} for i in range(8)] + [{'sutta_id': 'EMPTY', 'body': ''}]
+
+    # Each call blocks until 4 calls are in flight at once, which only happens with 4 workers
+    barrier = threading.Barrier(4, timeout=5)
+    def slow_generate(body):
+        barrier.wait()
+        return '{"concepts": [{"concept_name": "X", "concept_type": "Place", "evidence_quote": "..."}]}'
+
+    mock_llm_client = MagicMock()
+    mock_llm_client.generate_content.side_effect = slow_generate
+    mock_get_llm.return_value = mock_llm_client
+
+    mock_cfg_manager.get_path.side_effect = lambda key, format_args=None: str(tmp_path / key)
+    extractor = ConceptExtractor(mock_cfg_manager)
+
+    extractor.run_pipeline()
+
+    assert extractor.max_in_flight == 4
+    with jsonlines.open(extractor.output_path) as reader:
+        assert sorted(r['sutta_id'] for r in reader) == [f"S{i}" for i in range(8)]
+    with jsonlines.open(extractor.log_path) as reader:
+        assert [r['item_id'] for r in reader] == ['EMPTY']
+
+@patch('processing.concept_extractor.get_llm_client')
+def test_response_cache_serves_repeated_suttas(mock_get_llm, mock_cfg_manager, tmp_path):
+    """Test that with the response cache enabled, an identical sutta is only sent to the LLM once."""
+    mock_cfg_manager.config['concept_extraction']['response_cache'] = {'enabled': True, 'max_size_mb': 1}
+    mock_cfg_manager.get_path.side_effect = lambda key, format_args=None: str(tmp_path / key)
+    mock_llm_client = MagicMock()
+    mock_llm_client.generate_content.return_value = '{"concepts": [{"concept_name": "Test", "concept_type": "Person", "evidence_quote": "A test."}]}'
+    mock_get_llm.return_value = mock_llm_client
+
+    extractor = ConceptExtractor(mock_cfg_manager)
+    first = extractor._process_item({'sutta_id': 'A', 'body': 'Same body.'})
+    second = extractor._process_item({'sutta_id': 'B', 'body': 'Same body.'})
+
+    mock_llm_client.generate_content.assert_called_once_with('Same body.')
+    assert first['concepts'] == second['concepts']
+    assert extractor.response_cache.stats()['hits'] == 1
+
+@patch('processing.concept_extractor.get_llm_client')
+def test_long_sutta_is_chunked_and_merged(mock_get_llm, mock_cfg_manager):
+    """Test that a long body is extracted in chunks and the concepts are merged without duplicates."""
+    import threading
+
+    mock_cfg_manager.config['concept_extraction']['chunking'] = {
+        'enabled': True, 'max_chars': 100, 'overlap_chars': 0, 'max_workers': 2
+    }
+    body = "\n\n".join(["Sāriputta went to Sāvatthī." + " x" * 30, "Then Sāriputta spoke of Nibbāna." + " y" * 30])
+
+    # Both chunk calls must be in flight at once
+    barrier = threading.Barrier(2, timeout=5)
+    def generate(chunk):
+        barrier.wait()
+        names = ["Sāriputta", "Sāvatthī"] if chunk.startswith("Sāriputta went") else ["sāriputta", "Nibbāna"]
+        return json.dumps({"concepts": [
+            {"concept_name": name, "concept_type": "Person" if name.casefold() == "sāriputta" else "Place", "evidence_quote": chunk[:20]}
+            for name in names
+        ]})
+
+    mock_llm_client = MagicMock()
+    mock_llm_client.generate_content.side_effect = generate
+    mock_get_llm.return_value = mock_llm_client
+
+    extractor = ConceptExtractor(mock_cfg_manager)
+    result = extractor._process_item({'sutta_id': 'DN1', 'body': body})
+
+    assert mock_llm_client.generate_content.call_count == 2
+    assert [c['concept_name'] for c in result['concepts']] == ["Sāriputta", "Sāvatthī", "Nibbāna"]
+    assert result['sutta_id'] == 'DN1'
+
+@patch('processing.concept_extractor.get_llm_client')
+def test_chunked_sutta_fails_if_any_chunk_is_invalid(mock_get_llm, mock_cfg_manager):
+    """Test that a bad response for one chunk skips the whole sutta with the chunk named."""
+    mock_cfg_manager.config['concept_extraction']['chunking'] = {'enabled': True, 'max_chars': 50, 'overlap_chars': 0}
+    mock_llm_client = MagicMock()
+    mock_llm_client.generate_content.side_effect = lambda chunk: '{"concepts": []}' if chunk.startswith("a") else '{"concepts": [{"concept_name": "X"}'
+    mock_get_llm.return_value = mock_llm_client
+
+    extractor = ConceptExtractor(mock_cfg_manager)
+    with pytest.raises(ValueError, match="Chunk 2/2: Schema validation failed"):
+        extractor._process_item({'sutta_id': 'DN2', 'body': "a" * 40 + "\n\n" + "b" * 40})
+
+@patch('processing.base_processor.get_unprocessed_items')
+@patch('processing.base_processor.get_processed_ids')
+@patch('processing.concept_extractor.get_llm_client')
+def test_short_suttas_are_packed_and_unpacked(mock_get_llm, mock_get_ids, mock_get_items, mock_cfg_manager, tmp_path):
+    """Test that short suttas share one request, and that a sutta missing from the response falls back to a single call."""
+    import jsonlines
+    from utils.schemas import PackedConceptsDiscovery
+
+    mock_cfg_manager.config['concept_extraction']['packing'] = {'enabled': True, 'max_tokens': 1000, 'max_suttas': 3, 'max_sutta_tokens': 100}
+    mock_cfg_manager.config['concept_extraction']['packing_instructions'] = '\nPACKED'
+    mock_cfg_manager.get_path.side_effect = lambda key, format_args=None: str(tmp_path / key)
+    mock_get_ids.return_value = set()
+    mock_get_items.return_value = (
+        [{'sutta_id': f"AN{i}", 'body': f"Short sutta {i}."} for i in range(5)]
+        + [{'sutta_id': 'DN1', 'body': "Long " * 200}]
+    )
+
+    def concepts(name):
+        return [{"concept_name": name, "concept_type": "Place", "evidence_quote": "..."}]
+
+    single_client = MagicMock()
+    single_client.generate_content.side_effect = lambda body: json.dumps({"concepts": concepts(body.split()[0])})
+    packed_client = MagicMock()
+    def packed_generate(text):
+        sutta_ids = [line.split()[2] for line in text.splitlines() if line.startswith("=== SUTTA")]
+        # The model drops AN1 from its answer
+        return json.dumps({"suttas": [{"sutta_id": s, "concepts": concepts(s)} for s in sutta_ids if s != "AN1"]})
+    packed_client.generate_content.side_effect = packed_generate
+    mock_get_llm.side_effect = [single_client, packed_client]
+
+    extractor = ConceptExtractor(mock_cfg_manager)
+    assert mock_get_llm.call_args.kwargs['response_schema_class'] is PackedConceptsDiscovery
+    assert extractor.packed_system_prompt == 'BEGIN\nDISCOVERY_INSTRUCTIONS\nEND\nPACKED'
+    extractor.run_pipeline()
+
+    # AN0-AN2 and AN3-AN4 are packed; DN1 is too long to pack; AN1 is retried on its own
+    assert packed_client.generate_content.call_count == 2
+    assert sorted(call.args[0].split()[0] for call in single_client.generate_content.call_args_list) == ['Long', 'Short']
+    with jsonlines.open(extractor.output_path) as reader:
+        records = {r['sutta_id']: r['concepts'][0]['concept_name'] for r in reader}
+    assert records == {'AN0': 'AN0', 'AN1': 'Short', 'AN2': 'AN2', 'AN3': 'AN3', 'AN4': 'AN4', 'DN1': 'Long'}
+
+@patch('processing.concept_extractor.get_llm_client')
+def test_replay_retries_retryable_failures_and_compacts_log(mock_get_llm, mock_cfg_manager, tmp_path):
+    """Test that replay retries only retryable items, backs off between attempts and rewrites the log."""
+    import jsonlines
+
+    mock_cfg_manager.config['concept_extraction']['max_in_flight'] = 2
+    mock_cfg_manager.config['concept_extraction']['replay'] = {
+        'max_attempts': 2, 'backoff_seconds': {'rate_limit': 0, 'validation': 0, 'other': 0}
+    }
+    mock_cfg_manager.get_path.side_effect = lambda key, format_args=None: str(tmp_path / key)
+
+    good = '{"concepts": [{"concept_name": "X", "concept_type": "Place", "evidence_quote": "..."}]}'
+    responses = {
+        'Flaky body': iter(['{"concepts": [', good]),  # Fails once more, then recovers
+        'Rate limited body': iter([good]),
+        'Broken body': iter(['nope', 'nope']),  # Fails both replay attempts
+    }
+    mock_llm_client = MagicMock()
+    mock_llm_client.generate_content.side_effect = lambda body: next(responses[body])
+    mock_get_llm.return_value = mock_llm_client
+
+    extractor = ConceptExtractor(mock_cfg_manager)
+    with jsonlines.open(extractor.source_path, mode='w') as writer:
+        writer.write_all([
+            {'sutta_id': 'A', 'body': 'Flaky body'},
+            {'sutta_id': 'B', 'body': 'Rate limited body'},
+            {'sutta_id': 'C', 'body': 'Broken body'},
+            {'sutta_id': 'D', 'body': ''},
+            {'sutta_id': 'E', 'body': 'Done since'},
+        ])
+    with jsonlines.open(extractor.output_path, mode='w') as writer:
+        writer.write({'sutta_id': 'E', 'model_id': 'gemini-1.5-flash', 'mode': 'discovery', 'concepts': []})
+    with jsonlines.open(extractor.log_path, mode='w') as writer:
+        writer.write_all([
+            {'item_id': 'A', 'reason': 'Schema validation failed: ...'},
+            {'item_id': 'B', 'reason': 'Gemini API resource exhausted or rate limit hit: 429'},
+            {'item_id': 'C', 'reason': 'Schema validation failed: ...'},
+            {'item_id': 'D', 'reason': 'Sutta body is empty.'},
+            {'item_id': 'E', 'reason': 'OpenAI/DeepSeek API rate limit was hit.'},
+            {'item_id': 'A', 'reason': 'Schema validation failed: ...'},
+        ])
+
+    extractor.replay_skipped()
+
+    with jsonlines.open(extractor.output_path) as reader:
+        assert sorted(r['sutta_id'] for r in reader) == ['A', 'B', 'E']
+    # The empty body is never sent; the broken one is tried max_attempts times
+    assert sorted(c.args[0] for c in mock_llm_client.generate_content.call_args_list) == [
+        'Broken body', 'Broken body', 'Flaky body', 'Flaky body', 'Rate limited body'
+    ]
+    with jsonlines.open(extractor.log_path) as reader:
+        log = {r['item_id']: r for r in reader}
+    assert set(log) == {'C', 'D'}
+    assert log['C']['attempts'] == 2 and log['C']['failure_class'] == 'validation'
+    assert log['D']['attempts'] == 0 and log['D']['failure_class'] == 'empty'
+
+    # A second replay leaves the exhausted and empty items alone
+    mock_llm_client.generate_content.reset_mock()
+    extractor.replay_skipped()
+    mock_llm_client.generate_content.assert_not_called()
+
+@patch('processing.concept_extractor.get_llm_client')
+def test_truncated_response_is_salvaged_as_partial_record(mock_get_llm, mock_cfg_manager):
+    """Test that the valid concepts of a truncated response are kept and the record is flagged as partial."""
+    mock_cfg_manager.config['concept_extraction']['salvage'] = {'enabled': True, 'min_validity_ratio': 0.6}
+    concept = '{"concept_name": "%s", "concept_type": "Place", "evidence_quote": "..."}'
+    truncated = '{"concepts": [' + ", ".join(concept % name for name in "ABCD") + ', {"concept_name": "E", "conc'
+    mock_llm_client = MagicMock()
+    mock_llm_client.generate_content.return_value = truncated
+    mock_get_llm.return_value = mock_llm_client
+
+    extractor = ConceptExtractor(mock_cfg_manager)
+    result = extractor._process_item({'sutta_id': 'AN1', 'body': 'A sutta.'})
+
+    mock_llm_client.generate_content.assert_called_once()
+    assert [c['concept_name'] for c in result['concepts']] == ["A", "B", "C", "D"]
+    assert result['partial'] is True
+    assert result['dropped_concepts'] == 1
+    assert extractor.salvage_stats['salvaged'] == 1
+
+@patch('processing.concept_extractor.get_llm_client')
+def test_mostly_invalid_response_is_requested_again(mock_get_llm, mock_cfg_manager):
+    """Test that a response below the validity ratio triggers a full re-request."""
+    mock_cfg_manager.config['concept_extraction']['salvage'] = {'enabled': True, 'min_validity_ratio': 0.8, 'max_rerequests': 1}
+    mostly_bad = '{"concepts": [{"concept_name": "A", "concept_type": "Place", "evidence_quote": "..."}, {"concept_name": "B"}]}'
+    good = '{"concepts": [{"concept_name": "A", "concept_type": "Place", "evidence_quote": "..."}]}'
+    mock_llm_client = MagicMock()
+    mock_llm_client.generate_content.side_effect = [mostly_bad, good]
+    mock_get_llm.return_value = mock_llm_client
+
+    extractor = ConceptExtractor(mock_cfg_manager)
+    result = extractor._process_item({'sutta_id': 'AN2', 'body': 'A sutta.'})
+
+    assert mock_llm_client.generate_content.call_count == 2
+    assert 'partial' not in result
+    assert extractor.salvage_stats['rerequests'] == 1
+
+    # When the re-request is just as bad, the sutta is skipped as before
+    mock_llm_client.generate_content.side_effect = [mostly_bad, mostly_bad]
+    with pytest.raises(ValueError, match="Schema validation failed: only 1 of 2 concepts valid"):
+        extractor._process_item({'sutta_id': 'AN3', 'body': 'Another sutta.'})
+
+@patch('processing.concept_extractor.get_llm_client')
+def test_streamed_response_is_parsed_incrementally(mock_get_llm, mock_cfg_manager):
+    """Test that a streamed response yields the same record as a blocking one and records time to first concept."""
+    mock_cfg_manager.config['concept_extraction']['streaming'] = {'enabled': True}
+    pieces = ['{"concepts": [{"concept_name": "A", "concept_type": "Place", ', '"evidence_quote": "..."}, ',
+              '{"concept_name": "B", "concept_type": "Person", "evidence_quote": "..."}]}']
+    mock_llm_client = MagicMock()
+    mock_llm_client.generate_content_stream.side_effect = lambda text_body: (piece for piece in pieces)
+    mock_get_llm.return_value = mock_llm_client
+
+    extractor = ConceptExtractor(mock_cfg_manager)
+    result = extractor._process_item({'sutta_id': 'AN1', 'body': 'A sutta.'})
+
+    mock_llm_client.generate_content.assert_not_called()
+    assert [c['concept_name'] for c in result['concepts']] == ["A", "B"]
+    stats = extractor.stream_stats.snapshot()
+    assert stats['streams'] == 1 and stats['aborted'] == 0
+
+@patch('processing.concept_extractor.get_llm_client')
+def test_malformed_stream_is_aborted(mock_get_llm, mock_cfg_manager):
+    """Test that a stream is closed as soon as its output is malformed, without reading the rest."""
+    mock_cfg_manager.config['concept_extraction']['streaming'] = {'enabled': True}
+    read = []
+
+    def stream(text_body):
+        valid = '{"concept_name": "A", "concept_type": "Place", "evidence_quote": "..."}'
+        for piece in ['{"concepts": [' + valid, ' Sorry, ', 'more text ' * 100]:
+            read.append(piece)
+            yield piece
+
+    mock_llm_client = MagicMock()
+    mock_llm_client.generate_content_stream.side_effect = stream
+    mock_get_llm.return_value = mock_llm_client
+
+    extractor = ConceptExtractor(mock_cfg_manager)
+    with pytest.raises(ValueError, match="Streamed response aborted"):
+        extractor._process_item({'sutta_id': 'AN1', 'body': 'A sutta.'})
+
+    assert len(read) == 2
+    assert extractor.stream_stats.snapshot()['aborted'] == 1
@@ -0,0 +1,42 @@
+import pytest
+
+from utils.concept_stream import ConceptStreamParser, MalformedStreamError, StreamStats
+
+
+def test_concepts_are_returned_as_soon_as_they_close():
+    """Test that each concept is parsed as soon as its object is complete, even when split across pieces."""
+    parser = ConceptStreamParser()
+    assert parser.feed('{"concepts": [{"concept_name": "A", "evidence_quote": "He said: \\"go}') == []
+    assert parser.feed('\\""}, {"concept_name"') == [{"concept_name": "A", "evidence_quote": 'He said: "go}"'}]
+    assert parser.feed(': "B"}') == [{"concept_name": "B"}]
+    assert not parser.complete
+    assert parser.feed(']}') == []
+    assert parser.complete
+
+
+def test_markdown_fence_is_tolerated():
+    parser = ConceptStreamParser()
+    assert parser.feed('```json\n{"concepts": [{"concept_name": "A"}]}\n```') == [{"concept_name": "A"}]
+    assert parser.complete
+
+
+@pytest.mark.parametrize("text", [
+    "Sorry, I cannot help with that.",
+    '{"concepts": [{"concept_name": "A"} oops',
+    '{"concepts": "none"',
+    '{"notes": "' + "x" * 300,
+])
+def test_malformed_output_is_rejected_early(text):
+    with pytest.raises(MalformedStreamError):
+        ConceptStreamParser().feed(text)
+
+
+def test_stream_stats_estimate_tokens_saved():
+    stats = StreamStats()
+    stats.record(0.5, 100, aborted=False)
+    stats.record(1.5, 300, aborted=False)
+    stats.record(None, 50, aborted=True)
+    snapshot = stats.snapshot()
+    assert snapshot['streams'] == 3 and snapshot['aborted'] == 1
+    assert snapshot['mean_time_to_first_concept_seconds'] == 1.0
+    assert snapshot['estimated_tokens_saved'] == 150
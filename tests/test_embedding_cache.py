@@ -0,0 +1,43 @@
+import numpy as np
+
+from utils.embedding_cache import EmbeddingCache
+
+
+def test_cached_vectors_survive_reopening(tmp_path):
+    """Test that vectors are stored once per text and found again by a new cache instance."""
+    cache = EmbeddingCache(str(tmp_path), "all-MiniLM-L12-v2")
+    vectors, missing = cache.lookup(["a", "b"])
+    assert vectors is None and missing == [0, 1]
+
+    cache.add(["a", "b", "a"], np.array([[1, 0], [0, 1], [1, 0]], dtype=np.float32))
+    assert len(cache) == 2
+
+    reopened = EmbeddingCache(str(tmp_path), "all-MiniLM-L12-v2")
+    vectors, missing = reopened.lookup(["b", "c", "a"])
+    assert missing == [1]
+    assert vectors[0].tolist() == [0, 1] and vectors[2].tolist() == [1, 0]
+
+    reopened.add(["c"], np.array([[0.5, 0.5]]))
+    vectors, missing = EmbeddingCache(str(tmp_path), "all-MiniLM-L12-v2").lookup(["c"])
+    assert missing == [] and vectors[0].tolist() == [0.5, 0.5]
+
+
+def test_caches_are_separate_per_model(tmp_path):
+    EmbeddingCache(str(tmp_path), "model-a").add(["a"], np.ones((1, 3)))
+    assert "a" not in EmbeddingCache(str(tmp_path), "model-b")
+
+
+def test_interrupted_append_is_ignored(tmp_path):
+    """Test that keys written without their vectors are dropped and the rows reused."""
+    cache = EmbeddingCache(str(tmp_path), "model")
+    cache.add(["a", "b"], np.array([[1, 1], [2, 2]], dtype=np.float32))
+    # Simulate a crash after the keys of "b" were written but its vector was cut off
+    with open(cache.vectors_path, 'r+b') as f:
+        f.truncate(8)
+
+    reopened = EmbeddingCache(str(tmp_path), "model")
+    assert "a" in reopened and "b" not in reopened
+    reopened.add(["c"], np.array([[3, 3]], dtype=np.float32))
+    vectors, missing = EmbeddingCache(str(tmp_path), "model").lookup(["a", "b", "c"])
+    assert missing == [1]
+    assert vectors[0].tolist() == [1, 1] and vectors[2].tolist() == [3, 3]
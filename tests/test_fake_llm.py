@@ -0,0 +1,92 @@
+import json
+import random
+
+import pytest
+
+from utils.fake_llm import ReplayLLMClient, make_malformed, sample_latency
+from utils.llm_helpers import RateLimitException, RateLimitedClient, get_llm_client
+from utils.rate_limiter import AdaptiveRateLimiter
+
+CONCEPT = {"concept_name": "Sāvatthī", "concept_type": "Place", "evidence_quote": "..."}
+
+
+@pytest.fixture
+def replay_config(tmp_path):
+    recordings = tmp_path / "raw_concepts_discovery_deepseek_chat.jsonl"
+    recordings.write_text("\n".join(json.dumps(record, ensure_ascii=False) for record in [
+        {"sutta_id": "AN1", "mode": "discovery", "concepts": [CONCEPT]},
+        {"sutta_id": "AN2", "mode": "discovery", "concepts": []},
+    ]) + "\n", encoding='utf-8')
+    source = tmp_path / "suttas.jsonl"
+    source.write_text(json.dumps({"sutta_id": "AN1", "body": "Thus have I heard."}) + "\n", encoding='utf-8')
+    return {
+        'model_id': 'replay/deepseek-chat',
+        'mode': 'discovery',
+        'output_path_template': str(tmp_path / "raw_concepts_{mode}_{model_id}.jsonl"),
+        'fake_llm': {'source_path': str(source), 'seed': 7},
+    }
+
+
+def test_get_llm_client_selects_the_replay_backend(replay_config):
+    client = get_llm_client(replay_config, "system prompt", None)
+    assert isinstance(client, RateLimitedClient)
+    assert isinstance(client.client, ReplayLLMClient)
+
+
+def test_replays_recorded_concepts(replay_config):
+    """Test that a sutta body gets its own recording and a packed request a keyed response."""
+    client = ReplayLLMClient(replay_config, "system prompt")
+    assert json.loads(client.generate_content("Thus have I heard.")) == {"concepts": [CONCEPT]}
+
+    packed = json.loads(client.generate_content("=== SUTTA AN2 ===\nA.\n\n=== SUTTA AN1 ===\nB."))
+    assert packed == {"suttas": [{"sutta_id": "AN2", "concepts": []}, {"sutta_id": "AN1", "concepts": [CONCEPT]}]}
+    assert "".join(client.generate_content_stream("Thus have I heard.")) == json.dumps({"concepts": [CONCEPT]},
+                                                                                        ensure_ascii=False)
+    assert client.usage.snapshot()['calls'] == 3
+
+
+def test_injected_failures_are_reproducible(replay_config):
+    """Test that 429s and malformed output are injected deterministically from the seed."""
+    replay_config['fake_llm'].update(rate_limit_rate=0.5, latency={'distribution': 'constant', 'seconds': 0.0})
+
+    def outcomes():
+        client = ReplayLLMClient(replay_config, "system prompt")
+        results = []
+        for _ in range(20):
+            try:
+                results.append(client.generate_content("Thus have I heard."))
+            except RateLimitException:
+                results.append(None)
+        return results
+
+    first = outcomes()
+    assert first == outcomes()
+    assert None in first and any(first)
+
+    replay_config['fake_llm'].update(rate_limit_rate=0.0, malformed_rate=1.0)
+    client = ReplayLLMClient(replay_config, "system prompt")
+    response = client.generate_content("Thus have I heard.")
+    assert response != json.dumps({"concepts": [CONCEPT]}, ensure_ascii=False)
+
+
+def test_malformed_kinds_and_latency_distributions():
+    response = json.dumps({"concepts": [dict(CONCEPT)]})
+    corrupted = {make_malformed(random.Random(seed), response) for seed in range(30)}
+    assert any(not text.startswith("{") for text in corrupted)
+    assert any('"concept_type"' not in text and text.endswith("}") for text in corrupted)
+
+    rng = random.Random(0)
+    assert sample_latency(rng, {'distribution': 'constant', 'seconds': 0.25}) == 0.25
+    assert 1.0 <= sample_latency(rng, {'distribution': 'uniform', 'min_seconds': 1.0, 'max_seconds': 2.0}) <= 2.0
+    assert sample_latency(rng, {'distribution': 'lognormal', 'median_seconds': 1.0}) > 0
+    with pytest.raises(ValueError):
+        sample_latency(rng, {'distribution': 'pareto'})
+
+
+def test_rate_limited_client_recovers_from_injected_429s(replay_config):
+    """Test that the retry loop gets every call through when 429s are injected offline."""
+    replay_config['fake_llm']['rate_limit_rate'] = 0.3
+    client = RateLimitedClient(ReplayLLMClient(replay_config, "system prompt"),
+                               AdaptiveRateLimiter(base_backoff_seconds=0.0), "system prompt", max_retries=20)
+    for index in range(10):
+        assert json.loads(client.generate_content(f"Text {index}"))['concepts'] is not None
@@ -0,0 +1,21 @@
+from utils.json_repair import repair_truncated_json
+
+
+def test_complete_json_is_returned_as_is():
+    assert repair_truncated_json('{"concepts": []}') == ({"concepts": []}, False)
+    assert repair_truncated_json('```json\n{"concepts": []}\n```') == ({"concepts": []}, False)
+
+
+def test_truncated_json_keeps_complete_elements():
+    """Test that a response cut off mid-concept keeps every concept before the break."""
+    text = ('{"concepts": [{"concept_name": "A", "evidence_quote": "He said: \\"go}\\""}, '
+            '{"concept_name": "B", "evidence_quote": "x"}, {"concept_name": "C", "evid')
+    data, truncated = repair_truncated_json(text)
+    assert truncated
+    assert [c["concept_name"] for c in data["concepts"]] == ["A", "B"]
+    assert data["concepts"][0]["evidence_quote"] == 'He said: "go}"'
+
+
+def test_unrecoverable_json():
+    assert repair_truncated_json('Sorry, I cannot help with that.') == (None, True)
+    assert repair_truncated_json('{"concepts": [') == (None, True)
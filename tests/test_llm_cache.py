@@ -0,0 +1,71 @@
+from unittest.mock import MagicMock
+
+from utils.llm_cache import CachedLLMClient, LLMResponseCache
+
+def make_client(cache, inner, **kwargs):
+    return CachedLLMClient(inner, cache, provider='deepseek', model_id='deepseek-chat',
+                           system_prompt='PROMPT', temperature=1, **kwargs)
+
+def test_cache_hit_bypasses_wrapped_client(tmp_path):
+    """Test that a repeated call is served from the cache and counted as a hit."""
+    cache = LLMResponseCache(str(tmp_path / "cache.sqlite"))
+    inner = MagicMock()
+    inner.generate_content.return_value = '{"concepts": []}'
+    client = make_client(cache, inner)
+
+    assert client.generate_content("body") == '{"concepts": []}'
+    assert client.generate_content("body") == '{"concepts": []}'
+
+    inner.generate_content.assert_called_once_with("body")
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+
+def test_cache_persists_across_instances(tmp_path):
+    """Test that responses survive a restart."""
+    path = str(tmp_path / "cache.sqlite")
+    key = LLMResponseCache.make_key('gemini', 'gemini-2.5-flash', 'PROMPT', 1, 'body')
+    first = LLMResponseCache(path)
+    first.put(key, 'response')
+    first.close()
+
+    assert LLMResponseCache(path).get(key) == 'response'
+
+def test_key_depends_on_every_request_parameter():
+    """Test that changing the prompt, temperature, model or body gives a different key."""
+    base = ('deepseek', 'deepseek-chat', 'PROMPT', 1, 'body')
+    variants = [
+        ('gemini', 'deepseek-chat', 'PROMPT', 1, 'body'),
+        ('deepseek', 'deepseek-reasoner', 'PROMPT', 1, 'body'),
+        ('deepseek', 'deepseek-chat', 'PROMPT v2', 1, 'body'),
+        ('deepseek', 'deepseek-chat', 'PROMPT', 0.5, 'body'),
+        ('deepseek', 'deepseek-chat', 'PROMPT', 1, 'other body'),
+    ]
+    keys = {LLMResponseCache.make_key(*v) for v in variants}
+    assert LLMResponseCache.make_key(*base) not in keys
+    assert len(keys) == len(variants)
+
+def test_invalid_responses_are_not_cached(tmp_path):
+    """Test that responses rejected by `is_cacheable` are fetched again next time."""
+    cache = LLMResponseCache(str(tmp_path / "cache.sqlite"))
+    inner = MagicMock()
+    inner.generate_content.return_value = 'not json'
+    client = make_client(cache, inner, is_cacheable=lambda text: text.startswith('{'))
+
+    client.generate_content("body")
+    client.generate_content("body")
+
+    assert inner.generate_content.call_count == 2
+    assert cache.stats()['entries'] == 0
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    """Test that the cache stays within its size bound by evicting the oldest entries."""
+    cache = LLMResponseCache(str(tmp_path / "cache.sqlite"), max_size_mb=2.5 / 1024)  # 2.5 KB
+    cache.put('a', 'x' * 1024)
+    cache.put('b', 'x' * 1024)
+    cache.get('a')  # 'a' is now more recently used than 'b'
+    cache.put('c', 'x' * 1024)
+
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.get('c') is not None
+    assert cache.stats()['evictions'] == 1
@@ -6,7 +6,7 @@ from unittest.mock import patch, MagicMock
 from pydantic import BaseModel
 
 # Import the actual classes and functions to be tested
-from utils.llm_helpers import get_llm_client, GeminiClient, OpenAIClient
+from utils.llm_helpers import get_llm_client, GeminiClient, OpenAIClient, RateLimitedClient
 
 # --- Fixtures for Configuration ---
 @pytest.fixture
@@ -105,4 +105,149 @@ def test_openai_client_initialization_and_generate(mock_openai_class, mock_deeps
     # Assertions
     mock_openai_class.assert_called_once_with(api_key='test-key', base_url="https://api.deepseek.com")
     mock_client_instance.chat.completions.create.assert_called_once()
-    assert result == '{"result": "openai_success"}'
\ No newline at end of file
+    assert result == '{"result": "openai_success"}'
+@patch('utils.llm_helpers.os.getenv', return_value='fake-deepseek-key')
+@patch('utils.llm_helpers.OpenAIClient')
+def test_get_llm_client_wraps_client_in_rate_limiter(mock_openai_client_class, mock_getenv):
+    """Test that the factory puts the provider client behind its configured rate limiter."""
+    config = {'model_id': 'deepseek-chat', 'rate_limits': {'deepseek': {'requests_per_minute': 120}}}
+    client = get_llm_client(config, "system prompt", DummySchema)
+
+    assert isinstance(client, RateLimitedClient)
+    assert client.client is mock_openai_client_class.return_value
+    assert client.rate_limiter.requests_per_minute == 120
+
+@patch.dict(os.environ, {"GEMINI_API_KEY": "test-key"})
+@patch('utils.llm_helpers.genai.Client')
+def test_gemini_client_uses_prompt_cache_and_records_usage(mock_genai_client, mock_gemini_config):
+    """Test that the system prompt is sent once as cached content and cache hits are counted."""
+    mock_client_instance = mock_genai_client.return_value
+    mock_client_instance.caches.create.return_value.name = "cachedContents/abc"
+    mock_response = MagicMock()
+    mock_response.text = '{"result": "success"}'
+    mock_response.usage_metadata.prompt_token_count = 1000
+    mock_response.usage_metadata.cached_content_token_count = 900
+    mock_response.usage_metadata.candidates_token_count = 50
+    mock_client_instance.models.generate_content.return_value = mock_response
+
+    config = dict(mock_gemini_config, prompt_cache={'enabled': True, 'ttl_seconds': 600})
+    gemini_client = GeminiClient(config, DummySchema, "system_prompt")
+    gemini_client.generate_content("sutta body")
+
+    cache_config = mock_client_instance.caches.create.call_args.kwargs['config']
+    assert cache_config.system_instruction == "system_prompt"
+    assert cache_config.ttl == "600s"
+    sent_config = mock_client_instance.models.generate_content.call_args.kwargs['config']
+    assert sent_config.cached_content == "cachedContents/abc"
+    assert sent_config.system_instruction is None
+
+    stats = gemini_client.usage.snapshot()
+    assert stats['calls'] == 1
+    assert stats['cached_tokens'] == 900
+    assert stats['cache_hit_rate'] == 0.9
+
+@patch.dict(os.environ, {"GEMINI_API_KEY": "test-key"})
+@patch('utils.llm_helpers.genai.Client')
+def test_gemini_client_falls_back_to_inline_prompt(mock_genai_client, mock_gemini_config):
+    """Test that a lost cache handle is dropped and the call retried with the prompt inline."""
+    mock_client_instance = mock_genai_client.return_value
+    mock_client_instance.caches.create.return_value.name = "cachedContents/abc"
+    mock_response = MagicMock()
+    mock_response.text = '{"result": "success"}'
+    mock_client_instance.models.generate_content.side_effect = [Exception("404 NOT_FOUND: CachedContent not found"), mock_response]
+
+    config = dict(mock_gemini_config, prompt_cache={'enabled': True})
+    gemini_client = GeminiClient(config, DummySchema, "system_prompt")
+
+    assert gemini_client.generate_content("sutta body") == '{"result": "success"}'
+    retry_config = mock_client_instance.models.generate_content.call_args.kwargs['config']
+    assert retry_config.cached_content is None
+    assert retry_config.system_instruction == "system_prompt"
+
+@patch.dict(os.environ, {"GEMINI_API_KEY": "test-key"})
+@patch('utils.llm_helpers.genai.Client')
+def test_gemini_client_keeps_prompt_cache_on_unrelated_errors(mock_genai_client, mock_gemini_config):
+    """Test that a transient error is re-raised without dropping the prompt cache or retrying inline."""
+    mock_client_instance = mock_genai_client.return_value
+    mock_client_instance.caches.create.return_value.name = "cachedContents/abc"
+    mock_client_instance.models.generate_content.side_effect = Exception("503 UNAVAILABLE: The model is overloaded.")
+
+    config = dict(mock_gemini_config, prompt_cache={'enabled': True})
+    gemini_client = GeminiClient(config, DummySchema, "system_prompt")
+
+    with pytest.raises(Exception, match="503 UNAVAILABLE"):
+        gemini_client.generate_content("sutta body")
+    mock_client_instance.models.generate_content_stream.side_effect = Exception("503 UNAVAILABLE")
+    with pytest.raises(Exception, match="503 UNAVAILABLE"):
+        list(gemini_client.generate_content_stream("sutta body"))
+
+    assert mock_client_instance.models.generate_content.call_count == 1
+    assert gemini_client.cached_content == "cachedContents/abc"
+    assert gemini_client.model_config.cached_content == "cachedContents/abc"
+
+@patch.dict(os.environ, {"GEMINI_API_KEY": "test-key"})
+@patch('utils.llm_helpers.genai.Client')
+def test_gemini_client_close_deletes_the_prompt_cache(mock_genai_client, mock_gemini_config):
+    """Test that the cache is created on the first call, deleted on close, and created again by a later run."""
+    mock_client_instance = mock_genai_client.return_value
+    mock_client_instance.caches.create.return_value.name = "cachedContents/abc"
+    mock_client_instance.models.generate_content.return_value.text = "{}"
+
+    config = dict(mock_gemini_config, prompt_cache={'enabled': True})
+    gemini_client = GeminiClient(config, DummySchema, "system_prompt")
+    mock_client_instance.caches.create.assert_not_called()
+
+    gemini_client.generate_content("sutta body")
+    gemini_client.close()
+    mock_client_instance.caches.delete.assert_called_once_with(name="cachedContents/abc")
+    assert gemini_client.model_config.cached_content is None
+
+    gemini_client.close()
+    assert mock_client_instance.caches.delete.call_count == 1
+
+    gemini_client.generate_content("sutta body")
+    assert mock_client_instance.caches.create.call_count == 2
+    assert mock_client_instance.models.generate_content.call_args.kwargs['config'].cached_content == "cachedContents/abc"
+
+@patch.dict(os.environ, {"DEEPSEEK_API_KEY": "test-key"})
+@patch('utils.llm_helpers.OpenAI')
+def test_openai_client_records_prefix_cache_hits(mock_openai_class, mock_deepseek_config):
+    """Test that DeepSeek's prefix-cache hit tokens are counted, with the system prompt as the first message."""
+    mock_response = MagicMock()
+    mock_response.choices[0].message.content = '{}'
+    mock_response.usage.prompt_tokens = 800
+    mock_response.usage.prompt_cache_hit_tokens = 768
+    mock_response.usage.completion_tokens = 20
+    mock_openai_class.return_value.chat.completions.create.return_value = mock_response
+
+    openai_client = OpenAIClient(mock_deepseek_config, "system_prompt_for_openai")
+    openai_client.generate_content("first")
+
+    messages = mock_openai_class.return_value.chat.completions.create.call_args.kwargs['messages']
+    assert messages[0] == {"role": "system", "content": "system_prompt_for_openai"}
+    assert openai_client.usage.snapshot()['cached_tokens'] == 768
+
+def test_rate_limited_client_retries_stream_only_before_first_piece():
+    """Test that a streamed call is retried after a 429 only while nothing has been yielded yet."""
+    from utils.llm_helpers import RateLimitException
+    from utils.rate_limiter import AdaptiveRateLimiter
+    attempts = []
+
+    def stream(text_body):
+        attempts.append(text_body)
+        if len(attempts) == 1:
+            raise RateLimitException("429")
+        yield '{"concepts": '
+        if len(attempts) == 3:
+            raise RateLimitException("429")
+        yield '[]}'
+
+    inner = MagicMock()
+    inner.generate_content_stream.side_effect = stream
+    client = RateLimitedClient(inner, AdaptiveRateLimiter(), "system prompt", max_retries=3)
+
+    assert "".join(client.generate_content_stream("body")) == '{"concepts": []}'
+    assert len(attempts) == 2
+    with pytest.raises(RateLimitException):
+        list(client.generate_content_stream("body"))
+    assert len(attempts) == 3
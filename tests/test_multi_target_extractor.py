@@ -0,0 +1,104 @@
+import json
+from unittest.mock import MagicMock, patch
+
+import jsonlines
+import pytest
+
+from processing.multi_target_extractor import MultiTargetExtractor
+
+TARGETS = [
+    {'model_id': 'deepseek-chat', 'mode': 'discovery'},
+    {'model_id': 'gemini-2.5-flash', 'mode': 'fixed'},
+]
+
+
+@pytest.fixture
+def cfg_manager(tmp_path):
+    manager = MagicMock()
+    manager.config = {
+        'concept_extraction': {
+            'mode': 'discovery',
+            'model_id': 'deepseek-chat',
+            'base_prompt_beginning': 'BEGIN\n',
+            'discovery_instructions': 'DISCOVERY\n',
+            'fixed_instructions': 'FIXED\n',
+            'base_prompt_end': 'END',
+            'temperature': 1.0,
+            'targets': TARGETS,
+        },
+    }
+    manager.get_path.side_effect = lambda key, format_args=None: str(
+        tmp_path / (f"{key}_{format_args['model_id']}_{format_args['mode']}" if format_args else key)
+    )
+    source_path = tmp_path / 'output_paths.raw_data'
+    with jsonlines.open(source_path, mode='w') as writer:
+        writer.write_all([{'sutta_id': f"SN{i}", 'body': f"Body {i}"} for i in range(4)])
+    return manager
+
+
+def make_client(model_id, concept_type, calls):
+    def generate(body):
+        calls.append((model_id, body))
+        return json.dumps({"concepts": [{"concept_name": body, "concept_type": concept_type, "evidence_quote": "..."}]})
+    client = MagicMock()
+    client.generate_content.side_effect = generate
+    return client
+
+
+@patch('processing.concept_extractor.get_llm_client')
+def test_each_sutta_goes_to_every_target(mock_get_llm, cfg_manager):
+    """Test that work alternates between targets and each target resumes and writes on its own."""
+    calls = []
+    clients = {
+        'deepseek-chat': make_client('deepseek-chat', 'Place', calls),
+        'gemini-2.5-flash': make_client('gemini-2.5-flash', 'Person', calls),
+    }
+    mock_get_llm.side_effect = lambda extraction_config, **kwargs: clients[extraction_config['model_id']]
+
+    runner = MultiTargetExtractor(cfg_manager)
+    deepseek, gemini = runner.extractors
+    assert gemini.system_prompt == 'BEGIN\nFIXED\nEND'
+
+    # The deepseek target already finished SN0 in an earlier run
+    with jsonlines.open(deepseek.output_path, mode='w') as writer:
+        writer.write({'sutta_id': 'SN0', 'model_id': 'deepseek-chat', 'mode': 'discovery', 'concepts': []})
+
+    # One call at a time makes the dispatch order observable
+    runner.max_in_flight = 1
+    runner.run_pipeline()
+
+    assert calls == [
+        ('deepseek-chat', 'Body 1'), ('gemini-2.5-flash', 'Body 0'),
+        ('deepseek-chat', 'Body 2'), ('gemini-2.5-flash', 'Body 1'),
+        ('deepseek-chat', 'Body 3'), ('gemini-2.5-flash', 'Body 2'),
+        ('gemini-2.5-flash', 'Body 3'),
+    ]
+    with jsonlines.open(deepseek.output_path) as reader:
+        assert [r['sutta_id'] for r in reader] == ['SN0', 'SN1', 'SN2', 'SN3']
+    with jsonlines.open(gemini.output_path) as reader:
+        records = list(reader)
+    assert [r['sutta_id'] for r in records] == ['SN0', 'SN1', 'SN2', 'SN3']
+    assert {(r['model_id'], r['mode']) for r in records} == {('gemini-2.5-flash', 'fixed')}
+    assert {r['concepts'][0]['concept_type'] for r in records} == {'Person'}
+
+
+@patch('processing.concept_extractor.get_llm_client')
+def test_duplicate_targets_are_rejected(mock_get_llm, cfg_manager):
+    """Test that two targets sharing an output file are refused."""
+    with pytest.raises(ValueError, match="distinct"):
+        MultiTargetExtractor(cfg_manager, [TARGETS[0], dict(TARGETS[0])])
+
+
+@patch('processing.concept_extractor.get_llm_client')
+def test_run_reports_each_target_and_the_shared_cache_once(mock_get_llm, cfg_manager, capsys):
+    """Test that every target prints its full run stats while the shared cache stats appear once."""
+    cfg_manager.config['concept_extraction']['salvage'] = {'enabled': True}
+    calls = []
+    mock_get_llm.side_effect = lambda extraction_config, **kwargs: make_client(extraction_config['model_id'], 'Place', calls)
+
+    runner = MultiTargetExtractor(cfg_manager)
+    with patch('processing.concept_extractor.ConceptExtractor._report_cache_stats') as mock_cache_stats:
+        runner.run_pipeline()
+
+    assert capsys.readouterr().out.count("Salvaged responses:") == 2
+    mock_cache_stats.assert_called_once()
@@ -0,0 +1,81 @@
+import pytest
+from unittest.mock import MagicMock, patch
+
+from utils.rate_limiter import AdaptiveRateLimiter, get_rate_limiter
+from utils.llm_helpers import RateLimitedClient, RateLimitException
+
+class FakeClock:
+    """Stands in for the `time` module so waits are instant and measurable."""
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+@pytest.fixture
+def clock():
+    fake = FakeClock()
+    with patch('utils.rate_limiter.time', fake):
+        yield fake
+
+def test_acquire_allows_burst_then_paces_requests(clock):
+    """Test that requests beyond the burst are spaced at the configured rate."""
+    limiter = AdaptiveRateLimiter(requests_per_minute=60, burst_seconds=2)
+
+    waits = [limiter.acquire() for _ in range(4)]
+
+    assert waits[:2] == [0, 0]  # The 2-second burst
+    assert waits[2] == pytest.approx(1.0)
+    assert waits[3] == pytest.approx(1.0)
+
+def test_acquire_respects_token_quota(clock):
+    """Test that large requests wait for the token bucket to refill."""
+    limiter = AdaptiveRateLimiter(tokens_per_minute=600, burst_seconds=1)  # 10 tokens/s, 10-token bucket
+
+    assert limiter.acquire(tokens=10) == 0
+    assert limiter.acquire(tokens=5) == pytest.approx(0.5)
+
+def test_rate_limit_backs_off_and_ramps_back_up(clock):
+    """Test AIMD: a 429 halves the rate and pauses callers; successes restore it gradually."""
+    limiter = AdaptiveRateLimiter(requests_per_minute=600, increase_step=0.25, base_backoff_seconds=3)
+
+    limiter.on_rate_limited()
+    # A concurrent 429 within the same cooldown is not counted twice
+    limiter.on_rate_limited()
+    assert limiter.scale == 0.5
+    assert limiter.acquire() == pytest.approx(3.0)
+
+    limiter.on_success()
+    limiter.on_success()
+    limiter.on_success()
+    assert limiter.scale == 1.0
+
+def test_get_rate_limiter_is_shared_per_model():
+    """Test that clients for the same model share one limiter."""
+    first = get_rate_limiter('test-provider', 'model-a', {'requests_per_minute': 10})
+    assert get_rate_limiter('test-provider', 'model-a') is first
+    assert get_rate_limiter('test-provider', 'model-b') is not first
+
+def test_rate_limited_client_retries_after_429(clock):
+    """Test that a 429 is retried through the limiter instead of failing the item."""
+    inner = MagicMock()
+    inner.generate_content.side_effect = [RateLimitException("429"), '{"concepts": []}']
+    limiter = AdaptiveRateLimiter(requests_per_minute=600)
+    client = RateLimitedClient(inner, limiter, "system prompt", max_retries=2)
+
+    assert client.generate_content("body") == '{"concepts": []}'
+    assert inner.generate_content.call_count == 2
+    assert limiter.scale < 1.0
+
+def test_rate_limited_client_gives_up_after_max_retries(clock):
+    """Test that the exception surfaces once every retry has been rate limited."""
+    inner = MagicMock()
+    inner.generate_content.side_effect = RateLimitException("429")
+    client = RateLimitedClient(inner, AdaptiveRateLimiter(), "system prompt", max_retries=2)
+
+    with pytest.raises(RateLimitException):
+        client.generate_content("body")
+    assert inner.generate_content.call_count == 3
@@ -0,0 +1,73 @@
+import json
+import threading
+
+import pytest
+
+from utils.data_helpers import get_processed_ids
+from utils.result_writer import JsonlResultWriter, repair_trailing_partial_line
+
+def read_lines(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+def test_writer_batches_until_size_policy(tmp_path):
+    """Test that records stay buffered until `batch_size` is reached, then land as whole lines."""
+    path = tmp_path / "out.jsonl"
+    writer = JsonlResultWriter(str(path), batch_size=3, flush_interval_seconds=0, fsync='none')
+    with writer:
+        writer.write({'sutta_id': 'A'})
+        writer.write({'sutta_id': 'B'})
+        assert path.read_text() == ""
+        writer.write({'sutta_id': 'C', 'text': 'Sāvatthī'})
+        assert [r['sutta_id'] for r in read_lines(path)] == ['A', 'B', 'C']
+        writer.write({'sutta_id': 'D'})
+    # Closing flushes the remainder
+    assert [r['sutta_id'] for r in read_lines(path)] == ['A', 'B', 'C', 'D']
+    assert 'Sāvatthī' in path.read_text(encoding='utf-8')
+
+def test_writer_flushes_on_time_policy(tmp_path):
+    """Test that the background flusher writes buffered records once the interval passes."""
+    path = tmp_path / "out.jsonl"
+    with JsonlResultWriter(str(path), batch_size=100, flush_interval_seconds=0.05) as writer:
+        writer.write({'sutta_id': 'A'})
+        for _ in range(100):
+            if path.read_text():
+                break
+            threading.Event().wait(0.01)
+        assert read_lines(path) == [{'sutta_id': 'A'}]
+
+def test_writer_is_safe_with_concurrent_writers(tmp_path):
+    """Test that records written from many threads never interleave."""
+    path = tmp_path / "out.jsonl"
+    with JsonlResultWriter(str(path), batch_size=7, fsync='none') as writer:
+        threads = [
+            threading.Thread(target=lambda t=t: [writer.write({'sutta_id': f"{t}-{i}", 'pad': 'x' * 500}) for i in range(50)])
+            for t in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert len(read_lines(path)) == 400
+
+def test_opening_repairs_half_written_record(tmp_path):
+    """Test that a crash-truncated last line is removed before appending, so readers never trip on it."""
+    path = tmp_path / "out.jsonl"
+    path.write_text('{"sutta_id": "A", "model_id": "m", "mode": "x"}\n{"sutta_id": "B", "mod')
+
+    with JsonlResultWriter(str(path)) as writer:
+        writer.write({'sutta_id': 'C', 'model_id': 'm', 'mode': 'x'})
+
+    assert get_processed_ids(str(path), 'sutta_id', model_id='m', mode='x') == {'A', 'C'}
+
+def test_repair_is_a_no_op_on_complete_files(tmp_path):
+    """Test that files ending in a newline are left untouched."""
+    path = tmp_path / "out.jsonl"
+    path.write_text('{"a": 1}\n')
+    assert repair_trailing_partial_line(str(path)) == 0
+    assert path.read_text() == '{"a": 1}\n'
+
+def test_invalid_fsync_mode_is_rejected(tmp_path):
+    """Test that a misconfigured fsync mode fails fast."""
+    with pytest.raises(ValueError, match="Invalid fsync mode"):
+        JsonlResultWriter(str(tmp_path / "out.jsonl"), fsync='sometimes')
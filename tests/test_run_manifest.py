@@ -0,0 +1,66 @@
+import json
+import os
+from unittest.mock import patch
+
+import jsonlines
+
+from utils.data_helpers import get_processed_ids
+from utils.result_writer import JsonlResultWriter
+from utils.run_manifest import RunManifest
+
+
+def make_record(sutta_id, model_id='m1'):
+    return {'sutta_id': sutta_id, 'model_id': model_id, 'mode': 'discovery', 'concepts': [{'concept_name': 'x' * 50}]}
+
+
+def test_writer_keeps_manifest_current(tmp_path):
+    """Test that records written by the writer are indexed, so startup never parses the output."""
+    output = str(tmp_path / "out.jsonl")
+    with JsonlResultWriter(output, batch_size=2) as writer:
+        for i, model_id in enumerate(['m1', 'm2', 'm1']):
+            writer.write(make_record(f"S{i}", model_id))
+
+    with open(f"{output}.manifest", encoding='utf-8') as f:
+        lines = [json.loads(line) for line in f]
+    assert lines[0]['version'] == 1
+    keys, end_offset = lines[-1]
+    assert keys == {'sutta_id': 'S2', 'model_id': 'm1', 'mode': 'discovery'}
+    assert end_offset == os.path.getsize(output)
+
+    with patch.object(RunManifest, '_scan_output', side_effect=AssertionError("output was parsed")):
+        assert get_processed_ids(output, 'sutta_id', model_id='m1', mode='discovery') == {'S0', 'S2'}
+
+
+def test_manifest_indexes_only_the_new_tail(tmp_path):
+    """Test that records appended behind the manifest's back are picked up incrementally."""
+    output = str(tmp_path / "out.jsonl")
+    with jsonlines.open(output, mode='w') as writer:
+        writer.write(make_record('S0'))
+    assert get_processed_ids(output, 'sutta_id', model_id='m1') == {'S0'}
+    covered = os.path.getsize(output)
+
+    with jsonlines.open(output, mode='a') as writer:
+        writer.write(make_record('S1'))
+
+    with patch.object(RunManifest, '_scan_output', wraps=RunManifest(output)._scan_output) as scan:
+        assert get_processed_ids(output, 'sutta_id', model_id='m1') == {'S0', 'S1'}
+    scan.assert_called_once_with(covered)
+
+
+def test_manifest_rebuilds_when_stale_or_damaged(tmp_path):
+    """Test that a replaced output file or a torn manifest line triggers a rebuild or repair."""
+    output = str(tmp_path / "out.jsonl")
+    with jsonlines.open(output, mode='w') as writer:
+        writer.write_all([make_record('S0'), make_record('S1')])
+    assert get_processed_ids(output, 'sutta_id', model_id='m1') == {'S0', 'S1'}
+
+    # A half-written manifest line is cut off and re-indexed
+    with open(f"{output}.manifest", 'a', encoding='utf-8') as f:
+        f.write('[{"sutta_id": "S9"')
+    assert get_processed_ids(output, 'sutta_id', model_id='m1') == {'S0', 'S1'}
+
+    # A new file in place of the old one (e.g. deleted and re-run) is not mistaken for a grown one
+    os.remove(output)
+    with jsonlines.open(output, mode='w') as writer:
+        writer.write_all([make_record('S5'), make_record('S6'), make_record('S7')])
+    assert get_processed_ids(output, 'sutta_id', model_id='m1') == {'S5', 'S6', 'S7'}
@@ -1,6 +1,11 @@
+import json
+import threading
+import time
+
+import jsonlines
 import pytest
 import requests
-from unittest.mock import patch, MagicMock, mock_open
+from unittest.mock import patch, MagicMock
 
 from src.data_acquisition.scraper import SuttaScraper
 
@@ -58,17 +63,19 @@ def test_scraper_initialization(scraper_instance, mock_config):
     assert scraper_instance.books == ["MN", "SN"]
     assert scraper_instance.avoid == ["app", "intro"]
 
-@patch('src.data_acquisition.scraper.requests.get')
-def test_get_sutta_links_success(mock_requests_get, scraper_instance):
-    """Test successful parsing of the main index page."""
-    # Setup mock response
-    mock_response = MagicMock()
-    mock_response.text = MOCK_INDEX_HTML
-    mock_response.raise_for_status.return_value = None
-    mock_requests_get.return_value = mock_response
+def make_response(text="", status_code=200, headers=None):
+    """Builds a mock `requests.Response`."""
+    response = MagicMock()
+    response.text = text
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.raise_for_status.return_value = None
+    return response
 
-    # Run the method
-    links = scraper_instance.get_sutta_links()
+def test_get_sutta_links_success(scraper_instance):
+    """Test successful parsing of the main index page."""
+    with patch.object(scraper_instance.session, 'get', return_value=make_response(MOCK_INDEX_HTML)) as mock_get:
+        links = scraper_instance.get_sutta_links()
 
     # Assertions
     assert len(links) == 3
@@ -77,14 +84,12 @@ def test_get_sutta_links_success(mock_requests_get, scraper_instance):
     assert links[1]['url'] == "https://www.dhammatalks.org/suttas/MN/MN2.html"
     assert links[2]['book'] == 'SN'
     assert links[2]['url'] == "https://www.dhammatalks.org/suttas/SN/SN1.1.html"
-    mock_requests_get.assert_called_once_with(scraper_instance.master_url)
+    mock_get.assert_called_once_with(scraper_instance.master_url, headers={}, timeout=30)
 
-@patch('src.data_acquisition.scraper.requests.get')
-def test_get_sutta_links_request_exception(mock_requests_get, scraper_instance):
+def test_get_sutta_links_request_exception(scraper_instance):
     """Test that an empty list is returned on a request exception."""
-    mock_requests_get.side_effect = requests.RequestException("Connection failed")
-    
-    links = scraper_instance.get_sutta_links()
+    with patch.object(scraper_instance.session, 'get', side_effect=requests.RequestException("Connection failed")):
+        links = scraper_instance.get_sutta_links()
     
     assert links == []
 
@@ -103,44 +108,213 @@ def test_parse_sutta_page_no_sutta_div(scraper_instance):
     parsed_data = scraper_instance._parse_sutta_page(html)
     assert parsed_data is None
 
-@patch('src.data_acquisition.scraper.os.makedirs')
-@patch('src.data_acquisition.scraper.jsonlines.open', new_callable=mock_open)
-@patch('src.data_acquisition.scraper.requests.get')
-def test_run_pipeline(mock_requests_get, mock_jsonlines_open, mock_makedirs, scraper_instance, tmp_path):
+def test_run_pipeline(scraper_instance, tmp_path):
     """Test the main `run` method orchestrates the pipeline correctly."""
+    output_file = tmp_path / "raw" / "suttas.jsonl"
+
+    # The first call is for the index, the rest are for suttas
+    responses = [make_response(MOCK_INDEX_HTML)] + [make_response(MOCK_SUTTA_HTML)] * 3
+
+    with patch.object(scraper_instance.session, 'get', side_effect=responses):
+        scraper_instance.run(str(output_file))
+
+    # Check that all 3 valid links were written, in URL order
+    with jsonlines.open(output_file) as reader:
+        records = list(reader)
+    assert len(records) == 3
+    assert records[0]['sutta_id'] == "MN1"
+    assert records[0]['url'] == "https://www.dhammatalks.org/suttas/MN/MN1.html"
+    assert records[0]['title'] == "MN 1: The Root of All Things"
+    assert not (tmp_path / "raw" / "suttas.jsonl.tmp").exists()
+
+def test_run_keeps_url_order_with_concurrent_fetches(mock_config, tmp_path):
+    """Test that pages fetched concurrently are still written in sorted URL order."""
+    mock_config['dhammatalks']['concurrency'] = 3
+    mock_config['dhammatalks']['requests_per_second_per_host'] = 0  # No politeness delay in tests
+    scraper = SuttaScraper(mock_config)
+
+    def fake_get(url, headers=None, timeout=None):
+        if url == scraper.master_url:
+            return make_response(MOCK_INDEX_HTML)
+        # Make the first URL the slowest so it finishes last
+        if url.endswith("MN1.html"):
+            time.sleep(0.05)
+        return make_response(MOCK_SUTTA_HTML.replace("The Root of All Things", url))
+
+    output_file = tmp_path / "suttas.jsonl"
+    with patch.object(scraper.session, 'get', side_effect=fake_get):
+        scraper.run(str(output_file))
+
+    with jsonlines.open(output_file) as reader:
+        urls = [record['url'] for record in reader]
+    assert urls == sorted(urls)
+    assert len(urls) == 3
+
+def test_rescrape_sends_conditional_requests_and_keeps_unchanged_records(scraper_instance, tmp_path):
+    """Test that a second run uses stored validators and only rewrites changed pages."""
+    output_file = tmp_path / "suttas.jsonl"
+    validator_file = tmp_path / "validators.json"
+
+    def first_get(url, headers=None, timeout=None):
+        html = MOCK_INDEX_HTML if url == scraper_instance.master_url else MOCK_SUTTA_HTML
+        return make_response(html, headers={'ETag': f'"{url}-v1"'})
+
+    with patch.object(scraper_instance.session, 'get', side_effect=first_get):
+        scraper_instance.run(str(output_file), validator_path=str(validator_file))
+    assert validator_file.exists()
+
+    sent_headers = {}
+    def second_get(url, headers=None, timeout=None):
+        sent_headers[url] = headers
+        if url.endswith("MN2.html"):
+            changed = MOCK_SUTTA_HTML.replace("The Root of All Things", "Changed Title")
+            return make_response(changed, headers={'ETag': f'"{url}-v2"'})
+        return make_response(status_code=304)
+
+    with patch.object(scraper_instance.session, 'get', side_effect=second_get):
+        scraper_instance.run(str(output_file), validator_path=str(validator_file))
+
+    # Every request (index included) was conditional
+    assert all(h.get('If-None-Match') for h in sent_headers.values())
+    assert len(sent_headers) == 4
+
+    with jsonlines.open(output_file) as reader:
+        titles = {record['sutta_id']: record['title'] for record in reader}
+    assert titles == {
+        "MN1": "MN 1: The Root of All Things",
+        "MN2": "MN 1: Changed Title",
+        "SN1.1": "MN 1: The Root of All Things",
+    }
+
+def test_reparse_rebuilds_output_from_cache_without_network(scraper_instance, tmp_path):
+    """Test that pages cached during a run can be re-parsed offline into the same output."""
+    output_file = tmp_path / "suttas.jsonl"
+    cache_dir = tmp_path / "html_cache"
+    responses = [make_response(MOCK_INDEX_HTML)] + [make_response(MOCK_SUTTA_HTML)] * 3
+
+    with patch.object(scraper_instance.session, 'get', side_effect=responses):
+        scraper_instance.run(str(output_file), cache_dir=str(cache_dir))
+    original = output_file.read_text()
+    # Identical pages share a single content-addressed object
+    assert len(list(cache_dir.glob("objects/*/*.html.gz"))) == 1
+
+    output_file.unlink()
+    with patch.object(scraper_instance.session, 'get', side_effect=AssertionError("network used")):
+        scraper_instance.reparse(str(output_file), str(cache_dir))
+
+    assert output_file.read_text() == original
+
+def test_interrupted_run_resumes_from_checkpoint(scraper_instance, tmp_path):
+    """Test that an interrupted scrape keeps finished pages and only fetches the rest on resume."""
     output_file = tmp_path / "suttas.jsonl"
+    output_file.write_text("previous output\n")
+
+    def interrupted_get(url, headers=None, timeout=None):
+        if url.endswith("MN2.html"):
+            raise KeyboardInterrupt
+        return make_response(MOCK_INDEX_HTML if url == scraper_instance.master_url else MOCK_SUTTA_HTML)
+
+    with patch.object(scraper_instance.session, 'get', side_effect=interrupted_get):
+        with pytest.raises(KeyboardInterrupt):
+            scraper_instance.run(str(output_file))
 
-    # 1. Mock the response for get_sutta_links
-    mock_index_response = MagicMock()
-    mock_index_response.text = MOCK_INDEX_HTML
-    mock_index_response.raise_for_status.return_value = None
-
-    # 2. Mock the response for the individual sutta pages
-    mock_sutta_response = MagicMock()
-    mock_sutta_response.text = MOCK_SUTTA_HTML
-    mock_sutta_response.raise_for_status.return_value = None
-
-    # The first call to requests.get is for the index, the rest are for suttas
-    mock_requests_get.side_effect = [
-        mock_index_response, 
-        mock_sutta_response, 
-        mock_sutta_response, 
-        mock_sutta_response
+    # The old output is untouched and MN1 is checkpointed; simulate a crash mid-write too
+    assert output_file.read_text() == "previous output\n"
+    partial_file = tmp_path / "suttas.jsonl.partial"
+    with open(partial_file, 'a') as f:
+        f.write('{"url": "https://www.dhammatalks.org/suttas/MN/MN2.ht')
+
+    fetched = []
+    def resumed_get(url, headers=None, timeout=None):
+        fetched.append(url)
+        return make_response(MOCK_INDEX_HTML if url == scraper_instance.master_url else MOCK_SUTTA_HTML)
+
+    with patch.object(scraper_instance.session, 'get', side_effect=resumed_get):
+        scraper_instance.run(str(output_file), resume=True)
+
+    assert fetched == [
+        scraper_instance.master_url,
+        "https://www.dhammatalks.org/suttas/MN/MN2.html",
+        "https://www.dhammatalks.org/suttas/SN/SN1.1.html",
     ]
+    with jsonlines.open(output_file) as reader:
+        assert [r['sutta_id'] for r in reader] == ["MN1", "MN2", "SN1.1"]
+    assert not partial_file.exists()
 
-    # Run the pipeline
-    scraper_instance.run(str(output_file))
+def test_interrupted_run_only_saves_validators_of_checkpointed_records(mock_config, tmp_path):
+    """Test that pages fetched ahead of the checkpoint have no saved validators after a crash."""
+    mock_config['dhammatalks']['concurrency'] = 3
+    mock_config['dhammatalks']['requests_per_second_per_host'] = 0
+    mock_config['dhammatalks']['checkpoint_every'] = 1
+    scraper = SuttaScraper(mock_config)
+    validator_file = tmp_path / "validators.json"
+    sn_fetched = threading.Event()
 
-    # Assertions
-    mock_makedirs.assert_called_once_with(str(tmp_path))
-    mock_jsonlines_open.assert_called_once_with(str(output_file), mode='w')
-    
-    # Check that writer.write was called 3 times (for the 3 valid links)
-    handle = mock_jsonlines_open()
-    assert handle.write.call_count == 3
-
-    # Check the content of the first call to write
-    first_call_args = handle.write.call_args[0][0]
-    assert first_call_args['sutta_id'] == 1
-    assert first_call_args['url'] == "https://www.dhammatalks.org/suttas/MN/MN1.html"
-    assert first_call_args['title'] == "MN 1: The Root of All Things"
\ No newline at end of file
+    def interrupted_get(url, headers=None, timeout=None):
+        if url == scraper.master_url:
+            return make_response(MOCK_INDEX_HTML)
+        if url.endswith("MN1.html"):
+            # Let SN1.1 finish first, so it is fetched before MN1 is checkpointed
+            sn_fetched.wait(timeout=5)
+        if url.endswith("MN2.html"):
+            sn_fetched.wait(timeout=5)
+            time.sleep(0.05)
+            raise KeyboardInterrupt
+        response = make_response(MOCK_SUTTA_HTML, headers={'ETag': f'"{url}"'})
+        if url.endswith("SN1.1.html"):
+            sn_fetched.set()
+        return response
+
+    with patch.object(scraper.session, 'get', side_effect=interrupted_get):
+        with pytest.raises(KeyboardInterrupt):
+            scraper.run(str(tmp_path / "suttas.jsonl"), validator_path=str(validator_file))
+
+    saved = json.loads(validator_file.read_text())
+    assert "https://www.dhammatalks.org/suttas/MN/MN1.html" in saved
+    assert "https://www.dhammatalks.org/suttas/SN/SN1.1.html" not in saved
+
+@pytest.mark.parametrize("html", [
+    MOCK_SUTTA_HTML,
+    "<html><body><div id='nav'><div>Menu</div></div>" + MOCK_SUTTA_HTML + "<div id='footer'>x</div></body></html>",
+    "<html><body><p>No sutta here.</p></body></html>",
+])
+def test_targeted_parse_matches_full_parse(html):
+    """Test that parsing only the div#sutta subtree gives the same record as a full parse."""
+    from src.data_acquisition.scraper import parse_sutta_html
+
+    assert parse_sutta_html(html) == parse_sutta_html(html, targeted=False)
+
+def test_reparse_with_process_pool_keeps_order(mock_config, tmp_path):
+    """Test that re-parsing through a process pool writes records in URL order."""
+    from src.data_acquisition.html_cache import HtmlCache
+
+    cache_dir = tmp_path / "html_cache"
+    html_cache = HtmlCache(str(cache_dir))
+    for i in range(5):
+        url = f"https://www.dhammatalks.org/suttas/MN/MN{i}.html"
+        html_cache.put({'sutta_id': f"MN{i}", 'url': url}, MOCK_SUTTA_HTML.replace("The Root of All Things", url))
+    html_cache.save()
+
+    mock_config['dhammatalks']['parse_workers'] = 2
+    scraper = SuttaScraper(mock_config)
+    output_file = tmp_path / "suttas.jsonl"
+    scraper.reparse(str(output_file), str(cache_dir))
+
+    with jsonlines.open(output_file) as reader:
+        records = list(reader)
+    assert [r['sutta_id'] for r in records] == [f"MN{i}" for i in range(5)]
+    assert all(r['url'] in r['title'] for r in records)
+
+def test_host_rate_limiter_spaces_requests_per_host():
+    """Test that the limiter hands out slots `min_interval` apart for the same host only."""
+    from src.data_acquisition.scraper import HostRateLimiter
+
+    limiter = HostRateLimiter(requests_per_second=10)
+    with patch('src.data_acquisition.scraper.time.sleep') as mock_sleep:
+        limiter.wait("a.example")
+        limiter.wait("a.example")
+        limiter.wait("b.example")
+
+    # Only the second request to the same host had to wait (~0.1s)
+    assert mock_sleep.call_count == 1
+    assert 0.05 < mock_sleep.call_args[0][0] <= 0.1
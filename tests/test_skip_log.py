@@ -0,0 +1,36 @@
+from utils.skip_log import classify_failure, load_skip_log, write_skip_log
+
+
+def test_classify_failure():
+    """Test that the reasons written by the pipeline map to their failure classes."""
+    assert classify_failure("Sutta body is empty.") == 'empty'
+    assert classify_failure("OpenAI/DeepSeek API rate limit was hit.") == 'rate_limit'
+    assert classify_failure("Gemini API resource exhausted or rate limit hit: 429 RESOURCE_EXHAUSTED") == 'rate_limit'
+    assert classify_failure("Schema validation failed: 1 validation error. Raw response: {}") == 'validation'
+    assert classify_failure("Chunk 2/3: Schema validation failed: ...") == 'validation'
+    assert classify_failure("Error code: 429 - {'error': 'Too Many Requests'}") == 'rate_limit'
+    assert classify_failure("Connection reset by peer") == 'other'
+
+
+def test_classify_failure_ignores_status_codes_in_raw_responses():
+    """Test that a validation reason quoting model output with "429" in it is not taken for a rate limit."""
+    reason = ('Schema validation failed: 1 validation error. Raw response: '
+              '{"concepts": [{"concept_name": "SN 12.429", "evidence_quote": "rate limit of the mind"}]}')
+    assert classify_failure(reason) == 'validation'
+    assert classify_failure("Sutta SN 4.29 failed: 429 is not a valid sutta number") == 'other'
+
+
+def test_load_skip_log_keeps_latest_entry_per_item(tmp_path):
+    """Test that repeated failures of one item collapse to its latest entry."""
+    log_path = str(tmp_path / "skipped.jsonl")
+    write_skip_log(log_path, [
+        {"item_id": "MN1", "reason": "rate limit"},
+        {"item_id": "MN2", "reason": "Sutta body is empty."},
+        {"item_id": "MN1", "reason": "Schema validation failed"},
+    ])
+    with open(log_path, 'a', encoding='utf-8') as f:
+        f.write('{"item_id": "MN3", "rea')
+
+    entries = load_skip_log(log_path)
+    assert list(entries) == ["MN1", "MN2"]
+    assert entries["MN1"]["reason"] == "Schema validation failed"
@@ -0,0 +1,61 @@
+import os
+
+import jsonlines
+
+from utils.sutta_store import SuttaStore
+
+
+def write_corpus(path, items):
+    with jsonlines.open(path, mode='w') as writer:
+        writer.write_all(items)
+
+
+def test_get_by_id_and_lazy_view(tmp_path):
+    """Test random access by ID and the lazy view used for unprocessed items."""
+    path = str(tmp_path / "suttas.jsonl")
+    write_corpus(path, [{'sutta_id': f"MN{i}", 'body': f"Body {i} " + "ā" * i} for i in range(5)])
+
+    store = SuttaStore(path)
+    assert len(store) == 5
+    assert store.get("MN3") == {'sutta_id': "MN3", 'body': "Body 3 āāā"}
+    assert store.get("MN99") is None
+    assert os.path.exists(f"{path}.idx")
+
+    view = store.view(exclude_ids={"MN1", "MN3"})
+    assert len(view) == 3
+    assert view[1]['sutta_id'] == "MN2"
+    assert [item['sutta_id'] for item in view] == ["MN0", "MN2", "MN4"]
+    # A view can be iterated more than once
+    assert [item['sutta_id'] for item in view] == ["MN0", "MN2", "MN4"]
+
+
+def test_index_is_reused_and_rebuilt_when_the_corpus_changes(tmp_path):
+    """Test that a saved index is reused as is, but rebuilt once the corpus is rewritten."""
+    path = str(tmp_path / "suttas.jsonl")
+    write_corpus(path, [{'sutta_id': "SN1", 'body': "one"}])
+    SuttaStore(path)
+
+    # An unchanged corpus reuses the saved index
+    index_mtime = os.stat(f"{path}.idx").st_mtime_ns
+    assert SuttaStore(path).get("SN1")['body'] == "one"
+    assert os.stat(f"{path}.idx").st_mtime_ns == index_mtime
+
+    write_corpus(path, [{'sutta_id': "SN0", 'body': "zero"}, {'sutta_id': "SN1", 'body': "one, revised"}])
+    store = SuttaStore(path)
+    assert store.ids() == ["SN0", "SN1"]
+    assert store.get("SN1")['body'] == "one, revised"
+
+
+def test_duplicate_ids_are_reported(tmp_path, capsys):
+    """Test that repeated IDs keep their first line and are reported, also when the index is reused."""
+    path = str(tmp_path / "suttas.jsonl")
+    write_corpus(path, [{'sutta_id': "SN1", 'body': "first"}, {'sutta_id': "SN2", 'body': "two"},
+                        {'sutta_id': "SN1", 'body': "second"}, {'sutta_id': "SN1", 'body': "third"}])
+
+    store = SuttaStore(path)
+    assert store.ids() == ["SN1", "SN2"]
+    assert store.get("SN1")['body'] == "first"
+    assert "Warning: 2 lines" in capsys.readouterr().out
+
+    SuttaStore(path)
+    assert "Warning: 2 lines" in capsys.readouterr().out
@@ -0,0 +1,97 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from utils.llm_helpers import RateLimitException, RateLimitedClient, UsageStats
+from utils.rate_limiter import AdaptiveRateLimiter
+from utils.telemetry import CallTelemetry, estimate_cost, percentile
+
+
+def make_event(latency, outcome='success', completion_tokens=100):
+    return {'model_id': 'deepseek-chat', 'provider': 'deepseek', 'streamed': False, 'queue_wait_seconds': 0.0,
+            'latency_seconds': latency, 'prompt_tokens': 1000, 'cached_tokens': 800,
+            'completion_tokens': completion_tokens, 'retries': 0, 'outcome': outcome}
+
+
+def test_percentile_uses_nearest_rank():
+    assert percentile([], 0.5) == 0.0
+    assert percentile([3, 1, 2, 4], 0.5) == 2
+    assert percentile(list(range(1, 101)), 0.95) == 95
+
+
+def test_estimate_cost_bills_cached_tokens_at_the_cached_price():
+    prices = {'input': 1.0, 'cached_input': 0.1, 'output': 2.0}
+    assert estimate_cost(prices, 1_000_000, 500_000, 1_000_000) == pytest.approx(0.5 + 0.05 + 2.0)
+    assert estimate_cost(None, 1, 1, 1) is None
+
+
+def test_events_are_written_and_summarized(tmp_path):
+    """Test that events go to the .jsonl file and the run summary lands in the Prometheus textfile."""
+    events_path = tmp_path / "calls.jsonl"
+    prometheus_path = tmp_path / "metrics" / "llm.prom"
+    telemetry = CallTelemetry(str(events_path), str(prometheus_path),
+                              prices={'deepseek-chat': {'input': 1.0, 'output': 2.0}}, labels={'mode': 'discovery'})
+    for latency in (1.0, 2.0, 3.0):
+        telemetry.record(make_event(latency))
+    telemetry.record(make_event(4.0, outcome='rate_limited', completion_tokens=None))
+
+    summary = telemetry.finish()['deepseek-chat']
+    assert summary['calls'] == 4
+    assert summary['outcomes'] == {'success': 3, 'rate_limited': 1}
+    assert summary['latency_p50_seconds'] == 2.0
+    assert summary['latency_p95_seconds'] == 4.0
+    assert summary['completion_tokens'] == 300
+    assert summary['estimated_cost_usd'] == pytest.approx((4000 * 1.0 + 300 * 2.0) / 1_000_000)
+
+    events = [json.loads(line) for line in events_path.read_text().splitlines()]
+    assert len(events) == 4 and events[0]['mode'] == 'discovery'
+    metrics = prometheus_path.read_text()
+    assert 'llm_calls_total{mode="discovery",model="deepseek-chat",outcome="success"} 3' in metrics
+    assert 'llm_latency_seconds{mode="discovery",model="deepseek-chat",quantile="0.95"} 4.0' in metrics
+
+
+def test_back_to_back_runs_are_summarized_separately(tmp_path):
+    """Test that a second run (e.g. a skip-log replay after the pipeline) does not re-count the first run's calls."""
+    events_path = tmp_path / "calls.jsonl"
+    prometheus_path = tmp_path / "llm.prom"
+    telemetry = CallTelemetry(str(events_path), str(prometheus_path))
+    for latency in (1.0, 2.0, 3.0):
+        telemetry.record(make_event(latency))
+    assert telemetry.finish()['deepseek-chat']['calls'] == 3
+
+    telemetry.record(make_event(10.0))
+    second = telemetry.finish()['deepseek-chat']
+    assert second['calls'] == 1
+    assert second['latency_p50_seconds'] == 10.0
+    assert second['completion_tokens'] == 100
+    assert 'llm_calls_total{model="deepseek-chat",outcome="success"} 1' in prometheus_path.read_text()
+
+    # The event log keeps every call across runs
+    assert len(events_path.read_text().splitlines()) == 4
+    assert telemetry.finish() == {}
+
+
+def test_rate_limited_client_records_one_event_per_call():
+    """Test that a call retried after a 429 is recorded once, with its retry count and the provider's usage."""
+    inner = MagicMock()
+    inner.model_id = 'deepseek-chat'
+    inner.usage = UsageStats()
+
+    def generate(text_body):
+        if inner.generate_content.call_count == 1:
+            raise RateLimitException("429")
+        inner.usage.record(500, 400, 50, 0.1)
+        return '{"concepts": []}'
+
+    inner.generate_content.side_effect = generate
+    telemetry = CallTelemetry()
+    limiter = AdaptiveRateLimiter(base_backoff_seconds=0.0)
+    client = RateLimitedClient(inner, limiter, "system prompt", max_retries=2, telemetry=telemetry, provider='deepseek')
+
+    client.generate_content("body")
+
+    assert len(telemetry.events) == 1
+    event = telemetry.events[0]
+    assert event['outcome'] == 'success' and event['retries'] == 1
+    assert (event['prompt_tokens'], event['cached_tokens'], event['completion_tokens']) == (500, 400, 50)
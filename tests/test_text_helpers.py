@@ -0,0 +1,49 @@
+from utils.text_helpers import canonicalize_text, split_into_chunks
+
+
+def make_text(num_paragraphs, length=90):
+    return "\n\n".join(f"P{i:02d} " + "x" * (length - 4) for i in range(num_paragraphs))
+
+
+def test_short_text_is_a_single_chunk():
+    """Test that a text under the threshold is returned unchanged."""
+    text = make_text(3)
+    assert split_into_chunks(text, max_chars=1000, overlap_chars=100) == [text]
+
+
+def test_chunks_break_on_paragraphs_and_cover_the_text():
+    """Test that chunks respect the size bound and contain every paragraph in order."""
+    text = make_text(20)
+    chunks = split_into_chunks(text, max_chars=400, overlap_chars=0)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 400 for chunk in chunks)
+    # Without overlap, joining the chunks gives back the original text
+    assert "\n\n".join(chunks) == text
+
+
+def test_chunks_overlap_by_trailing_paragraphs():
+    """Test that each chunk starts with the last paragraph(s) of the previous one."""
+    chunks = split_into_chunks(make_text(20), max_chars=400, overlap_chars=100)
+
+    for previous, current in zip(chunks, chunks[1:]):
+        last_paragraph = previous.split("\n\n")[-1]
+        assert current.startswith(last_paragraph)
+    assert all(len(chunk) <= 400 for chunk in chunks)
+
+
+def test_oversized_paragraph_is_split_on_sentences():
+    """Test that a single paragraph longer than the limit is split at sentence ends."""
+    paragraph = " ".join(f"Sentence number {i} is here." for i in range(40))
+    chunks = split_into_chunks(paragraph, max_chars=200, overlap_chars=0)
+
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert all(chunk.endswith(".") for chunk in chunks)
+    assert " ".join(chunks) == paragraph
+
+
+def test_canonicalize_text_folds_diacritics_case_and_whitespace():
+    assert canonicalize_text("  Sāvatthī ") == canonicalize_text("savatthi")
+    assert canonicalize_text("Jeta’s  Grove") == "jeta's grove"
+    assert canonicalize_text("ﬁve Hindrances") == "five hindrances"
+    assert canonicalize_text("Nibbāna") != canonicalize_text("Nibbida")